@@ -0,0 +1,49 @@
+"""
+Compare two result files written by benchmarks/run.py.
+
+    $ python benchmarks/compare.py benchmarks/results/<old>.json benchmarks/results/<new>.json
+"""
+import json
+import sys
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps')
+
+
+def load(path):
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def change(old, new):
+    if old in (None, 0) or new is None:
+        return ''
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def compare(old, new, mode):
+    old_results, new_results = old.get(mode) or {}, new.get(mode) or {}
+    names = [name for name in new_results if isinstance(new_results[name], dict) and name in old_results]
+    if not names:
+        return
+    print(f'\n{mode}: {old["commit"]} -> {new["commit"]}')
+    print(f'{"scenario":28}' + ''.join(f'{metric:>24}' for metric in METRICS))
+    for name in names:
+        cells = []
+        for metric in METRICS:
+            before, after = old_results[name].get(metric), new_results[name].get(metric)
+            cells.append(f'{before} -> {after} {change(before, after)}'.rjust(24))
+        print(f'{name:28}' + ''.join(cells))
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    old, new = load(sys.argv[1]), load(sys.argv[2])
+    compare(old, new, 'test_client')
+    compare(old, new, 'gunicorn')
+    compare(old, new, 'asgi')
+    print(f'\npeak RSS (test client): {old.get("test_client_peak_rss_kb")} KB -> {new.get("test_client_peak_rss_kb")} KB')
+
+
+if __name__ == '__main__':
+    main()
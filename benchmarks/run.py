@@ -0,0 +1,381 @@
+"""
+Benchmark harness for the StarWars API.
+
+Seeds a throwaway SQLite database, drives every route of the `api` blueprint
+through the Flask test client and, optionally, through a local gunicorn with sync
+workers (--gunicorn) and with the ASGI entry point (--asgi), then
+writes p50/p95/p99 latency, throughput and peak RSS to a JSON file named after the
+current commit so runs can be compared with benchmarks/compare.py.
+
+    $ pipenv run bench                                  # defaults below
+    $ python benchmarks/run.py --characters 10000 --favorites 100000 --gunicorn
+    $ python benchmarks/run.py --gunicorn --asgi --only people --concurrency 64
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+# Rows seeded only so the delete scenarios have something to remove
+DELETE_RESERVE = 2000
+
+# Finished jobs seeded for the job status scenario
+JOBS = 100
+
+# Every seeded user has this password; user 1 is the admin
+PASSWORD = 'secret'
+ADMIN_ID = 1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--characters', type=int, default=10000)
+    parser.add_argument('--planets', type=int, default=1000)
+    parser.add_argument('--vehicles', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--favorites', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed requests per scenario')
+    parser.add_argument('--only', action='append', default=[], help='run only scenarios whose name contains this')
+    parser.add_argument('--cache', default='none', choices=('none', 'lru', 'redis'),
+                        help='response cache backend (redis uses CACHE_URL)')
+    parser.add_argument('--gunicorn', action='store_true', help='also benchmark a local gunicorn')
+    parser.add_argument('--asgi', action='store_true', help='also benchmark src/asgi.py under gunicorn + uvicorn workers')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads against gunicorn')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<commit>.json)')
+    return parser.parse_args()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None
+    }
+
+
+def seed_database(args):
+    """Fill the database with core executemany inserts; returns a bearer token per user id."""
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+    from app import app
+    from auth import issue_token
+    from models import db, User, Character, Planet, Vehicle, Favorite, Job
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        password = generate_password_hash(PASSWORD)
+        db.session.execute(insert(User), [
+            {'username': f'user{i}', 'password': password, 'is_admin': i == 1} for i in range(1, args.users + 1)
+        ])
+        for model, count, extra in (
+            (Character, args.characters, lambda i: {'birth_year': f'{i % 900}BBY', 'gender': rng.choice(['male', 'female', 'n/a'])}),
+            (Planet, args.planets, lambda i: {'population': str(i * 1000), 'climate': rng.choice(['arid', 'temperate', 'frozen'])}),
+            (Vehicle, args.vehicles, lambda i: {'model': f'M-{i}', 'vehicle_class': rng.choice(['wheeled', 'repulsorcraft'])})
+        ):
+            rows = [dict(name=f'{model.__name__}{i}', **extra(i)) for i in range(1, count + DELETE_RESERVE + 1)]
+            for start in range(0, len(rows), 5000):
+                db.session.execute(insert(model), rows[start:start + 5000])
+
+        targets = (('character', args.characters), ('planet', args.planets), ('vehicle', args.vehicles))
+        seen = set()
+        favorites = []
+        while len(favorites) < args.favorites and len(seen) < args.users * sum(n for _, n in targets):
+            kind, count = rng.choice(targets)
+            key = (rng.randint(1, args.users), kind, rng.randint(1, count))
+            if key not in seen:
+                seen.add(key)
+                favorites.append({'user_id': key[0], 'entity_type': kind, 'entity_id': key[2]})
+        for start in range(0, len(favorites), 5000):
+            db.session.execute(insert(Favorite), favorites[start:start + 5000])
+        db.session.execute(insert(Job), [
+            {'kind': 'popularity-refresh', 'payload': {}, 'status': 'succeeded', 'created_by': ADMIN_ID}
+            for _ in range(JOBS)
+        ])
+        db.session.commit()
+
+        from search import search_index
+        import favorite_summary
+        import popularity
+        with db.engine.begin() as connection:
+            favorite_summary.rebuild(connection)
+            popularity.rebuild(connection)
+            if connection.dialect.name in ('sqlite', 'postgresql'):
+                search_index.rebuild(connection)
+
+    with app.test_request_context():
+        return {user.id: issue_token(user) for user in User.query.all()}
+
+
+def scenarios(args):
+    """
+    (name, endpoint, request factory) for every blueprint route. The factory gets the
+    iteration number and returns (method, path, body) plus, optionally, the id of the
+    user to authenticate as (the admin otherwise).
+    """
+    def pick(count):
+        return lambda i: (i * 7919) % count + 1
+
+    character, planet, vehicle = pick(args.characters), pick(args.planets), pick(args.vehicles)
+    user, job = pick(args.users), pick(JOBS)
+
+    def reserved(base):
+        return lambda i: base + i + 1
+
+    return [
+        ('users', 'api.get_users', lambda i: ('GET', '/starwars/users', None)),
+        ('login', 'api.login', lambda i: ('POST', '/starwars/login', {'username': f'user{user(i)}', 'password': PASSWORD})),
+        ('user_favorites', 'api.get_user_favorites', lambda i: ('GET', '/starwars/users/favorites', None, user(i))),
+        ('user_favorites_summary', 'api.get_user_favorites_summary', lambda i: ('GET', '/starwars/users/favorites/summary', None, user(i))),
+        ('people', 'api.get_people', lambda i: ('GET', '/starwars/people', None)),
+        ('people_page_fields', 'api.get_people', lambda i: ('GET', f'/starwars/people?limit=50&cursor={character(i)}&fields=name', None)),
+        ('people_filter', 'api.get_people', lambda i: ('GET', '/starwars/people?gender=male&name__startswith=Character1', None)),
+        ('popular_planets', 'api.get_popular', lambda i: ('GET', '/starwars/planets/popular?limit=10', None)),
+        ('popular_people_week', 'api.get_popular', lambda i: ('GET', '/starwars/people/popular?window=week&limit=10', None)),
+        ('planets', 'api.get_planets', lambda i: ('GET', '/starwars/planets', None)),
+        ('vehicles', 'api.get_vehicles', lambda i: ('GET', '/starwars/vehicles', None)),
+        ('character', 'api.get_character', lambda i: ('GET', f'/starwars/people/{character(i)}', None)),
+        ('planet', 'api.get_planet', lambda i: ('GET', f'/starwars/planets/{planet(i)}', None)),
+        ('vehicle', 'api.get_vehicle', lambda i: ('GET', f'/starwars/vehicles/{vehicle(i)}', None)),
+        ('entities', 'api.get_entities', lambda i: ('GET', f'/starwars/entities?people={character(i)},{character(i + 1)}&planets={planet(i)}&vehicles={vehicle(i)}', None)),
+        ('favorite_planet_add', 'api.add_favorite_planet', lambda i: ('POST', f'/starwars/favorite/planet/{planet(i)}', None, user(i))),
+        ('favorite_planet_remove', 'api.remove_favorite_planet', lambda i: ('DELETE', f'/starwars/favorite/planet/{planet(i)}', None, user(i))),
+        ('favorite_character_add', 'api.add_favorite_character', lambda i: ('POST', f'/starwars/favorite/people/{character(i)}', None, user(i))),
+        ('favorite_character_remove', 'api.remove_favorite_character', lambda i: ('DELETE', f'/starwars/favorite/character/{character(i)}', None, user(i))),
+        ('favorite_vehicle_add', 'api.add_favorite_vehicle', lambda i: ('POST', f'/starwars/favorite/vehicle/{vehicle(i)}', None, user(i))),
+        ('favorite_vehicle_remove', 'api.remove_favorite_vehicle', lambda i: ('DELETE', f'/starwars/favorite/vehicle/{vehicle(i)}', None, user(i))),
+        ('favorite_batch_add', 'api.add_favorite_batch', lambda i: ('POST', '/starwars/favorite/batch', {'planet': [planet(i), planet(i + 1)], 'character': [character(i)]}, user(i))),
+        ('favorite_batch_remove', 'api.remove_favorite_batch', lambda i: ('DELETE', '/starwars/favorite/batch', {'planet': [planet(i), planet(i + 1)], 'character': [character(i)]}, user(i))),
+        ('add_people', 'api.add_character', lambda i: ('POST', '/starwars/add_people', {'name': f'Bench{i}', 'gender': 'n/a'})),
+        ('add_planet', 'api.add_planet', lambda i: ('POST', '/starwars/add_planet', {'name': f'Bench{i}', 'climate': 'arid'})),
+        ('add_vehicle', 'api.add_vehicle', lambda i: ('POST', '/starwars/add_vehicle', {'name': f'Bench{i}', 'model': 'X'})),
+        ('delete_people', 'api.delete_character', lambda i: ('DELETE', f'/starwars/delete_people/{reserved(args.characters)(i)}', None)),
+        ('delete_planet', 'api.delete_planet', lambda i: ('DELETE', f'/starwars/delete_planet/{reserved(args.planets)(i)}', None)),
+        ('delete_vehicle', 'api.delete_vehicle', lambda i: ('DELETE', f'/starwars/delete_vehicle/{reserved(args.vehicles)(i)}', None)),
+        ('bulk_add_people', 'api.bulk_add', lambda i: ('POST', '/starwars/bulk/people', [{'name': f'Bulk{i}-{n}'} for n in range(100)])),
+        ('bulk_remove_planets', 'api.bulk_remove', lambda i: ('DELETE', f'/starwars/bulk/planets?ids={reserved(args.planets)(1000 + i)}', None)),
+        ('search', 'api.search', lambda i: ('GET', f'/starwars/search?q=character{character(i) // 10}', None)),
+        ('search_typo', 'api.search', lambda i: ('GET', '/starwars/search?q=tatooin+aird', None)),
+        ('export_people', 'api.export_resource', lambda i: ('GET', '/starwars/export/people', None)),
+        ('create_job', 'api.create_job', lambda i: ('POST', '/starwars/jobs', {'kind': 'popularity-refresh'})),
+        ('job', 'api.get_job', lambda i: ('GET', f'/starwars/jobs/{job(i)}', None))
+    ]
+
+
+def selected_scenarios(args):
+    chosen = scenarios(args)
+    if args.only:
+        chosen = [s for s in chosen if any(part in s[0] for part in args.only)]
+    return chosen
+
+
+def check_coverage(app, chosen):
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint.startswith('api.')}
+    missing = sorted(endpoints - {endpoint for _, endpoint, _ in chosen})
+    if missing:
+        print('warning: no scenario for ' + ', '.join(missing), file=sys.stderr)
+
+
+def auth_headers(tokens, user_id=ADMIN_ID):
+    return {'Authorization': f'Bearer {tokens[user_id]}'}
+
+
+def run_test_client(args, chosen, tokens):
+    from app import app
+    check_coverage(app, chosen)
+    client = app.test_client()
+    results = {}
+    for name, _, make_request in chosen:
+        for i in range(args.warmup):
+            method, path, body, *user = make_request(args.requests + i)
+            client.open(path, method=method, json=body, headers=auth_headers(tokens, *user)).close()
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for i in range(args.requests):
+            method, path, body, *user = make_request(i)
+            headers = auth_headers(tokens, *user)
+            begin = time.perf_counter()
+            response = client.open(path, method=method, json=body, headers=headers)
+            response.get_data()
+            latencies.append(time.perf_counter() - begin)
+            errors += response.status_code >= 500 or response.status_code in (401, 403)
+            response.close()
+        results[name] = summarize(latencies, errors, time.perf_counter() - started)
+        print(f"client   {name:28} p50={results[name]['p50_ms']}ms p99={results[name]['p99_ms']}ms")
+    return results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def process_tree(pid):
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as children:
+            for child in children.read().split():
+                pids += process_tree(int(child))
+    except OSError:
+        pass
+    return pids
+
+
+def peak_rss_kb(pids):
+    """Sum of VmHWM (peak resident set) over the given processes; Linux only."""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as status:
+                for line in status:
+                    if line.startswith('VmHWM:'):
+                        total += int(line.split()[1])
+        except OSError:
+            return None
+    return total
+
+
+def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def http_request(base, tokens, method, path, body, user_id=ADMIN_ID):
+    data = None if body is None else json.dumps(body).encode()
+    headers = auth_headers(tokens, user_id)
+    if data:
+        headers['Content-Type'] = 'application/json'
+    request = urllib.request.Request(base + path, data=data, method=method, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+def run_gunicorn(args, chosen, env, tokens, asgi=False):
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    label = 'asgi' if asgi else 'gunicorn'
+    app_args = ['asgi:application', '-k', 'uvicorn.workers.UvicornWorker'] if asgi else ['wsgi']
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', *app_args, '--chdir', SRC, '-b', f'127.0.0.1:{port}',
+         '-w', str(args.workers), '--log-level', 'warning'],
+        env=dict(env, WEB_CONCURRENCY=str(args.workers)), cwd=ROOT)
+    results = {}
+    try:
+        wait_until_up(base + '/starwars/users')
+        for name, _, make_request in chosen:
+            for i in range(args.warmup):
+                http_request(base, tokens, *make_request(args.requests + i))
+            latencies, errors = [], [0]
+            lock = threading.Lock()
+            counter = iter(range(args.requests))
+
+            def worker():
+                for i in counter:
+                    begin = time.perf_counter()
+                    status = http_request(base, tokens, *make_request(i))
+                    elapsed = time.perf_counter() - begin
+                    with lock:
+                        latencies.append(elapsed)
+                        errors[0] += status >= 500 or status in (401, 403)
+
+            threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            results[name] = summarize(latencies, errors[0], time.perf_counter() - started)
+            print(f"{label:8} {name:28} p50={results[name]['p50_ms']}ms rps={results[name]['throughput_rps']}")
+        results['peak_rss_kb'] = peak_rss_kb(process_tree(server.pid))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+    return results
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='starwars-bench-')
+    env = dict(os.environ,
+               DATABASE_URL=f'sqlite:///{os.path.join(workdir, "bench.db")}',
+               CACHE_BACKEND=args.cache,
+               SLOW_QUERY_MS=str(10 ** 6))
+    os.environ.update(env)
+    sys.path.insert(0, SRC)
+    chosen = selected_scenarios(args)
+
+    seed_started = time.perf_counter()
+    tokens = seed_database(args)
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'seed_seconds': round(time.perf_counter() - seed_started, 2),
+        'test_client': run_test_client(args, chosen, tokens),
+        'test_client_peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+    if args.gunicorn:
+        tokens = seed_database(args)
+        report['gunicorn'] = run_gunicorn(args, chosen, env, tokens)
+    if args.asgi:
+        tokens = seed_database(args)
+        report['asgi'] = run_gunicorn(args, chosen, env, tokens, asgi=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as results_file:
+        json.dump(report, results_file, indent=2, sort_keys=True)
+    print('results written to ' + output)
+
+
+if __name__ == '__main__':
+    main()
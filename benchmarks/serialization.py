@@ -0,0 +1,68 @@
+"""
+Micro-benchmark: ORM objects + serialize() + jsonify versus column tuples + the fast
+encoder in src/serialization.py, for the Character list.
+
+    $ python benchmarks/serialization.py --rows 10000 --repeat 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='starwars-serialization-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+    from flask import jsonify
+    from sqlalchemy import insert
+    from app import app
+    from models import db, Character
+    import serialization
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Character), [
+            {'name': f'Character{i}', 'birth_year': f'{i % 900}BBY', 'gender': 'n/a'} for i in range(args.rows)
+        ])
+        db.session.commit()
+
+    def orm_path():
+        with app.test_request_context():
+            characters = Character.query.all()
+            jsonify({"characters": [character.serialize() for character in characters]}).get_data()
+            db.session.remove()
+
+    def tuple_path():
+        with app.test_request_context():
+            serialization.json_response({"characters": serialization.fetch_all(Character)}).get_data()
+            db.session.remove()
+
+    orm = best_of(args.repeat, orm_path)
+    fast = best_of(args.repeat, tuple_path)
+    encoder = 'orjson' if serialization.orjson is not None else 'json (stdlib)'
+    print(f'{args.rows} rows, best of {args.repeat}, encoder: {encoder}')
+    print(f'  ORM + serialize() + jsonify: {orm * 1000:8.2f} ms')
+    print(f'  column tuples + dumps:       {fast * 1000:8.2f} ms  ({orm / fast:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
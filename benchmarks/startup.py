@@ -0,0 +1,132 @@
+"""
+Startup benchmark: how long a fresh worker takes to import the app, build it with
+create_app() and answer its first request, for the ways a process can start.
+
+    eager      admin + Flask-Migrate + flask_swagger, what every worker loaded before
+    server     admin on, as a default gunicorn worker now starts
+    api-only   ADMIN_ENABLED=0, for workers that only serve the API
+
+Each variant runs --runs times in a new interpreter. The import-time profile
+(python -X importtime, self time summed per top-level package) shows where the
+remaining time goes.
+
+    $ python benchmarks/startup.py
+    $ python benchmarks/startup.py --runs 20 --top 15 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+
+VARIANTS = {
+    'eager': ({'ADMIN_ENABLED': '1', 'FLASK_RUN_FROM_CLI': 'true'}, 'import flask_swagger'),
+    'server': ({'ADMIN_ENABLED': '1'}, ''),
+    'api-only': ({'ADMIN_ENABLED': '0'}, '')
+}
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+{preload}
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+status = application.test_client().get('/starwars/people').status_code
+served = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'create_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'modules': len(sys.modules),
+    'status': status
+}}))
+"""
+
+SETUP = """
+import app
+from models import db
+application = app.create_app()
+with application.app_context():
+    db.create_all()
+"""
+
+
+def child_env(database_url, variant_env):
+    env = dict(os.environ, DATABASE_URL=database_url, JOBS_WORKERS='0', PYTHONDONTWRITEBYTECODE='')
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    env.update(variant_env)
+    return env
+
+
+def run_once(env, preload):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD.format(preload=preload)], cwd=SRC, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def import_profile(env, preload):
+    """{top-level package: self import time in ms} from python -X importtime."""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD.format(preload=preload)], cwd=SRC,
+                            env=env, capture_output=True, text=True, check=True).stderr
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1000
+    return packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=12, help='packages shown in the import profile')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='starwars-startup-')
+    database_url = f'sqlite:///{os.path.join(workdir, "startup.db")}'
+    subprocess.run([sys.executable, '-c', SETUP], cwd=SRC, env=child_env(database_url, {}), check=True)
+    # Warm the bytecode cache so the first variant does not pay for compiling
+    run_once(child_env(database_url, VARIANTS['eager'][0]), VARIANTS['eager'][1])
+
+    report = {}
+    metrics = ('import_ms', 'create_ms', 'first_request_ms', 'process_ms')
+    print(f'{"variant":12}' + ''.join(f'{metric:>18}' for metric in metrics) + f'{"modules":>10}')
+    for name, (variant_env, preload) in VARIANTS.items():
+        env = child_env(database_url, variant_env)
+        runs = [run_once(env, preload) for _ in range(args.runs)]
+        summary = {metric: round(statistics.median(run[metric] for run in runs), 1) for metric in metrics}
+        summary['modules'] = runs[-1]['modules']
+        summary['profile_ms'] = import_profile(env, preload)
+        report[name] = summary
+        print(f'{name:12}' + ''.join(f'{summary[metric]:>18}' for metric in metrics) + f'{summary["modules"]:>10}')
+
+    packages = sorted(report['eager']['profile_ms'], key=report['eager']['profile_ms'].get, reverse=True)
+    print(f'\nimport self time per package (ms), top {args.top}')
+    print(f'{"package":24}' + ''.join(f'{name:>12}' for name in VARIANTS))
+    for package in packages[:args.top]:
+        print(f'{package:24}' + ''.join(f'{report[name]["profile_ms"].get(package, 0):>12.1f}' for name in VARIANTS))
+
+    baseline, best = report['eager']['process_ms'], report['api-only']['process_ms']
+    print(f'\ncold start (process start to first response): {baseline} ms -> {best} ms '
+          f'({(best - baseline) / baseline * 100:+.1f}%)')
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""table version counters for conditional GET
+
+Revision ID: a3c1d5e7f901
+Revises: 664f49302799
+Create Date: 2026-10-18 09:12:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c1d5e7f901'
+down_revision = '664f49302799'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_version = op.create_table('table_version',
+    sa.Column('table_name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+    op.bulk_insert(table_version, [
+        {'table_name': name, 'version': 1, 'updated_at': None}
+        for name in ('user', 'character', 'planet', 'vehicle', 'favorite')
+    ])
+
+
+def downgrade():
+    op.drop_table('table_version')
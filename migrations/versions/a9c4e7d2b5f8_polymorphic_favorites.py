@@ -0,0 +1,73 @@
+"""favorites point at (entity_type, entity_id) instead of one column per target
+
+Revision ID: a9c4e7d2b5f8
+Revises: f2b6d9e4a0c7
+Create Date: 2026-10-18 16:02:11.574903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c4e7d2b5f8'
+down_revision = 'f2b6d9e4a0c7'
+branch_labels = None
+depends_on = None
+
+TARGETS = ('character', 'planet', 'vehicle')
+
+
+def upgrade():
+    op.add_column('favorite', sa.Column('entity_type', sa.String(length=20), nullable=True))
+    op.add_column('favorite', sa.Column('entity_id', sa.Integer(), nullable=True))
+
+    # One set-based UPDATE per target column; a row that somehow had several keeps the first
+    for target in TARGETS:
+        column = target + '_id'
+        op.execute(f"UPDATE favorite SET entity_type = '{target}', entity_id = {column} "
+                   f"WHERE {column} IS NOT NULL AND entity_type IS NULL")
+    # Favorites pointing at nothing could never be read back
+    op.execute("DELETE FROM favorite WHERE entity_type IS NULL")
+
+    for target in TARGETS:
+        op.drop_index('uq_favorite_user_' + target, table_name='favorite')
+        op.drop_index('ix_favorite_' + target + '_id', table_name='favorite')
+    op.drop_index('ix_favorite_user_id', table_name='favorite')
+
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.alter_column('entity_type', existing_type=sa.String(length=20), nullable=False)
+        batch_op.alter_column('entity_id', existing_type=sa.Integer(), nullable=False)
+        for target in TARGETS:
+            batch_op.drop_column(target + '_id')
+
+    # Created after the copy, so the updates do not maintain them row by row
+    op.create_index('uq_favorite_user_entity', 'favorite', ['user_id', 'entity_type', 'entity_id'], unique=True)
+    op.create_index('ix_favorite_entity', 'favorite', ['entity_type', 'entity_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_favorite_entity', table_name='favorite')
+    op.drop_index('uq_favorite_user_entity', table_name='favorite')
+
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        for target in TARGETS:
+            batch_op.add_column(sa.Column(target + '_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(f'favorite_{target}_id_fkey', target, [target + '_id'], ['id'])
+
+    for target in TARGETS:
+        op.execute(f"UPDATE favorite SET {target}_id = entity_id WHERE entity_type = '{target}'")
+    # Favorites of kinds the old columns cannot hold are dropped
+    op.execute("DELETE FROM favorite WHERE character_id IS NULL AND planet_id IS NULL AND vehicle_id IS NULL")
+
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.drop_column('entity_id')
+        batch_op.drop_column('entity_type')
+
+    op.create_index('ix_favorite_user_id', 'favorite', ['user_id'], unique=False)
+    for target in TARGETS:
+        column = target + '_id'
+        op.create_index('ix_favorite_' + column, 'favorite', [column], unique=False)
+        op.create_index('uq_favorite_user_' + target, 'favorite', ['user_id', column], unique=True,
+                        sqlite_where=sa.text(f'{column} IS NOT NULL'),
+                        postgresql_where=sa.text(f'{column} IS NOT NULL'))
@@ -0,0 +1,45 @@
+"""favorite lookup indexes and one favorite per user and target
+
+Revision ID: b7e2f4a9c316
+Revises: a3c1d5e7f901
+Create Date: 2026-10-18 10:03:17.902614
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2f4a9c316'
+down_revision = 'a3c1d5e7f901'
+branch_labels = None
+depends_on = None
+
+TARGETS = ('character', 'planet', 'vehicle')
+
+
+def upgrade():
+    # Drop duplicate favorites (keeping the oldest row) before the unique indexes go in
+    for target in TARGETS:
+        column = target + '_id'
+        op.execute(
+            f"DELETE FROM favorite WHERE {column} IS NOT NULL AND id NOT IN ("
+            f"SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM favorite "
+            f"WHERE {column} IS NOT NULL GROUP BY user_id, {column}) AS keep)"
+        )
+
+    op.create_index(op.f('ix_favorite_user_id'), 'favorite', ['user_id'], unique=False)
+    for target in TARGETS:
+        column = target + '_id'
+        op.create_index(op.f('ix_favorite_' + column), 'favorite', [column], unique=False)
+        op.create_index('uq_favorite_user_' + target, 'favorite', ['user_id', column], unique=True,
+                        sqlite_where=sa.text(f'{column} IS NOT NULL'),
+                        postgresql_where=sa.text(f'{column} IS NOT NULL'))
+
+
+def downgrade():
+    for target in reversed(TARGETS):
+        column = target + '_id'
+        op.drop_index('uq_favorite_user_' + target, table_name='favorite')
+        op.drop_index(op.f('ix_favorite_' + column), table_name='favorite')
+    op.drop_index(op.f('ix_favorite_user_id'), table_name='favorite')
@@ -0,0 +1,63 @@
+"""search index for characters, planets and vehicles
+
+Revision ID: c5d8a1f3e2b4
+Revises: b7e2f4a9c316
+Create Date: 2026-10-18 11:42:05.318227
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d8a1f3e2b4'
+down_revision = 'b7e2f4a9c316'
+branch_labels = None
+depends_on = None
+
+
+# The catalog columns indexed at this revision: kind -> (table, name column, other columns, rowid offset)
+SEARCHABLE = {
+    'character': ('character', 'name', ('gender', 'birth_year'), 1),
+    'planet': ('planet', 'name', ('climate',), 2),
+    'vehicle': ('vehicle', 'name', ('model', 'vehicle_class'), 3)
+}
+
+
+def body_sql(others):
+    return " || ' ' || ".join(f"coalesce({column}, '')" for column in others)
+
+
+def upgrade():
+    # Shape depends on the backend (FTS5 on SQLite, tsvector + pg_trgm on PostgreSQL);
+    # other databases have no index and search falls back to LIKE. The DDL and backfill
+    # are spelled out here so later changes to search.py do not change this revision.
+    dialect = op.get_bind().dialect
+    quote = dialect.identifier_preparer.quote
+    if dialect.name == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+                   "kind UNINDEXED, entity_id UNINDEXED, name, body, tokenize='unicode61 remove_diacritics 2')")
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS search_index_vocab USING fts5vocab(search_index, 'row')")
+        for kind, (table, name, others, offset) in SEARCHABLE.items():
+            op.execute(f"INSERT INTO search_index (rowid, kind, entity_id, name, body) "
+                       f"SELECT id * 4 + {offset}, '{kind}', id, {name}, {body_sql(others)} FROM {quote(table)}")
+    elif dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE TABLE IF NOT EXISTS search_index ("
+                   "kind VARCHAR(20) NOT NULL, entity_id INTEGER NOT NULL, name TEXT NOT NULL, "
+                   "body TEXT NOT NULL DEFAULT '', "
+                   "document tsvector GENERATED ALWAYS AS ("
+                   "setweight(to_tsvector('simple', name), 'A') || setweight(to_tsvector('simple', body), 'B')) STORED, "
+                   "PRIMARY KEY (kind, entity_id))")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_search_index_document ON search_index USING gin (document)")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_search_index_name_trgm ON search_index USING gin (name gin_trgm_ops)")
+        for kind, (table, name, others, _) in SEARCHABLE.items():
+            op.execute(f"INSERT INTO search_index (kind, entity_id, name, body) "
+                       f"SELECT '{kind}', id, {name}, {body_sql(others)} FROM {quote(table)}")
+
+
+def downgrade():
+    connection = op.get_bind()
+    if connection.dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS search_index_vocab")
+    if connection.dialect.name in ('sqlite', 'postgresql'):
+        op.execute("DROP TABLE IF EXISTS search_index")
@@ -0,0 +1,61 @@
+"""per-user favorite summary
+
+Revision ID: cae32157c912
+Revises: c5d8a1f3e2b4
+Create Date: 2026-10-18 13:44:48.401530
+
+"""
+import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cae32157c912'
+down_revision = 'c5d8a1f3e2b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('favorite_summary',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('character_ids', sa.JSON(), nullable=False),
+    sa.Column('planet_ids', sa.JSON(), nullable=False),
+    sa.Column('vehicle_ids', sa.JSON(), nullable=False),
+    sa.Column('character_count', sa.Integer(), nullable=False),
+    sa.Column('planet_count', sa.Integer(), nullable=False),
+    sa.Column('vehicle_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # Backfill, as `flask favorites-summary-rebuild` did with the favorite table of this revision
+    bind = op.get_bind()
+    kinds = ('character', 'planet', 'vehicle')
+    favorite = sa.table('favorite', sa.column('id'), sa.column('user_id'),
+                        *[sa.column(kind + '_id') for kind in kinds])
+    user = sa.table('user', sa.column('id'))
+    summary = sa.table('favorite_summary', sa.column('user_id'), sa.column('updated_at'),
+                       *[sa.column(kind + '_ids', sa.JSON()) for kind in kinds],
+                       *[sa.column(kind + '_count') for kind in kinds])
+    lists = {}
+    for row in bind.execute(sa.select(favorite).order_by(favorite.c.user_id, favorite.c.id)):
+        for kind in kinds:
+            target_id = getattr(row, kind + '_id')
+            if target_id is not None:
+                lists.setdefault(row.user_id, {key: [] for key in kinds})[kind].append(target_id)
+                break
+    rows = []
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    for (user_id,) in bind.execute(sa.select(user.c.id).order_by(user.c.id)):
+        values = {'user_id': user_id, 'updated_at': now}
+        for kind, ids in lists.get(user_id, {key: [] for key in kinds}).items():
+            values[kind + '_ids'], values[kind + '_count'] = ids, len(ids)
+        rows.append(values)
+    for start in range(0, len(rows), 1000):
+        bind.execute(sa.insert(summary), rows[start:start + 1000])
+
+
+def downgrade():
+    op.drop_table('favorite_summary')
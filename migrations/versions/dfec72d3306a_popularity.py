@@ -0,0 +1,50 @@
+"""favorite counters, time-window rankings and favorite.created_at
+
+Revision ID: dfec72d3306a
+Revises: cae32157c912
+Create Date: 2026-10-18 13:47:03.910629
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dfec72d3306a'
+down_revision = 'cae32157c912'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('favorite_counter',
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('target_id', sa.Integer(), nullable=False),
+    sa.Column('favorites', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'target_id')
+    )
+    op.create_index('ix_favorite_counter_ranking', 'favorite_counter', ['kind', 'favorites', 'target_id'], unique=False)
+    op.create_table('favorite_ranking',
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('time_window', sa.String(length=10), nullable=False),
+    sa.Column('ranking', sa.JSON(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'time_window')
+    )
+    # Existing favorites keep a NULL created_at: they count all-time but in no window
+    op.add_column('favorite', sa.Column('created_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_favorite_created_at'), 'favorite', ['created_at'], unique=False)
+
+    # Backfill, as `flask popularity-rebuild` did with the favorite table of this revision
+    for kind in ('character', 'planet', 'vehicle'):
+        op.execute(f"INSERT INTO favorite_counter (kind, target_id, favorites) "
+                   f"SELECT '{kind}', {kind}_id, COUNT(*) FROM favorite WHERE {kind}_id IS NOT NULL GROUP BY {kind}_id")
+
+
+def downgrade():
+    op.drop_index(op.f('ix_favorite_created_at'), table_name='favorite')
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.drop_column('created_at')
+    op.drop_table('favorite_ranking')
+    op.drop_index('ix_favorite_counter_ranking', table_name='favorite_counter')
+    op.drop_table('favorite_counter')
@@ -0,0 +1,44 @@
+"""hashed user passwords
+
+Revision ID: e4a7c9b2d815
+Revises: dfec72d3306a
+Create Date: 2026-10-18 14:31:52.664107
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+from werkzeug.security import generate_password_hash
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c9b2d815'
+down_revision = 'dfec72d3306a'
+branch_labels = None
+depends_on = None
+
+# werkzeug's full "method$salt$hash" format, frozen here
+PASSWORD_HASH = re.compile(r'^(?:scrypt:\d+:\d+:\d+|pbkdf2:\w+(?::\d+)?)\$[A-Za-z0-9]+\$[0-9a-f]{32,}$')
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password', existing_type=sa.String(length=120), type_=sa.String(length=255),
+                              existing_nullable=False)
+
+    # Hash the passwords that are still stored in plain text
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('password', sa.String))
+    connection = op.get_bind()
+    for row in connection.execute(sa.select(user.c.id, user.c.password)).all():
+        if not PASSWORD_HASH.match(row.password):
+            connection.execute(user.update().where(user.c.id == row.id)
+                               .values(password=generate_password_hash(row.password)))
+
+
+def downgrade():
+    # Hashes cannot be turned back into the original passwords; only the column shrinks back
+    # when every stored value fits
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password', existing_type=sa.String(length=255), type_=sa.String(length=120),
+                              existing_nullable=False)
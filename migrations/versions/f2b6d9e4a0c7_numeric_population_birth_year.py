@@ -0,0 +1,84 @@
+"""numeric planet population and character birth year
+
+Revision ID: f2b6d9e4a0c7
+Revises: cc61b6e07961
+Create Date: 2026-10-18 15:12:40.318552
+
+"""
+import re
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b6d9e4a0c7'
+down_revision = 'cc61b6e07961'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+BIG_INTEGER_MAX = 2 ** 63 - 1
+BIRTH_YEAR = re.compile(r'^(-?\d+(?:\.\d+)?)\s*(BBY|ABY)?$', re.IGNORECASE)
+
+
+# Copies of models.parse_population / parse_birth_year as they were for this revision
+def parse_population(value):
+    if value is None:
+        return None
+    digits = re.sub(r'[\s,_]', '', str(value))
+    if not digits.isdigit() or int(digits) > BIG_INTEGER_MAX:
+        return None
+    return int(digits)
+
+
+def parse_birth_year(value):
+    match = BIRTH_YEAR.match(str(value).strip()) if value is not None else None
+    if match is None:
+        return None
+    years = float(match.group(1))
+    return -years if (match.group(2) or '').upper() == 'BBY' else years
+
+
+def backfill(table, source, target, parse):
+    """Fill `target` from `source` BATCH_SIZE rows at a time, walking the primary key."""
+    connection = op.get_bind()
+    statement = (table.update().where(table.c.id == sa.bindparam('row_id'))
+                 .values({target: sa.bindparam('value')}))
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.select(table.c.id, table.c[source]).where(table.c.id > last_id)
+                                  .order_by(table.c.id).limit(BATCH_SIZE)).all()
+        if not rows:
+            break
+        values = [{'row_id': row_id, 'value': parse(raw)} for row_id, raw in rows]
+        values = [value for value in values if value['value'] is not None]
+        if values:
+            connection.execute(statement, values)
+        last_id = rows[-1].id
+
+
+def upgrade():
+    with op.batch_alter_table('planet', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('population_count', sa.BigInteger(), nullable=True))
+    with op.batch_alter_table('character', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('birth_year_aby', sa.Float(), nullable=True))
+
+    planet = sa.table('planet', sa.column('id', sa.Integer), sa.column('population', sa.String),
+                      sa.column('population_count', sa.BigInteger))
+    character = sa.table('character', sa.column('id', sa.Integer), sa.column('birth_year', sa.String),
+                         sa.column('birth_year_aby', sa.Float))
+    backfill(planet, 'population', 'population_count', parse_population)
+    backfill(character, 'birth_year', 'birth_year_aby', parse_birth_year)
+
+    # Indexed after the backfill, so the updates do not maintain them row by row
+    op.create_index('ix_planet_population_count', 'planet', ['population_count', 'id'], unique=False)
+    op.create_index('ix_character_birth_year_aby', 'character', ['birth_year_aby', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_character_birth_year_aby', table_name='character')
+    op.drop_index('ix_planet_population_count', table_name='planet')
+    with op.batch_alter_table('character', schema=None) as batch_op:
+        batch_op.drop_column('birth_year_aby')
+    with op.batch_alter_table('planet', schema=None) as batch_op:
+        batch_op.drop_column('population_count')
@@ -1,10 +1,14 @@
-import os
 from flask_admin import Admin
 from models import db, User, Character, Planet, Vehicle, Favorite
 from flask_admin.contrib.sqla import ModelView
 
+class CatalogView(ModelView):
+    def __init__(self, model, session, **kwargs):
+        # Numeric columns are derived from their text field by the model, not edited
+        self.form_excluded_columns = [column for column, _ in getattr(model, 'normalized', {}).values()]
+        super().__init__(model, session, **kwargs)
+
 def setup_admin(app):
-    app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
     admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3')
 
@@ -13,7 +17,7 @@ def setup_admin(app):
     admin.add_view(ModelView(User, db.session))
 
     # Add additional models
-    admin.add_view(ModelView(Character, db.session))
-    admin.add_view(ModelView(Planet, db.session))
-    admin.add_view(ModelView(Vehicle, db.session))
+    admin.add_view(CatalogView(Character, db.session))
+    admin.add_view(CatalogView(Planet, db.session))
+    admin.add_view(CatalogView(Vehicle, db.session))
     admin.add_view(ModelView(Favorite, db.session))
\ No newline at end of file
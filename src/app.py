@@ -1,51 +1,169 @@
 """
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
+
+`create_app()` builds the application. The module-level `app` is created from it on
+first access, so `from app import app`, FLASK_APP=src/app.py and gunicorn `app:app`
+keep working. Components only some processes need are left out of the others:
+Flask-Admin is set up only when ADMIN_ENABLED (turn it off for API-only workers) and
+Flask-Migrate (which pulls in alembic) only under the `flask` command line.
+`python benchmarks/startup.py` reports what importing and building the app costs.
 """
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+from flask import Flask, jsonify
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
-from models import db, User
+from utils import APIException
+from db_config import database_url, replica_urls, engine_options, configure_engine, pool_stats
+from models import db
 from routes import api
+from cache import cache
+import versions
+from compression import compressor
+import instrumentation
+from search import search_index
+import favorite_summary
+import popularity
+import auth
+from ratelimit import limiter
+from replicas import router
+import favorites
+from jobs import runner
+import discovery
+
+
+def configure(app):
+    """Settings read from the environment."""
+    app.config['SECRET_KEY'] = os.environ.get('FLASK_APP_KEY', 'sample key')
+
+    #Flask-Admin at /admin (ADMIN_ENABLED=0 for API-only workers)
+    app.config['ADMIN_ENABLED'] = os.getenv("ADMIN_ENABLED", "1") not in ('0', 'false', 'no')
+
+    #Database configuration (pool settings come from DB_POOL_* environment variables)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    #Read replicas (DATABASE_REPLICA_URLS, comma-separated) for the read-only API views
+    app.config['SQLALCHEMY_REPLICA_URLS'] = replica_urls()
+    app.config['REPLICA_PIN_SECONDS'] = int(os.getenv("REPLICA_PIN_SECONDS", 5))
+    app.config['REPLICA_RETRY_SECONDS'] = int(os.getenv("REPLICA_RETRY_SECONDS", 30))
+    app.config['REPLICA_MAX_LAG_SECONDS'] = int(os.getenv("REPLICA_MAX_LAG_SECONDS", 10))
+
+    #Response cache configuration (CACHE_BACKEND=lru|redis|none; CACHE_URL=redis://... shares it between workers)
+    app.config['CACHE_BACKEND'] = os.getenv("CACHE_BACKEND", "")
+    app.config['CACHE_URL'] = os.getenv("CACHE_URL", "")
+    # Worker processes per server (gunicorn reads the same variable); a per-process cache is off above 1
+    app.config['WEB_CONCURRENCY'] = int(os.getenv("WEB_CONCURRENCY", 1))
+    app.config['CACHE_DEFAULT_TTL'] = int(os.getenv("CACHE_DEFAULT_TTL", 60))
+    app.config['CACHE_MAX_ENTRIES'] = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+
+    #HTTP caching of the public catalog (seconds) and compression (bodies under COMPRESS_MIN_SIZE bytes are sent as is)
+    app.config['CACHE_CONTROL_MAX_AGE'] = int(os.getenv("CACHE_CONTROL_MAX_AGE", 60))
+    app.config['CACHE_CONTROL_STALE_WHILE_REVALIDATE'] = int(os.getenv("CACHE_CONTROL_STALE_WHILE_REVALIDATE", 30))
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    app.config['COMPRESS_GZIP_LEVEL'] = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+    app.config['COMPRESS_BROTLI_QUALITY'] = int(os.getenv("COMPRESS_BROTLI_QUALITY", 4))
+    app.config['COMPRESS_ZSTD_LEVEL'] = int(os.getenv("COMPRESS_ZSTD_LEVEL", 3))
+
+    #Statements slower than this are logged with the endpoint that ran them
+    app.config['SLOW_QUERY_MS'] = int(os.getenv("SLOW_QUERY_MS", 200))
 
+    #Bearer tokens: lifetime, and how long a verified principal (an administrator) is trusted by other workers without CACHE_URL
+    app.config['AUTH_TOKEN_MAX_AGE'] = int(os.getenv("AUTH_TOKEN_MAX_AGE", 86400))
+    app.config['AUTH_CACHE_TTL'] = int(os.getenv("AUTH_CACHE_TTL", 60))
+    app.config['AUTH_ADMIN_CACHE_TTL'] = int(os.getenv("AUTH_ADMIN_CACHE_TTL", 5))
+    app.config['AUTH_CACHE_MAX_ENTRIES'] = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
 
-app = Flask(__name__)
-app.url_map.strict_slashes = False
+    #Rate limits ("<rate>/<period>[:<burst>]", empty = off) and load shedding (SHED_QUEUE_BUDGET_MS=0 = off)
+    app.config['RATELIMIT_DEFAULT'] = os.getenv("RATELIMIT_DEFAULT", "")
+    app.config['RATELIMIT_ROUTES'] = os.getenv("RATELIMIT_ROUTES", "")
+    app.config['RATELIMIT_TRUSTED_PROXIES'] = int(os.getenv("RATELIMIT_TRUSTED_PROXIES", 0))
+    app.config['SHED_QUEUE_BUDGET_MS'] = int(os.getenv("SHED_QUEUE_BUDGET_MS", 0))
+    app.config['SHED_MAX_CONCURRENCY'] = int(os.getenv("SHED_MAX_CONCURRENCY", 0))
 
-#Database configuration
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    #Time-window popularity rankings: how many targets are kept and how often they are recomputed
+    app.config['POPULARITY_MAX_K'] = int(os.getenv("POPULARITY_MAX_K", 100))
+    app.config['POPULARITY_REFRESH_SECONDS'] = int(os.getenv("POPULARITY_REFRESH_SECONDS", 300))
 
-# Initialize extensions
-MIGRATE = Migrate(app, db)
-db.init_app(app)
-CORS(app)
+    #Background jobs: worker threads per process (0 = only `flask jobs-work` runs them) and retries
+    app.config['JOBS_WORKERS'] = int(os.getenv("JOBS_WORKERS", 2))
+    app.config['JOBS_MAX_ATTEMPTS'] = int(os.getenv("JOBS_MAX_ATTEMPTS", 3))
+    app.config['JOBS_RETRY_SECONDS'] = int(os.getenv("JOBS_RETRY_SECONDS", 10))
+    app.config['JOBS_STALE_SECONDS'] = int(os.getenv("JOBS_STALE_SECONDS", 600))
 
+    #GET /healthz: how long the database check may take, and how long its result is reused
+    app.config['HEALTHZ_TIMEOUT_SECONDS'] = float(os.getenv("HEALTHZ_TIMEOUT_SECONDS", 2))
+    app.config['HEALTHZ_CACHE_SECONDS'] = float(os.getenv("HEALTHZ_CACHE_SECONDS", 1))
 
-# Setup Admin
-setup_admin(app)
 
-# Register routes
-app.register_blueprint(api, url_prefix='/starwars')
+def create_app(config=None):
+    """Build the app; `config` overrides the settings read from the environment.
+
+    The extensions are module-level singletons, so build one app per process.
+    """
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
+    configure(app)
+    if config:
+        app.config.update(config)
+
+    # Initialize extensions
+    db.init_app(app)
+    with app.app_context():
+        configure_engine(db.engine)
+    CORS(app)
+    cache.init_app(app, db.session)
+    versions.init_app(app, db)
+    compressor.init_app(app)
+    instrumentation.init_app(app, db)
+    search_index.init_app(app, db)
+    favorite_summary.init_app(app, db)
+    popularity.init_app(app, db)
+    auth.init_app(app, db)
+    limiter.init_app(app)
+    router.init_app(app, db)
+    favorites.listen(db.session)
+    runner.init_app(app, db)
+
+    # Only the `flask` command line (which sets FLASK_RUN_FROM_CLI) needs the `db`
+    # commands; servers skip importing alembic altogether
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    # Setup Admin
+    if app.config['ADMIN_ENABLED']:
+        from admin import setup_admin
+        setup_admin(app)
+
+    # Register routes
+    app.register_blueprint(api, url_prefix='/starwars')
+    app.register_error_handler(APIException, handle_invalid_usage)
+    app.add_url_rule('/db/pool', view_func=db_pool)
+    # Sitemap at /, OpenAPI spec and health check
+    discovery.init_app(app, db)
+    return app
 
 # Error handler
-@app.errorhandler(APIException)
 def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
-# generate sitemap with all your endpoints
-@app.route('/')
-def sitemap():
-    return generate_sitemap(app)
+# Connection pool usage for this worker
+def db_pool():
+    stats = pool_stats(db.engine)
+    if router.replicas:
+        stats['replicas'] = router.stats()
+    return jsonify(stats), 200
+
+
+def __getattr__(name):
+    # `app` is built on first use rather than on import
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Run the app / this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3000))
-    app.run(host='0.0.0.0', port=PORT, debug=False)
+    create_app().run(host='0.0.0.0', port=PORT, debug=False)
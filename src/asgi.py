@@ -0,0 +1,260 @@
+"""
+ASGI entry point.
+
+The read endpoints (catalog lists and details, the user list) are served natively
+async from SQLAlchemy's async engine (aiosqlite / asyncpg), so one process can keep
+many slow requests in flight. They are instrumented like Flask requests (Server-Timing,
+the /metrics histograms, slow query logging). Every other request is handed to the
+regular Flask app through asgiref's WSGI adapter, so behavior is unchanged for writes
+and admin. So are the read endpoints a rate limit applies to, all of them when load
+shedding or read replicas are configured: the limiter, the shedder and the replica
+router only run inside Flask.
+
+    $ uvicorn asgi:application --app-dir src
+    $ gunicorn asgi:application --chdir ./src/ -k uvicorn.workers.UvicornWorker
+
+ASYNC_READS=0 sends every request through Flask; ASYNC_DATABASE_URL overrides the
+async driver URL derived from DATABASE_URL.
+"""
+import os
+import re
+import time
+from urllib.parse import parse_qsl, urlencode
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy import event, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import http_date, parse_date, parse_etags
+from app import app
+from compression import compressor
+from db_config import engine_options, env_int, STATEMENT_TIMEOUT_MS
+from instrumentation import logger as slow_query_logger, server_timing
+from listing import parse_id_list
+from models import User
+from resources import RESOURCES
+from serialization import dumps, public_columns
+from utils import APIException
+import versions
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg'
+}
+
+
+def async_database_url(uri):
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver configured for '{backend}'; set ASYNC_DATABASE_URL or ASYNC_READS=0")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def async_engine_options(url):
+    options = {key: value for key, value in engine_options(str(url)).items()
+               if key not in ('poolclass', 'connect_args')}
+    if 'pool_size' in options:
+        # SQLAlchemy 1.4 gives aiosqlite a NullPool, which takes no pool arguments
+        options['poolclass'] = AsyncAdaptedQueuePool
+    if url.get_backend_name() == 'postgresql':
+        timeout_ms = env_int('DB_STATEMENT_TIMEOUT_MS', STATEMENT_TIMEOUT_MS)
+        if timeout_ms:
+            options['connect_args'] = {'server_settings': {'statement_timeout': str(timeout_ms)}}
+    return options
+
+
+class AsyncRequest:
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query_string = scope.get('query_string', b'').decode('latin-1')
+        self.args = MultiDict(parse_qsl(self.query_string, keep_blank_values=True))
+        self.headers = {key.decode('latin-1').lower(): value.decode('latin-1') for key, value in scope['headers']}
+
+    @property
+    def full_path(self):
+        # Same shape as flask.Request.full_path, which the ETags are computed from
+        return self.path + '?' + self.query_string
+
+
+def list_view(listing, message):
+    async def view(session, request):
+        ids = parse_id_list('ids', request.args)
+        if ids is not None:
+            fields, statement = listing.lookup_statement(ids, listing.selected_fields(request.args))
+            result = await session.execute(statement)
+            items, missing = listing.lookup_result(fields, ids, result.all())
+            return 200, {"message": message, listing.collection: items, "missing": missing}
+
+        fields, limit, statement = listing.statement(request.args)
+        result = await session.execute(statement)
+        items, cursor = listing.result(fields, limit, result.all())
+        next_url = None
+        if cursor is not None:
+            args = request.args.to_dict()
+            args['cursor'] = cursor
+            next_url = request.path + '?' + urlencode(args)
+        return 200, {"message": message, listing.collection: items, "next": next_url}
+    return view
+
+
+def detail_view(model, key, message, missing):
+    async def view(session, request, id):
+        result = await session.execute(select(*public_columns(model)).where(model.id == int(id)))
+        row = result.first()
+        if row is None:
+            return 404, {"error": missing}
+        return 200, {"message": message, key: dict(zip(model.public_fields, row))}
+    return view
+
+
+async def users_view(session, request):
+    result = await session.execute(select(*public_columns(User)).order_by(User.id))
+    return 200, [dict(zip(User.public_fields, row)) for row in result.all()]
+
+
+# (pattern, tables the response depends on, view, Flask endpoint whose cache policy applies)
+ROUTES = [(re.compile(r'^/starwars/users/?$'), ('user',), users_view, 'api.get_users')]
+for resource in RESOURCES.values():
+    ROUTES.append((re.compile(rf'^/starwars/{resource.name}/?$'), (resource.table,),
+                   list_view(resource.listing, f"This is your GET {resource.collection} request"),
+                   f'api.get_{resource.name}'))
+    ROUTES.append((re.compile(rf'^/starwars/{resource.name}/(\d+)/?$'), (resource.table,),
+                   detail_view(resource.model, resource.kind, f"This is your GET {resource.kind} request",
+                               f"{resource.label} not found"),
+                   f'api.get_{resource.kind}'))
+
+
+class AsyncReadApp:
+    def __init__(self, flask_app, database_uri, async_reads=True):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.async_reads = async_reads
+        url = make_url(os.getenv('ASYNC_DATABASE_URL') or async_database_url(database_uri))
+        self.engine = create_async_engine(url, **async_engine_options(url))
+        # sessionmaker(class_=AsyncSession) rather than async_sessionmaker, which needs SQLAlchemy 2.0
+        self.sessions = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.metrics = flask_app.extensions.get('request_metrics')
+        self.instrument(flask_app.config.get('SLOW_QUERY_MS', 200) / 1000)
+
+    def instrument(self, slow_query_seconds):
+        # Statements are counted into the timing dict the request put on its connection
+        @event.listens_for(self.engine.sync_engine, 'before_cursor_execute')
+        def start_timer(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context.query_started = time.perf_counter()
+
+        @event.listens_for(self.engine.sync_engine, 'after_cursor_execute')
+        def stop_timer(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, 'query_started', None)
+            timing = conn.info.get('request_timing')
+            if started is None or timing is None:
+                return
+            elapsed = time.perf_counter() - started
+            timing['db_count'] += 1
+            timing['db_time'] += elapsed
+            if elapsed >= slow_query_seconds:
+                if self.metrics is not None:
+                    self.metrics.record_slow_query(timing['endpoint'])
+                slow_query_logger.warning("Slow query (%.1f ms) in %s: %s", elapsed * 1000, timing['endpoint'], statement)
+
+    def handled_by_flask(self, endpoint):
+        """True when the limiter, the shedder or the replica router applies to the endpoint."""
+        limiter = self.flask_app.extensions.get('rate_limiter')
+        if limiter is not None and (limiter.shedder is not None or limiter.routes.get(endpoint, limiter.default)):
+            return True
+        router = self.flask_app.extensions.get('replica_router')
+        return router is not None and bool(router.replicas)
+
+    def match(self, scope):
+        if not self.async_reads or scope['method'] not in ('GET', 'HEAD'):
+            return None
+        for pattern, tables, view, endpoint in ROUTES:
+            found = pattern.match(scope['path'])
+            if found:
+                if self.handled_by_flask(endpoint):
+                    return None
+                policy = versions.view_policy(self.flask_app.view_functions.get(endpoint), scope['method'])
+                return endpoint, tables, view, policy, found.groups()
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        matched = self.match(scope) if scope['type'] == 'http' else None
+        if matched is None:
+            return await self.wsgi(scope, receive, send)
+        await self.handle(AsyncRequest(scope), *matched, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def handle(self, request, endpoint, tables, view, policy, groups, send):
+        started = time.perf_counter()
+        timing = {'endpoint': endpoint, 'db_count': 0, 'db_time': 0.0}
+        headers = [(b'access-control-allow-origin', b'*')]
+        coding = None
+        async with self.sessions() as session:
+            connection = await session.connection()
+            connection.sync_connection.info['request_timing'] = timing
+            try:
+                result = await session.execute(versions.versions_statement(tables))
+                table_versions, last_modified = versions.summarize_versions(tables, result.all())
+                etag = versions.compute_etag(table_versions, request.full_path)
+                last_modified = versions.http_last_modified(last_modified)
+
+                if_none_match = parse_etags(request.headers.get('if-none-match'))
+                if_modified_since = parse_date(request.headers.get('if-modified-since'))
+                if versions.is_not_modified(etag, last_modified, if_none_match, if_modified_since):
+                    status, body = 304, b''
+                else:
+                    status, payload = await view(session, request, *groups)
+                    body = dumps(payload)
+                    headers.append((b'content-type', b'application/json'))
+                if status == 200 and request.method == 'GET':
+                    body, coding = compressor.encode(request.headers.get('accept-encoding'), 'application/json', body)
+                if coding is not None:
+                    headers.append((b'content-encoding', coding.encode()))
+                if status in (200, 304):
+                    weak = 'W/' if coding is not None else ''
+                    headers.append((b'etag', f'{weak}"{etag}"'.encode()))
+                    if last_modified is not None:
+                        headers.append((b'last-modified', http_date(last_modified).encode()))
+            except APIException as error:
+                status, body = error.status_code, dumps(error.to_dict())
+                headers.append((b'content-type', b'application/json'))
+            finally:
+                connection.sync_connection.info.pop('request_timing', None)
+
+        # Same Cache-Control / Vary as the Flask hooks would add
+        vary = ['Accept-Encoding']
+        for header, value in versions.cache_headers(policy, status, self.flask_app.config):
+            if header == 'Vary':
+                vary.append(value)
+            else:
+                headers.append((header.lower().encode(), value.encode()))
+        headers.append((b'vary', ', '.join(vary).encode()))
+
+        duration = time.perf_counter() - started
+        for value in server_timing(duration, timing['db_time'], timing['db_count']):
+            headers.append((b'server-timing', value.encode()))
+        if self.metrics is not None:
+            self.metrics.record(endpoint, duration, timing['db_time'], timing['db_count'])
+
+        headers.append((b'content-length', str(len(body)).encode()))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b'' if request.method == 'HEAD' else body})
+
+
+application = AsyncReadApp(app, app.config['SQLALCHEMY_DATABASE_URI'],
+                           async_reads=os.getenv('ASYNC_READS', '1') not in ('0', 'false', 'no'))
@@ -0,0 +1,169 @@
+"""
+Token authentication.
+
+POST /starwars/login trades a username and password for a signed, timestamped token
+(itsdangerous, keyed by the app's secret key). Requests send it as
+`Authorization: Bearer <token>`.
+
+A token is verified against the database once; the resulting principal (id, username,
+is_admin) is then kept in a per-process cache keyed by the token, so the admin check
+and the user lookup cost no query on the hot path. Entries are tied to a per-user
+generation token: any commit that changes or deletes a user (API, Flask-Admin, bulk
+statements) replaces it, so cached principals of that user stop being trusted. With
+CACHE_URL set the generation tokens live in redis and every worker sees the change
+at once. Without it they are per process: other workers pick the change up within
+AUTH_CACHE_TTL seconds, and administrators within AUTH_ADMIN_CACHE_TTL, so a revoked
+admin right does not outlive a few seconds. Tokens also carry a fingerprint of the
+password hash, so changing a password revokes them.
+"""
+import hashlib
+import time
+import uuid
+from collections import namedtuple
+from flask import current_app, g, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from sqlalchemy import event, select
+from cache import LRUBackend, SharedBackend, redis_client
+from models import db, User
+from utils import APIException
+
+Principal = namedtuple('Principal', 'id username is_admin')
+
+TOKEN_SALT = 'starwars-auth'
+
+
+def password_fingerprint(password_hash):
+    return hashlib.sha256(password_hash.encode()).hexdigest()[:16]
+
+
+def serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt=TOKEN_SALT)
+
+
+def issue_token(user):
+    return serializer().dumps({'uid': user.id, 'pwd': password_fingerprint(user.password)})
+
+
+class PrincipalCache:
+    def __init__(self, backend=None, generations=None, admin_ttl=None):
+        self.backend = backend or LRUBackend(10000, 60)
+        # Where generation tokens live: shared between workers, or the local backend
+        self.generations = generations or self.backend
+        # Lifetime of cached administrators when generations are not shared
+        self.admin_ttl = admin_ttl
+
+    @property
+    def shared(self):
+        return self.generations is not self.backend
+
+    def generation(self, user_id):
+        key = f'principal-gen:{user_id}'
+        token = self.generations.get(key)
+        if token is None:
+            token = uuid.uuid4().hex
+            self.generations.set(key, token, ttl=0)
+        return token
+
+    def get(self, token):
+        entry = self.backend.get('principal:' + token)
+        if entry is None:
+            return None
+        principal, expires_at, generations = entry
+        if expires_at < time.time() or generations != (self.generation('*'), self.generation(principal.id)):
+            return None
+        return principal
+
+    def set(self, token, principal, expires_at):
+        generations = (self.generation('*'), self.generation(principal.id))
+        ttl = self.admin_ttl if principal.is_admin and not self.shared else None
+        self.backend.set('principal:' + token, (principal, expires_at, generations), ttl)
+
+    def invalidate(self, user_ids):
+        for user_id in user_ids:
+            self.generations.set(f'principal-gen:{user_id}', uuid.uuid4().hex, ttl=0)
+
+    def listen(self, session):
+        # Same shape as the response cache: collect in the flush, act after the commit
+        @event.listens_for(session, 'after_flush')
+        def collect_users(session, flush_context):
+            users = session.info.setdefault('auth_dirty_users', set())
+            for obj in list(session.dirty) + list(session.deleted):
+                if isinstance(obj, User):
+                    users.add(obj.id)
+
+        @event.listens_for(session, 'do_orm_execute')
+        def collect_bulk(orm_execute_state):
+            if orm_execute_state.is_update or orm_execute_state.is_delete:
+                table = getattr(orm_execute_state.statement, 'table', None)
+                if table is not None and table.name == User.__tablename__:
+                    orm_execute_state.session.info.setdefault('auth_dirty_users', set()).add('*')
+
+        @event.listens_for(session, 'after_commit')
+        def invalidate_committed(session):
+            users = session.info.pop('auth_dirty_users', None)
+            if users:
+                self.invalidate(users)
+
+        @event.listens_for(session, 'after_rollback')
+        def discard_pending(session):
+            session.info.pop('auth_dirty_users', None)
+
+
+principals = PrincipalCache()
+
+
+def bearer_token():
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        raise APIException("Missing bearer token", status_code=401)
+    return token.strip()
+
+
+def load_principal(token):
+    max_age = current_app.config['AUTH_TOKEN_MAX_AGE']
+    try:
+        payload, issued_at = serializer().loads(token, max_age=max_age, return_timestamp=True)
+    except SignatureExpired:
+        raise APIException("Token expired", status_code=401)
+    except BadSignature:
+        raise APIException("Invalid token", status_code=401)
+
+    # Always checked on the primary: a lagging replica could still accept a revoked password
+    row = db.session.execute(
+        select(User.id, User.username, User.is_admin, User.password).where(User.id == payload.get('uid')),
+        bind_arguments={'bind': db.engine}).first()
+    if row is None or password_fingerprint(row.password) != payload.get('pwd'):
+        raise APIException("Invalid token", status_code=401)
+    principal = Principal(row.id, row.username, row.is_admin)
+    principals.set(token, principal, issued_at.timestamp() + max_age)
+    return principal
+
+
+def cached_principal():
+    """The principal of this request if this process has already verified its token; never queries."""
+    try:
+        return principals.get(bearer_token())
+    except APIException:
+        return None
+
+
+def current_user():
+    """The authenticated principal of this request; raises a 401 APIException otherwise."""
+    if 'principal' not in g:
+        token = bearer_token()
+        g.principal = principals.get(token) or load_principal(token)
+    return g.principal
+
+
+def init_app(app, db):
+    app.config.setdefault('AUTH_TOKEN_MAX_AGE', 86400)
+    ttl = app.config.get('AUTH_CACHE_TTL', 60)
+    principals.backend = LRUBackend(app.config.get('AUTH_CACHE_MAX_ENTRIES', 10000), ttl)
+    if app.config.get('CACHE_URL'):
+        principals.generations = SharedBackend(redis_client(app.config['CACHE_URL']), prefix='starwars:auth:')
+    else:
+        principals.generations = principals.backend
+    principals.admin_ttl = app.config.get('AUTH_ADMIN_CACHE_TTL', 5)
+    principals.listen(db.session)
+    app.extensions['principal_cache'] = principals
+
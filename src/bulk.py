@@ -0,0 +1,160 @@
+"""
+Bulk import and delete for the catalog tables.
+
+Items arrive either as a JSON array or as an NDJSON stream (one object per line,
+read incrementally). Valid items are inserted in chunks with a single executemany
+per chunk and the whole request is committed once; invalid items are skipped and
+reported back with their position in the input.
+"""
+import json
+from flask import request
+from sqlalchemy import delete, func, insert, select
+from models import db
+from favorites import delete_favorites_of, KIND_BY_MODEL
+from utils import APIException
+from search import search_index, KIND_BY_TABLE, SEARCHABLE
+from resources import RESOURCES
+
+DEFAULT_CHUNK_SIZE = 1000
+
+BULK = {name: resource.model for name, resource in RESOURCES.items()}
+
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def read_items():
+    if request.mimetype == 'application/x-ndjson':
+        return read_ndjson()
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise APIException("Expected a JSON array or an application/x-ndjson body", status_code=400)
+    return iter(data)
+
+
+def read_ndjson():
+    for line in request.stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield ValueError("Invalid JSON line")
+
+
+def validate(model, item):
+    if isinstance(item, ValueError):
+        return None, str(item)
+    if not isinstance(item, dict):
+        return None, "Item must be a JSON object"
+
+    # Numeric columns derived from a text field are computed here, never taken from the item
+    derived = {target: (field, parse) for field, (target, parse) in getattr(model, 'normalized', {}).items()}
+    row = {}
+    for column in model.__table__.columns:
+        if column.primary_key or column.key in derived:
+            continue
+        value = item.get(column.key)
+        if value is None:
+            if not column.nullable and column.default is None:
+                return None, f"'{column.key}' is required"
+            # Every row of an executemany needs the same keys (SQLAlchemy 1.4)
+            if column.default is None:
+                row[column.key] = None
+            continue
+        if not isinstance(value, str):
+            return None, f"'{column.key}' must be a string"
+        if column.type.length and len(value) > column.type.length:
+            return None, f"'{column.key}' is longer than {column.type.length} characters"
+        row[column.key] = value
+
+    unknown = set(item) - (set(model.__table__.columns.keys()) - set(derived))
+    if unknown:
+        return None, "Unknown fields: " + ", ".join(sorted(unknown))
+    for target, (field, parse) in derived.items():
+        row[target] = parse(row.get(field))
+    return row, None
+
+
+def bulk_insert(model, items, chunk_size=DEFAULT_CHUNK_SIZE):
+    inserted = 0
+    errors = []
+
+    def valid_rows():
+        for index, item in enumerate(items):
+            row, error = validate(model, item)
+            if error:
+                errors.append({"index": index, "error": error})
+            else:
+                yield row
+
+    # Rows going into the search index need their new ids back
+    kind = KIND_BY_TABLE.get(model.__tablename__)
+    indexed = kind is not None and search_index.maintained_on(db.session.connection())
+    if indexed:
+        _, name, others, _ = SEARCHABLE[kind]
+        columns = [model.__table__.c[field] for field in ('id', name) + others]
+        returning = db.session.get_bind().dialect.insert_executemany_returning
+    try:
+        for chunk in chunked(valid_rows(), chunk_size):
+            if indexed and returning:
+                rows = db.session.execute(insert(model).returning(*columns), chunk).mappings().all()
+                search_index.index_rows(db.session.connection(), kind, rows)
+            elif indexed:
+                # No RETURNING with executemany (SQLite on SQLAlchemy 1.4): new ids come
+                # after the largest one; re-indexing a concurrent writer's row is harmless
+                last_id = db.session.execute(select(func.max(model.id))).scalar() or 0
+                db.session.execute(insert(model), chunk)
+                rows = db.session.execute(select(*columns).where(model.id > last_id)).mappings().all()
+                search_index.index_rows(db.session.connection(), kind, rows)
+            else:
+                db.session.execute(insert(model), chunk)
+            inserted += len(chunk)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return inserted, errors
+
+
+def parse_ids(values):
+    if not isinstance(values, list):
+        raise APIException("Expected a list of ids", status_code=400)
+    try:
+        return sorted({int(value) for value in values})
+    except (TypeError, ValueError):
+        raise APIException("Ids must be integers", status_code=400)
+
+
+def request_ids():
+    """Ids from ?ids=1,2,3 or from a JSON body {"ids": [1, 2, 3]}."""
+    if request.args.get('ids'):
+        return parse_ids(request.args['ids'].split(','))
+    data = request.get_json(silent=True) or {}
+    return parse_ids(data.get('ids'))
+
+
+def bulk_delete(model, ids, chunk_size=DEFAULT_CHUNK_SIZE):
+    deleted = 0
+    kind = KIND_BY_MODEL[model]
+    try:
+        for chunk in chunked(ids, chunk_size):
+            delete_favorites_of(db.session, kind, chunk)
+            result = db.session.execute(delete(model).where(model.id.in_(chunk)))
+            deleted += result.rowcount
+            if model.__tablename__ in KIND_BY_TABLE:
+                search_index.remove_ids(db.session.connection(), KIND_BY_TABLE[model.__tablename__], chunk)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return deleted
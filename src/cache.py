@@ -0,0 +1,204 @@
+"""
+Response cache for the read endpoints of the catalog.
+
+Cached responses are keyed by request path plus a generation token for every table
+the view reads. Any commit that touches one of those tables (API handlers, Flask-Admin
+edits, bulk statements) replaces the token, so older entries are simply never read
+again and age out of the backend.
+
+Backends only need get/set/delete: `LRUBackend` keeps entries in-process, while
+`SharedBackend` wraps any redis-py style client so several workers see the same
+entries and invalidations. CACHE_URL (redis://...) selects the shared backend. An
+in-process cache only sees its own worker's commits, so with WEB_CONCURRENCY > 1
+and no CACHE_URL the response cache is turned off rather than serve stale bodies.
+
+Responses read from a replica are served but never stored: the replica may still lag
+behind the commit that replaced the token, and its body would be cached as current.
+"""
+import logging
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, g, request, make_response
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    def get(self, key):
+        raise NotImplementedError()
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError()
+
+    def delete(self, key):
+        raise NotImplementedError()
+
+
+class NullBackend(CacheBackend):
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+
+class LRUBackend(CacheBackend):
+    def __init__(self, max_entries=1024, default_ttl=60):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class SharedBackend(CacheBackend):
+    """Wraps a client exposing redis-py's get(key) / set(key, value, ex=) / delete(key)."""
+
+    def __init__(self, client, prefix='starwars:', default_ttl=60):
+        self.client = client
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+def redis_client(url):
+    """A redis-py client for `url`; redis is only needed when a shared backend is configured."""
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError(f"CACHE_URL={url} needs the redis package (pip install redis)")
+    return redis.Redis.from_url(url)
+
+
+class ResponseCache:
+    def __init__(self, backend=None):
+        self.backend = backend or NullBackend()
+
+    def init_app(self, app, session, backend=None):
+        if backend is None:
+            kind = app.config.get('CACHE_BACKEND') or ('redis' if app.config.get('CACHE_URL') else 'lru')
+            if kind == 'redis':
+                if not app.config.get('CACHE_URL'):
+                    raise RuntimeError("CACHE_BACKEND=redis needs CACHE_URL")
+                backend = SharedBackend(redis_client(app.config['CACHE_URL']),
+                                        default_ttl=app.config.get('CACHE_DEFAULT_TTL', 60))
+            elif kind == 'lru' and app.config.get('WEB_CONCURRENCY', 1) > 1:
+                # Other workers would keep serving what this one's commits invalidated
+                logger.warning("Response cache disabled: CACHE_BACKEND=lru is per process and "
+                               "WEB_CONCURRENCY=%s; set CACHE_URL to share it", app.config['WEB_CONCURRENCY'])
+                backend = NullBackend()
+            elif kind == 'lru':
+                backend = LRUBackend(app.config.get('CACHE_MAX_ENTRIES', 1024),
+                                     app.config.get('CACHE_DEFAULT_TTL', 60))
+            else:
+                backend = NullBackend()
+        self.backend = backend
+        self.listen(session)
+        app.extensions['response_cache'] = self
+
+    def generation(self, table):
+        key = 'gen:' + table
+        token = self.backend.get(key)
+        if token is None:
+            token = uuid.uuid4().hex
+            self.backend.set(key, token, ttl=0)
+        return token
+
+    def invalidate(self, *tables):
+        for table in tables:
+            self.backend.set('gen:' + table, uuid.uuid4().hex, ttl=0)
+
+    def key_for(self, tables):
+        generations = ','.join(self.generation(table) for table in tables)
+        return 'resp:' + generations + ':' + request.full_path
+
+    def cached(self, *tables, ttl=None):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                key = self.key_for(tables)
+                hit = self.backend.get(key)
+                if hit is not None:
+                    body, status, mimetype = hit
+                    return Response(body, status=status, mimetype=mimetype)
+
+                response = make_response(view(*args, **kwargs))
+                from_replica = g.get('replica_connection') is not None
+                if response.status_code == 200 and not response.is_streamed and not from_replica:
+                    self.backend.set(key, (response.get_data(), response.status_code, response.mimetype), ttl)
+                return response
+            return wrapper
+        return decorator
+
+    def listen(self, session):
+        # Collect the tables written by each flush and invalidate them once the
+        # transaction commits; a rollback discards the pending set.
+        @event.listens_for(session, 'after_flush')
+        def collect_flushed(session, flush_context):
+            tables = session.info.setdefault('cache_dirty_tables', set())
+            for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+                table = getattr(obj, '__tablename__', None)
+                if table:
+                    tables.add(table)
+
+        @event.listens_for(session, 'do_orm_execute')
+        def collect_bulk(orm_execute_state):
+            if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+                table = getattr(orm_execute_state.statement, 'table', None)
+                if table is not None:
+                    orm_execute_state.session.info.setdefault('cache_dirty_tables', set()).add(table.name)
+
+        @event.listens_for(session, 'after_commit')
+        def invalidate_committed(session):
+            tables = session.info.pop('cache_dirty_tables', None)
+            if tables:
+                self.invalidate(*tables)
+
+        @event.listens_for(session, 'after_rollback')
+        def discard_pending(session):
+            session.info.pop('cache_dirty_tables', None)
+
+
+cache = ResponseCache()
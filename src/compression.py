@@ -0,0 +1,174 @@
+"""
+Response compression negotiated from Accept-Encoding.
+
+zstd and brotli are used when their packages (zstandard, brotli) are installed, gzip
+always is; among the codings the client accepts they are preferred in that order. Bodies
+shorter than COMPRESS_MIN_SIZE are sent as they are. Streamed responses (the
+exports) are compressed chunk by chunk as they are generated, so memory stays flat.
+
+A compressed body is no longer byte-identical to the uncompressed one, so its ETag
+is made weak; conditional GETs use weak comparison and keep answering 304.
+"""
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'text/')
+
+
+class GzipCoder:
+    name = 'gzip'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compressor(self):
+        # wbits=31: zlib stream with a gzip header and trailer
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return compressor.compress, compressor.flush
+
+
+class BrotliCoder:
+    name = 'br'
+
+    def __init__(self, quality):
+        self.quality = quality
+
+    def compressor(self):
+        compressor = brotli.Compressor(quality=self.quality)
+        return compressor.process, compressor.finish
+
+
+class ZstdCoder:
+    name = 'zstd'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compressor(self):
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        return compressor.compress, compressor.flush
+
+
+def available_coders(config):
+    coders = []
+    if zstandard is not None:
+        coders.append(ZstdCoder(config.get('COMPRESS_ZSTD_LEVEL', 3)))
+    if brotli is not None:
+        coders.append(BrotliCoder(config.get('COMPRESS_BROTLI_QUALITY', 4)))
+    coders.append(GzipCoder(config.get('COMPRESS_GZIP_LEVEL', 6)))
+    return coders
+
+
+def accepted_codings(header):
+    """{coding: q} from an Accept-Encoding header."""
+    accepted = {}
+    for item in (header or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+def negotiate(coders, header):
+    accepted = accepted_codings(header)
+    wildcard = accepted.get('*', 0)
+    for coder in coders:
+        if accepted.get(coder.name, wildcard) > 0:
+            return coder
+    return None
+
+
+def compress(coder, body):
+    compress_chunk, finish = coder.compressor()
+    return compress_chunk(body) + finish()
+
+
+def compress_stream(coder, chunks):
+    compress_chunk, finish = coder.compressor()
+    try:
+        for chunk in chunks:
+            data = compress_chunk(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE)
+
+
+class ResponseCompressor:
+    def __init__(self):
+        self.coders = [GzipCoder(6)]
+        self.min_size = 1024
+
+    def init_app(self, app):
+        self.coders = available_coders(app.config)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+
+        @app.after_request
+        def compress_response(response):
+            return self.compress_response(response, request.method, request.headers.get('Accept-Encoding'))
+
+        app.extensions['compression'] = self
+
+    def encode(self, accept_encoding, mimetype, body):
+        """(body, coding) for a buffered 200 response; coding is None when it is sent as is."""
+        if not is_compressible(mimetype) or len(body) < self.min_size:
+            return body, None
+        coder = negotiate(self.coders, accept_encoding)
+        if coder is None:
+            return body, None
+        return compress(coder, body), coder.name
+
+    def compress_response(self, response, method, accept_encoding):
+        if not is_compressible(response.mimetype) or 'Content-Encoding' in response.headers:
+            return response
+        # Caches must keep the encodings apart even for the responses left uncompressed
+        response.vary.add('Accept-Encoding')
+        if response.status_code != 200 or method == 'HEAD':
+            return response
+
+        if response.is_streamed:
+            coder = negotiate(self.coders, accept_encoding)
+            if coder is None:
+                return response
+            response.response = compress_stream(coder, response.response)
+            response.headers.pop('Content-Length', None)
+            coding = coder.name
+        else:
+            body, coding = self.encode(accept_encoding, response.mimetype, response.get_data())
+            if coding is None:
+                return response
+            response.set_data(body)
+        response.headers['Content-Encoding'] = coding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+compressor = ResponseCompressor()
@@ -0,0 +1,176 @@
+"""
+Database engine configuration.
+
+Pool parameters are read from the environment (DB_POOL_SIZE, DB_MAX_OVERFLOW,
+DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT_MS) on top
+of per-driver defaults for the drivers in the Pipfile: psycopg2, mysqlclient /
+mysql-connector and SQLite. The pool also records how many checkouts happened and
+how long they waited for a free connection.
+
+DATABASE_REPLICA_URLS (comma-separated) lists read replicas; `RoutingSession` sends
+a request's reads to the replica chosen for it (see replicas.py).
+"""
+import os
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from flask_sqlalchemy.session import Session
+
+DEFAULT_DATABASE_URL = "sqlite:////tmp/test.db"
+
+DRIVER_DEFAULTS = {
+    'postgresql': {'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 10, 'pool_recycle': 1800, 'pool_pre_ping': True},
+    'mysql': {'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 10, 'pool_recycle': 280, 'pool_pre_ping': True},
+    'sqlite': {'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 10, 'pool_recycle': -1, 'pool_pre_ping': False}
+}
+
+STATEMENT_TIMEOUT_MS = 30000
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return default if value in (None, '') else int(value)
+
+
+def env_bool(name, default):
+    value = os.getenv(name)
+    return default if value in (None, '') else value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def database_url():
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is None:
+        return DEFAULT_DATABASE_URL
+    return db_url.replace("postgres://", "postgresql://")
+
+
+def replica_urls():
+    urls = os.getenv("DATABASE_REPLICA_URLS", "")
+    return [url.strip().replace("postgres://", "postgresql://") for url in urls.split(',') if url.strip()]
+
+
+class RoutingSession(Session):
+    """Session that reads through `info['replica']` (a replica connection) when one is set."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get('replica')
+        if replica is not None and bind is None and not self._flushing:
+            return replica
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+def is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+
+    def record_wait(self, seconds):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def record_timeout(self):
+        with self.lock:
+            self.timeouts += 1
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waits for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+
+def engine_options(uri):
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend == 'sqlite' and is_memory_sqlite(url):
+        return {'connect_args': {'check_same_thread': False}}
+
+    defaults = DRIVER_DEFAULTS.get(backend, DRIVER_DEFAULTS['postgresql'])
+    options = {
+        'poolclass': MeteredQueuePool,
+        'pool_size': env_int('DB_POOL_SIZE', defaults['pool_size']),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', defaults['max_overflow']),
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', defaults['pool_timeout']),
+        'pool_recycle': env_int('DB_POOL_RECYCLE', defaults['pool_recycle']),
+        'pool_pre_ping': env_bool('DB_POOL_PRE_PING', defaults['pool_pre_ping'])
+    }
+
+    timeout_ms = env_int('DB_STATEMENT_TIMEOUT_MS', STATEMENT_TIMEOUT_MS)
+    if backend == 'postgresql' and url.get_driver_name() == 'psycopg2' and timeout_ms:
+        options['connect_args'] = {'options': f'-c statement_timeout={timeout_ms}'}
+    elif backend == 'sqlite':
+        # Pooled connections move between threads; the timeout is how long a writer
+        # waits on the database lock
+        options['connect_args'] = {'check_same_thread': False, 'timeout': (timeout_ms or STATEMENT_TIMEOUT_MS) / 1000}
+    return options
+
+
+def configure_engine(engine):
+    """Per-connection settings that cannot be passed as connect arguments."""
+    backend = engine.url.get_backend_name()
+    timeout_ms = env_int('DB_STATEMENT_TIMEOUT_MS', STATEMENT_TIMEOUT_MS)
+
+    if backend == 'sqlite' and not is_memory_sqlite(engine.url):
+        @event.listens_for(engine, 'connect')
+        def sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.close()
+
+    elif backend == 'mysql' and timeout_ms:
+        @event.listens_for(engine, 'connect')
+        def mysql_statement_timeout(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f'SET SESSION MAX_EXECUTION_TIME={int(timeout_ms)}')
+            cursor.close()
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow()
+        })
+    metrics = getattr(pool, 'metrics', None)
+    if metrics is not None:
+        with metrics.lock:
+            stats.update({
+                'checkouts': metrics.checkouts,
+                'checkout_timeouts': metrics.timeouts,
+                'wait_seconds_total': round(metrics.wait_seconds_total, 6),
+                'wait_seconds_max': round(metrics.wait_seconds_max, 6)
+            })
+    return stats
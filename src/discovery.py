@@ -0,0 +1,205 @@
+"""
+What the service exposes and whether it is up: the sitemap at /, the OpenAPI
+(Swagger 2.0) spec of the api blueprint at /openapi.json and a /healthz check.
+
+The sitemap and the spec only change when the routes do, so each is built once, on
+its first request, and served from memory afterwards with a strong ETag (a client
+that has it gets a 304) and its compressed variants kept next to it. flask_swagger,
+and the yaml parser it needs, are only imported when the spec is built. The spec has
+flask_swagger's operations for views with a YAML docstring and a generated one for
+every other api route, summarised by the comment above the view.
+
+GET /healthz is for load balancers and health checkers: one SELECT 1, answered with
+200 {"status": "ok"} or, when the database fails or takes longer than
+HEALTHZ_TIMEOUT_SECONDS, 503. Concurrent checks share one probe and a result is
+reused for HEALTHZ_CACHE_SECONDS.
+"""
+import hashlib
+import inspect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from flask import current_app, jsonify, request
+from sqlalchemy import text
+from compression import compress, is_compressible, negotiate, compressor
+from utils import generate_sitemap
+
+logger = logging.getLogger(__name__)
+
+RULE_ARGUMENT = re.compile(r'<(?:(\w+)(?:\([^)]*\))?:)?(\w+)>')
+PARAMETER_TYPES = {'int': 'integer', 'float': 'number'}
+IGNORED_METHODS = {'HEAD', 'OPTIONS'}
+
+SPEC_TEMPLATE = {
+    "info": {"title": "Star Wars API", "version": "1.0.0"},
+    "securityDefinitions": {
+        "bearer": {"type": "apiKey", "name": "Authorization", "in": "header",
+                   "description": "Bearer <token> from POST /starwars/login"}
+    }
+}
+
+
+class Document:
+    """A response body made by `build(app)` on first use and kept for the life of the process."""
+
+    def __init__(self, build, mimetype):
+        self.build = build
+        self.mimetype = mimetype
+        self.lock = threading.Lock()
+        self.body = None
+        self.etag = None
+        self.encoded = {}
+
+    def get(self, app):
+        if self.body is None:
+            with self.lock:
+                if self.body is None:
+                    body = self.build(app)
+                    if isinstance(body, str):
+                        body = body.encode('utf-8')
+                    self.etag = hashlib.sha1(body).hexdigest()
+                    self.body = body
+        return self.body
+
+    def encode(self, coder):
+        body = self.encoded.get(coder.name)
+        if body is None:
+            body = self.encoded[coder.name] = compress(coder, self.body)
+        return body
+
+    def response(self):
+        app = current_app._get_current_object()
+        body = self.get(app)
+        response = app.response_class(body, mimetype=self.mimetype)
+        response.set_etag(self.etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config.get('CACHE_CONTROL_MAX_AGE', 60)
+        response.vary.add('Accept-Encoding')
+        response = response.make_conditional(request)
+        if response.status_code != 200 or not is_compressible(self.mimetype) or len(body) < compressor.min_size:
+            return response
+
+        coder = negotiate(compressor.coders, request.headers.get('Accept-Encoding'))
+        if coder is not None:
+            # Set here, so the compressor's after_request leaves the response alone
+            response.set_data(self.encode(coder))
+            response.headers['Content-Encoding'] = coder.name
+            response.set_etag(self.etag, weak=True)
+        return response
+
+
+def view_summary(view):
+    """The `#GET ...` comment above the view, the way routes.py documents its endpoints."""
+    comments = inspect.getcomments(inspect.unwrap(view)) or ''
+    return ' '.join(line.lstrip('#').strip() for line in comments.splitlines()) or view.__name__
+
+
+def swagger_path(rule):
+    return RULE_ARGUMENT.sub(lambda match: '{%s}' % match.group(2), rule)
+
+
+def path_parameters(rule):
+    return [{"name": name, "in": "path", "required": True, "type": PARAMETER_TYPES.get(converter, 'string')}
+            for converter, name in RULE_ARGUMENT.findall(rule)]
+
+
+def build_openapi(app, blueprint_name='api'):
+    from flask_swagger import swagger
+
+    rules = [rule for rule in app.url_map.iter_rules() if rule.endpoint.partition('.')[0] == blueprint_name]
+    prefix = os.path.commonprefix([rule.rule for rule in rules])
+    spec = swagger(app, prefix=prefix, template=json.loads(json.dumps(SPEC_TEMPLATE)))
+    paths = spec['paths']
+    for rule in rules:
+        path = swagger_path(rule.rule)
+        view = app.view_functions[rule.endpoint]
+        for method in sorted(rule.methods - IGNORED_METHODS):
+            operations = paths.setdefault(path, {})
+            # Views with a YAML docstring were already documented by flask_swagger
+            if method.lower() in operations:
+                continue
+            operation = {
+                "operationId": rule.endpoint.partition('.')[2],
+                "summary": view_summary(view),
+                "produces": ["application/json"],
+                "responses": {"default": {"description": "JSON body; errors are {\"error\": message}"}}
+            }
+            parameters = path_parameters(rule.rule)
+            if parameters:
+                operation["parameters"] = parameters
+            operations[method.lower()] = operation
+    spec['paths'] = {path: paths[path] for path in sorted(paths) if paths[path]}
+    return json.dumps(spec, sort_keys=True)
+
+
+sitemap = Document(generate_sitemap, 'text/html')
+openapi = Document(build_openapi, 'application/json')
+
+
+class HealthCheck:
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='healthz')
+        self.lock = threading.Lock()
+        self.probe = None
+        self.checked_at = 0.0
+        self.healthy = False
+        self.error = None
+
+    def ping(self, engine):
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+
+    def check(self, engine, timeout, cache_seconds):
+        """(healthy, error) for the database, waiting at most `timeout` seconds."""
+        with self.lock:
+            if time.monotonic() - self.checked_at < cache_seconds:
+                return self.healthy, self.error
+            # A probe stuck on an unreachable database is shared, not stacked up
+            if self.probe is None or self.probe.done():
+                self.probe = self.executor.submit(self.ping, engine)
+            probe = self.probe
+        try:
+            probe.result(timeout=timeout)
+            healthy, error = True, None
+        except TimeoutError:
+            healthy, error = False, f"database did not answer within {timeout}s"
+        except Exception as exception:
+            healthy, error = False, f"database error: {type(exception).__name__}"
+        if not healthy:
+            logger.warning("Health check failed: %s", error)
+        with self.lock:
+            self.healthy, self.error, self.checked_at = healthy, error, time.monotonic()
+        return healthy, error
+
+
+health = HealthCheck()
+
+
+def init_app(app, db):
+    #GET the links to every endpoint without parameters
+    def get_sitemap():
+        return sitemap.response()
+
+    #GET the OpenAPI (Swagger 2.0) spec of the API
+    def get_openapi():
+        return openapi.response()
+
+    #GET whether this worker can reach the database
+    def healthz():
+        healthy, error = health.check(db.engine, app.config.get('HEALTHZ_TIMEOUT_SECONDS', 2),
+                                      app.config.get('HEALTHZ_CACHE_SECONDS', 1))
+        if healthy:
+            response = jsonify({"status": "ok"})
+        else:
+            response = jsonify({"status": "unavailable", "error": error})
+            response.status_code = 503
+        response.cache_control.no_store = True
+        return response
+
+    app.add_url_rule('/', 'sitemap', get_sitemap)
+    app.add_url_rule('/openapi.json', 'openapi', get_openapi)
+    app.add_url_rule('/healthz', 'healthz', healthz)
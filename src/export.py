@@ -0,0 +1,46 @@
+"""
+Streaming export of whole tables for bulk consumers.
+
+Rows are read from a server-side cursor in `yield_per` batches and written out one
+by one through a generator response, so worker memory stays flat whatever the
+table size.
+"""
+from flask import Response, stream_with_context
+from models import db
+from serialization import dumps
+
+EXPORT_BATCH_SIZE = 1000
+
+MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json'
+}
+
+
+def iter_rows(columns, batch_size=EXPORT_BATCH_SIZE):
+    keys = [column.key for column in columns]
+    query = (db.session.query(*columns)
+             .order_by(columns[0].table.c.id)
+             .execution_options(stream_results=True, yield_per=batch_size))
+    for row in query:
+        yield dict(zip(keys, row))
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield dumps(row) + b'\n'
+
+
+def json_array(rows):
+    yield b'['
+    separator = b''
+    for row in rows:
+        yield separator + dumps(row)
+        separator = b','
+    yield b']'
+
+
+def export_response(columns, output_format='ndjson', batch_size=EXPORT_BATCH_SIZE):
+    rows = iter_rows(columns, batch_size)
+    body = ndjson_lines(rows) if output_format == 'ndjson' else json_array(rows)
+    return Response(stream_with_context(body), mimetype=MIMETYPES[output_format])
@@ -0,0 +1,192 @@
+"""
+Materialized per-user favorites: one `favorite_summary` row per user holding the
+favorite ids of each kind (in the order they were added) and their counts.
+
+The row is updated in the same transaction as the favorite write:
+
+- the favorite helpers (single and batch add/remove) call `record`;
+- set-based deletes of characters/planets/vehicles call `record` with the favorites
+  they removed;
+- anything that goes through the ORM unit of work (cascade deletes of a character,
+  Flask-Admin edits) is picked up by the session's after_flush listener.
+
+A user without a row (e.g. created after the last rebuild) is computed from the
+`favorite` table on demand. `flask favorites-summary-rebuild` recreates every row and
+`flask favorites-summary-check` reports rows that disagree with `favorite`.
+"""
+import sys
+from sqlalchemy import delete, event, inspect, insert, select, update
+from models import User, Favorite, FavoriteSummary, ENTITY_MODELS
+from versions import utcnow
+
+# One ids/count column pair per kind
+KINDS = tuple(ENTITY_MODELS)
+CHUNK_SIZE = 1000
+SUMMARY = FavoriteSummary.__table__
+
+
+def empty_lists():
+    return {kind: [] for kind in KINDS}
+
+
+def target_of(favorite):
+    """(kind, target id) of a favorite row or object."""
+    return favorite.entity_type, favorite.entity_id
+
+
+def row_values(user_id, lists):
+    values = {'user_id': user_id, 'updated_at': utcnow()}
+    for kind in KINDS:
+        values[kind + '_ids'] = lists[kind]
+        values[kind + '_count'] = len(lists[kind])
+    return values
+
+
+def stored_lists(row):
+    return {kind: list(getattr(row, kind + '_ids') or []) for kind in KINDS}
+
+
+def live_lists(connection, user_ids=None):
+    """{user_id: {kind: [target ids]}} computed from the favorite table."""
+    statement = (select(Favorite.user_id, Favorite.entity_type, Favorite.entity_id)
+                 .order_by(Favorite.user_id, Favorite.id))
+    if user_ids is not None:
+        statement = statement.where(Favorite.user_id.in_(user_ids))
+    lists = {}
+    for row in connection.execute(statement):
+        kind, target_id = target_of(row)
+        if kind in KINDS:
+            lists.setdefault(row.user_id, empty_lists())[kind].append(target_id)
+    return lists
+
+
+def refresh(connection, user_ids):
+    """Recompute the rows of the given users from the favorite table."""
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    existing = [row.id for row in connection.execute(select(User.id).where(User.id.in_(user_ids)))]
+    lists = live_lists(connection, existing)
+    connection.execute(delete(SUMMARY).where(SUMMARY.c.user_id.in_(user_ids)))
+    if existing:
+        connection.execute(insert(SUMMARY),
+                           [row_values(user_id, lists.get(user_id, empty_lists())) for user_id in existing])
+
+
+def record(connection, changes):
+    """
+    Apply favorite changes to the stored rows.
+
+    `changes` maps user id -> [(kind, target id, added)], in the order they happened.
+    """
+    if not changes:
+        return
+    rows = connection.execute(
+        select(SUMMARY).where(SUMMARY.c.user_id.in_(list(changes))).with_for_update()).all()
+    found = {row.user_id: row for row in rows}
+    for user_id, row in found.items():
+        lists = stored_lists(row)
+        for kind, target_id, added in changes[user_id]:
+            if added and target_id not in lists[kind]:
+                lists[kind].append(target_id)
+            elif not added and target_id in lists[kind]:
+                lists[kind].remove(target_id)
+        connection.execute(update(SUMMARY).where(SUMMARY.c.user_id == user_id)
+                           .values(row_values(user_id, lists)))
+    # Users without a row yet: the favorite table already holds this transaction's writes
+    refresh(connection, set(changes) - set(found))
+
+
+def summary_for(connection, user_id):
+    """The user's summary as a (transient) FavoriteSummary, or None for an unknown user."""
+    row = connection.execute(select(SUMMARY).where(SUMMARY.c.user_id == user_id)).first()
+    if row is not None:
+        return FavoriteSummary(**row._mapping)
+    if connection.execute(select(User.id).where(User.id == user_id)).first() is None:
+        return None
+    return FavoriteSummary(**row_values(user_id, live_lists(connection, [user_id]).get(user_id, empty_lists())))
+
+
+def rebuild(connection):
+    """Recreate every row from the favorite table; returns the number of users."""
+    lists = live_lists(connection)
+    user_ids = [row.id for row in connection.execute(select(User.id).order_by(User.id))]
+    connection.execute(delete(SUMMARY))
+    for start in range(0, len(user_ids), CHUNK_SIZE):
+        connection.execute(insert(SUMMARY), [
+            row_values(user_id, lists.get(user_id, empty_lists())) for user_id in user_ids[start:start + CHUNK_SIZE]])
+    return len(user_ids)
+
+
+def check(connection):
+    """Users whose stored row differs from the favorite table, as (user_id, problem) pairs."""
+    lists = live_lists(connection)
+    user_ids = {row.id for row in connection.execute(select(User.id))}
+    stored = {row.user_id: row for row in connection.execute(select(SUMMARY))}
+    problems = []
+    for user_id in sorted(user_ids | set(stored)):
+        if user_id not in user_ids:
+            problems.append((user_id, "summary row for a user that does not exist"))
+            continue
+        live = lists.get(user_id, empty_lists())
+        row = stored.get(user_id)
+        if row is None:
+            if any(live.values()):
+                problems.append((user_id, "missing summary row"))
+            continue
+        for kind in KINDS:
+            ids = getattr(row, kind + '_ids') or []
+            if ids != live[kind]:
+                problems.append((user_id, f"{kind} ids {ids} != {live[kind]}"))
+            if getattr(row, kind + '_count') != len(ids):
+                problems.append((user_id, f"{kind} count {getattr(row, kind + '_count')} != {len(ids)}"))
+    return problems
+
+
+def listen(session):
+    @event.listens_for(session, 'after_flush')
+    def summarize_flushed(session, flush_context):
+        changes, stale = {}, set()
+        deleted_users = {obj.id for obj in session.deleted if isinstance(obj, User)}
+        for obj in session.new:
+            if isinstance(obj, Favorite):
+                kind, target_id = target_of(obj)
+                changes.setdefault(obj.user_id, []).append((kind, target_id, True))
+        for obj in session.deleted:
+            if isinstance(obj, Favorite):
+                kind, target_id = target_of(obj)
+                changes.setdefault(obj.user_id, []).append((kind, target_id, False))
+        for obj in session.dirty:
+            # Edited favorites (admin): recompute whoever owned it before and after
+            if isinstance(obj, Favorite) and session.is_modified(obj):
+                history = inspect(obj).attrs.user_id.history
+                stale.update(user_id for user_id in history.sum() if user_id is not None)
+
+        connection = session.connection()
+        if deleted_users:
+            connection.execute(delete(SUMMARY).where(SUMMARY.c.user_id.in_(deleted_users)))
+        record(connection, {user_id: items for user_id, items in changes.items()
+                            if user_id not in deleted_users and user_id not in stale})
+        refresh(connection, stale - deleted_users)
+
+
+def init_app(app, db):
+    listen(db.session)
+
+    @app.cli.command('favorites-summary-rebuild')
+    def rebuild_command():
+        """Recreate every user's favorites summary from the favorite table."""
+        with db.engine.begin() as connection:
+            count = rebuild(connection)
+        print(f"Favorites summary rebuilt for {count} users")
+
+    @app.cli.command('favorites-summary-check')
+    def check_command():
+        """Compare the favorites summary with the favorite table; exits 1 on any mismatch."""
+        with db.engine.connect() as connection:
+            problems = check(connection)
+        for user_id, problem in problems:
+            print(f"user {user_id}: {problem}")
+        if problems:
+            sys.exit(1)
+        print("Favorites summary is consistent")
@@ -0,0 +1,129 @@
+"""
+Write helpers for the `favorite` table.
+
+A favorite is a (user, entity_type, entity_id) row, entity_type being a key of
+models.ENTITY_MODELS. Adding one is an upsert against the unique index on those three
+columns, so repeating a POST never creates a duplicate row. The batch helpers take a
+mapping of kind -> target ids and issue one statement per kind. Every helper keeps
+the user's favorite_summary row and the targets' favorite counters in step within
+the same transaction.
+
+Deleting a character, planet or vehicle removes its favorites with one set-based
+DELETE per kind (`delete_favorites_of`), whether it goes through the ORM (the API,
+Flask-Admin) or through bulk.py; the favorites are never loaded.
+"""
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Favorite, ENTITY_MODELS
+import favorite_summary
+import popularity
+
+KIND_BY_MODEL = {model: kind for kind, model in ENTITY_MODELS.items()}
+UNIQUE_COLUMNS = [Favorite.user_id, Favorite.entity_type, Favorite.entity_id]
+
+
+def insert_ignoring_duplicates():
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(Favorite).on_conflict_do_nothing(index_elements=UNIQUE_COLUMNS)
+    if dialect == 'sqlite':
+        return sqlite.insert(Favorite).on_conflict_do_nothing(index_elements=UNIQUE_COLUMNS)
+    if dialect in ('mysql', 'mariadb'):
+        return insert(Favorite).prefix_with('IGNORE')
+    return insert(Favorite)
+
+
+def of_targets(kind, target_ids):
+    return (Favorite.entity_type == kind) & Favorite.entity_id.in_(target_ids)
+
+
+def add_favorite(user_id, kind, target_id):
+    """Insert the favorite unless it already exists; returns True when a row was added."""
+    statement = insert_ignoring_duplicates().values(user_id=user_id, entity_type=kind, entity_id=target_id)
+    result = db.session.execute(statement)
+    added = result.rowcount > 0
+    if added:
+        favorite_summary.record(db.session.connection(), {user_id: [(kind, target_id, True)]})
+        popularity.adjust(db.session.connection(), {(kind, target_id): 1})
+    db.session.commit()
+    return added
+
+
+def remove_favorite(user_id, kind, target_id):
+    """Delete the favorite; returns False when there was nothing to delete."""
+    deleted = (Favorite.query
+               .filter(Favorite.user_id == user_id, Favorite.entity_type == kind, Favorite.entity_id == target_id)
+               .delete(synchronize_session=False))
+    if deleted:
+        favorite_summary.record(db.session.connection(), {user_id: [(kind, target_id, False)]})
+        popularity.adjust(db.session.connection(), {(kind, target_id): -1})
+    db.session.commit()
+    return deleted > 0
+
+
+def existing_ids(kind, target_ids):
+    model = ENTITY_MODELS[kind]
+    return {row.id for row in db.session.query(model.id).filter(model.id.in_(target_ids))}
+
+
+def add_favorites(user_id, targets):
+    """Upsert every existing target; returns the ids that do not exist, per kind."""
+    missing = {}
+    added = []
+    for kind, target_ids in targets.items():
+        found = existing_ids(kind, target_ids) if target_ids else set()
+        missing[kind] = [target_id for target_id in target_ids if target_id not in found]
+        if found:
+            db.session.execute(insert_ignoring_duplicates(), [
+                {'user_id': user_id, 'entity_type': kind, 'entity_id': target_id} for target_id in sorted(found)])
+            # Ids that were already favorites are skipped by the summary as well
+            added.extend((kind, target_id, True) for target_id in sorted(found))
+            popularity.recount(db.session.connection(), kind, found)
+    favorite_summary.record(db.session.connection(), {user_id: added} if added else {})
+    db.session.commit()
+    return missing
+
+
+def remove_favorites(user_id, targets):
+    """Delete the given favorites; returns the number of rows removed."""
+    removed = 0
+    changes = []
+    for kind, target_ids in targets.items():
+        if target_ids:
+            removed += (Favorite.query
+                        .filter(Favorite.user_id == user_id, of_targets(kind, target_ids))
+                        .delete(synchronize_session=False))
+            changes.extend((kind, target_id, False) for target_id in target_ids)
+            popularity.recount(db.session.connection(), kind, target_ids)
+    if removed:
+        favorite_summary.record(db.session.connection(), {user_id: changes})
+    db.session.commit()
+    return removed
+
+
+def delete_favorites_of(session, kind, target_ids):
+    """Delete every favorite of the given targets; returns the number of rows removed."""
+    removed = session.execute(
+        select(Favorite.user_id, Favorite.entity_type, Favorite.entity_id).where(of_targets(kind, target_ids))).all()
+    if removed:
+        session.execute(delete(Favorite).where(of_targets(kind, target_ids)),
+                        execution_options={'synchronize_session': False})
+        changes = {}
+        for row in removed:
+            changes.setdefault(row.user_id, []).append(favorite_summary.target_of(row) + (False,))
+        favorite_summary.record(session.connection(), changes)
+    popularity.forget(session.connection(), kind, target_ids)
+    return len(removed)
+
+
+def listen(session):
+    @event.listens_for(session, 'before_flush')
+    def cascade_deleted_targets(session, flush_context, instances):
+        # Runs before the targets' own DELETE, so no favorite outlives its target
+        deleted = {}
+        for obj in session.deleted:
+            kind = KIND_BY_MODEL.get(type(obj))
+            if kind:
+                deleted.setdefault(kind, []).append(obj.id)
+        for kind, target_ids in deleted.items():
+            delete_favorites_of(session, kind, sorted(target_ids))
@@ -0,0 +1,156 @@
+"""
+Per-request performance instrumentation.
+
+Each request records its wall time, database statement count and database time
+(through the engine's before/after_cursor_execute events). The numbers go back to
+the client in a Server-Timing header and feed per-endpoint histograms, which are
+served in Prometheus text format at /metrics. Statements slower than
+SLOW_QUERY_MS are logged with the endpoint that issued them.
+"""
+import logging
+import threading
+import time
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from db_config import pool_stats
+
+logger = logging.getLogger('starwars.slow_queries')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, endpoint, value):
+        counts, total, observed = self.series.get(endpoint, ([0] * len(self.buckets), 0.0, 0))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        self.series[endpoint] = (counts, total + value, observed + 1)
+
+    def render(self, name, help_text):
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for endpoint, (counts, total, observed) in sorted(self.series.items()):
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {observed}')
+            lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {total}')
+            lines.append(f'{name}_count{{endpoint="{endpoint}"}} {observed}')
+        return lines
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = Histogram(DURATION_BUCKETS)
+        self.db_durations = Histogram(DURATION_BUCKETS)
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.slow_queries = {}
+        self.rejections = {}
+
+    def record(self, endpoint, duration, db_time, db_count):
+        with self.lock:
+            self.durations.observe(endpoint, duration)
+            self.db_durations.observe(endpoint, db_time)
+            self.statements.observe(endpoint, db_count)
+
+    def record_slow_query(self, endpoint):
+        with self.lock:
+            self.slow_queries[endpoint] = self.slow_queries.get(endpoint, 0) + 1
+
+    def record_rejection(self, endpoint, status):
+        with self.lock:
+            key = (endpoint, status)
+            self.rejections[key] = self.rejections.get(key, 0) + 1
+
+    def render(self):
+        with self.lock:
+            lines = self.durations.render('http_request_duration_seconds', 'Wall time per request.')
+            lines += self.db_durations.render('db_time_seconds', 'Database time per request.')
+            lines += self.statements.render('db_statements', 'Database statements per request.')
+            lines += ['# HELP db_slow_queries_total Statements slower than the slow query threshold.',
+                      '# TYPE db_slow_queries_total counter']
+            lines += [f'db_slow_queries_total{{endpoint="{endpoint}"}} {count}'
+                      for endpoint, count in sorted(self.slow_queries.items())]
+            lines += ['# HELP http_rejected_total Requests refused by the rate limiter (429) or the load shedder (503).',
+                      '# TYPE http_rejected_total counter']
+            lines += [f'http_rejected_total{{endpoint="{endpoint}",status="{status}"}} {count}'
+                      for (endpoint, status), count in sorted(self.rejections.items())]
+        return lines
+
+
+def render_pool_stats(engine):
+    lines = []
+    for key, value in pool_stats(engine).items():
+        if isinstance(value, (int, float)):
+            lines.append(f'# TYPE db_pool_{key} gauge')
+            lines.append(f'db_pool_{key} {value}')
+    return lines
+
+
+def server_timing(duration, db_time, db_count):
+    return [f'app;dur={duration * 1000:.2f}', f'db;dur={db_time * 1000:.2f};desc="{db_count} queries"']
+
+
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'background'
+
+
+def init_app(app, db):
+    metrics = RequestMetrics()
+    slow_query_seconds = app.config.get('SLOW_QUERY_MS', 200) / 1000
+    app.extensions['request_metrics'] = metrics
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        # Kept on the statement's execution context, not the pooled connection: a
+        # statement that fails never reaches after_cursor_execute
+        if context is not None:
+            context.query_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'query_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        if has_request_context() and 'db_count' in g:
+            g.db_count += 1
+            g.db_time += elapsed
+        if elapsed >= slow_query_seconds:
+            endpoint = current_endpoint()
+            metrics.record_slow_query(endpoint)
+            logger.warning("Slow query (%.1f ms) in %s: %s", elapsed * 1000, endpoint, statement)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.db_count = 0
+        g.db_time = 0.0
+
+    @app.after_request
+    def add_server_timing(response):
+        if 'request_started' not in g:
+            return response
+        duration = time.perf_counter() - g.request_started
+        for value in server_timing(duration, g.db_time, g.db_count):
+            response.headers.add('Server-Timing', value)
+        if request.endpoint != 'prometheus_metrics':
+            metrics.record(current_endpoint(), duration, g.db_time, g.db_count)
+        return response
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        lines = metrics.render() + render_pool_stats(engine)
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+    return metrics
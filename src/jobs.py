@@ -0,0 +1,232 @@
+"""
+Background jobs for work too slow for a request: cascade deletes, bulk imports and
+index / summary rebuilds.
+
+A job is a row of the `job` table, inserted in the caller's transaction, so it only
+exists if the request that queued it commits. JOBS_WORKERS threads per process
+claim queued jobs with a conditional UPDATE (safe across processes), run the
+handler registered for the job's kind in an app context and store its result. A
+failing job is retried up to max_attempts times, JOBS_RETRY_SECONDS * 2^n apart;
+a job left running longer than JOBS_STALE_SECONDS (its process died) is claimed
+again. JOBS_WORKERS=0 leaves the queue to `flask jobs-work` processes.
+
+Handlers are registered per kind with `@handler`. Admins queue maintenance jobs with
+POST /starwars/jobs {"kind": "search-rebuild"}; the delete and bulk endpoints queue
+theirs when the request sends `Prefer: respond-async`. Either way the answer is a
+202 pointing at GET /starwars/jobs/<id>.
+"""
+import logging
+import threading
+import traceback
+from datetime import timedelta
+from sqlalchemy import and_, event, or_, select, update
+from models import db, Job, utcnow
+from bulk import BULK, bulk_delete, bulk_insert, parse_ids, DEFAULT_CHUNK_SIZE
+from search import search_index
+import favorite_summary
+import popularity
+from utils import APIException
+
+logger = logging.getLogger(__name__)
+
+JOB = Job.__table__
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """Register `func(app, payload) -> result` as the handler of `kind` jobs."""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def payload_resource(payload):
+    resource = payload.get('resource')
+    if resource not in BULK:
+        raise APIException("resource must be one of: " + ", ".join(BULK), status_code=400)
+    return BULK[resource]
+
+
+@handler('delete')
+def delete_job(app, payload):
+    chunk_size = payload.get('chunk_size', DEFAULT_CHUNK_SIZE)
+    return {"deleted": bulk_delete(payload_resource(payload), parse_ids(payload.get('ids')), chunk_size)}
+
+
+@handler('import')
+def import_job(app, payload):
+    items = payload.get('items')
+    if not isinstance(items, list):
+        raise APIException("items must be a list", status_code=400)
+    chunk_size = payload.get('chunk_size', DEFAULT_CHUNK_SIZE)
+    inserted, errors = bulk_insert(payload_resource(payload), iter(items), chunk_size)
+    return {"inserted": inserted, "errors": errors}
+
+
+@handler('search-rebuild')
+def search_rebuild_job(app, payload):
+    with db.engine.begin() as connection:
+        search_index.rebuild(connection)
+    return {"backend": search_index.backend.name}
+
+
+@handler('favorites-summary-rebuild')
+def favorites_summary_rebuild_job(app, payload):
+    with db.engine.begin() as connection:
+        return {"users": favorite_summary.rebuild(connection)}
+
+
+@handler('popularity-rebuild')
+def popularity_rebuild_job(app, payload):
+    with db.engine.begin() as connection:
+        return {"targets": popularity.rebuild(connection)}
+
+
+@handler('popularity-refresh')
+def popularity_refresh_job(app, payload):
+    with db.engine.begin() as connection:
+        return {"rankings": popularity.refresh_all(connection, app.config['POPULARITY_MAX_K'])}
+
+
+def enqueue(kind, payload=None, created_by=None, max_attempts=None):
+    """Add a job to the session; it is queued when the caller commits."""
+    if kind not in HANDLERS:
+        raise APIException("kind must be one of: " + ", ".join(sorted(HANDLERS)), status_code=400)
+    job = Job(kind=kind, payload=payload or {}, created_by=created_by,
+              max_attempts=max_attempts or runner.max_attempts)
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+
+class JobRunner:
+    def __init__(self):
+        self.app = None
+        self.workers = 0
+        self.threads = []
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.poll_seconds = 5
+        self.retry_seconds = 10
+        self.stale_seconds = 600
+        self.max_attempts = 3
+
+    def init_app(self, app, db):
+        self.app = app
+        self.workers = app.config.get('JOBS_WORKERS', 2)
+        self.poll_seconds = app.config.get('JOBS_POLL_SECONDS', 5)
+        self.retry_seconds = app.config.get('JOBS_RETRY_SECONDS', 10)
+        self.stale_seconds = app.config.get('JOBS_STALE_SECONDS', 600)
+        self.max_attempts = app.config.get('JOBS_MAX_ATTEMPTS', 3)
+        self.listen(db.session)
+
+        # Threads are started by the first request, after the server has forked its workers
+        @app.before_request
+        def start_workers():
+            if not self.threads:
+                self.start()
+
+        @app.cli.command('jobs-work')
+        def work_command():
+            """Run queued jobs in the foreground until interrupted."""
+            print("Running jobs, Ctrl+C to stop")
+            self.work()
+
+        app.extensions['job_runner'] = self
+
+    def listen(self, session):
+        @event.listens_for(session, 'after_flush')
+        def collect_jobs(session, flush_context):
+            if any(isinstance(obj, Job) for obj in session.new):
+                session.info['jobs_queued'] = True
+
+        @event.listens_for(session, 'after_commit')
+        def wake_workers(session):
+            if session.info.pop('jobs_queued', False):
+                self.wakeup.set()
+
+        @event.listens_for(session, 'after_rollback')
+        def discard_pending(session):
+            session.info.pop('jobs_queued', None)
+
+    def start(self):
+        with self.lock:
+            if self.threads or not self.workers:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self.work, name=f'job-worker-{index}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def work(self):
+        while True:
+            try:
+                ran = self.run_next()
+            except Exception:
+                logger.exception("Job worker failed to claim a job")
+                ran = False
+            if not ran:
+                self.wakeup.wait(self.poll_seconds)
+                self.wakeup.clear()
+
+    def claimable(self, now):
+        return or_(
+            and_(JOB.c.status == 'queued', JOB.c.run_after <= now),
+            and_(JOB.c.status == 'running', JOB.c.started_at < now - timedelta(seconds=self.stale_seconds),
+                 JOB.c.attempts < JOB.c.max_attempts))
+
+    def claim(self):
+        """Mark the next due job as running; returns its row, or None when there is none."""
+        with self.app.app_context():
+            with db.engine.begin() as connection:
+                while True:
+                    now = utcnow()
+                    row = connection.execute(
+                        select(JOB.c.id, JOB.c.kind, JOB.c.payload, JOB.c.attempts, JOB.c.max_attempts)
+                        .where(self.claimable(now)).order_by(JOB.c.run_after, JOB.c.id).limit(1)).first()
+                    if row is None:
+                        # Out of attempts while their process died: they will not run again
+                        connection.execute(
+                            update(JOB).where(JOB.c.status == 'running', JOB.c.attempts >= JOB.c.max_attempts,
+                                              JOB.c.started_at < now - timedelta(seconds=self.stale_seconds))
+                            .values(status='failed', error="Worker stopped while running the job", finished_at=now))
+                        return None
+                    # Another worker may have claimed it between the two statements
+                    result = connection.execute(
+                        update(JOB).where(JOB.c.id == row.id, self.claimable(now))
+                        .values(status='running', started_at=now, attempts=JOB.c.attempts + 1))
+                    if result.rowcount == 1:
+                        return row
+
+    def run_next(self):
+        row = self.claim()
+        if row is None:
+            return False
+        attempt = row.attempts + 1
+        with self.app.app_context():
+            try:
+                result = HANDLERS[row.kind](self.app, row.payload)
+            except Exception as error:
+                db.session.rollback()
+                retry = attempt < row.max_attempts and not isinstance(error, APIException)
+                if isinstance(error, APIException):
+                    message = error.message
+                else:
+                    message = ''.join(traceback.format_exception_only(type(error), error)).strip()
+                logger.warning("Job %s (%s) failed on attempt %s: %s", row.id, row.kind, attempt, message)
+                values = {'error': message}
+                if retry:
+                    values.update(status='queued', run_after=utcnow() + timedelta(
+                        seconds=self.retry_seconds * 2 ** (attempt - 1)))
+                else:
+                    values.update(status='failed', finished_at=utcnow())
+            else:
+                values = {'status': 'succeeded', 'result': result, 'error': None, 'finished_at': utcnow()}
+            with db.engine.begin() as connection:
+                connection.execute(update(JOB).where(JOB.c.id == row.id).values(values))
+        return True
+
+
+runner = JobRunner()
@@ -0,0 +1,203 @@
+"""
+Generic list engine shared by the catalog endpoints (/people, /planets, /vehicles).
+
+Lists are paginated with a keyset on `id` (?cursor=<last id>&limit=<n>), can be
+projected down to a few columns with ?fields=name,gender and filtered with
+?<field>=<value> (equality) or ?<field>__startswith=<value> (prefix).
+
+Fields stored as text with a numeric column next to them (the models' `normalized`,
+e.g. a planet's population) can be used as ranges, ?population__gte=1000000000 or
+?birth_year__lt=20BBY (the values go through the same parser as the stored ones), and
+sorted on with ?sort=population or ?sort=-population. Both run on the indexed numeric
+column; a sorted list skips rows whose value is unknown and pages with a
+?cursor=<value>:<last id> keyset.
+
+?ids=3,1,2 returns exactly those rows instead of a page, fetched with one IN query,
+in the order asked for, with the ids that do not exist listed under "missing".
+"""
+from flask import request, url_for
+from sqlalchemy import and_, or_, select
+from models import db
+from utils import APIException
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+RANGE_OPERATORS = {
+    'gt': lambda column, value: column > value,
+    'gte': lambda column, value: column >= value,
+    'lt': lambda column, value: column < value,
+    'lte': lambda column, value: column <= value
+}
+
+
+def parse_int(name, default=None, minimum=None, maximum=None, args=None):
+    args = request.args if args is None else args
+    value = args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise APIException(f"'{name}' must be an integer", status_code=400)
+    if minimum is not None and value < minimum:
+        raise APIException(f"'{name}' must be >= {minimum}", status_code=400)
+    if maximum is not None and value > maximum:
+        value = maximum
+    return value
+
+
+def parse_id_list(name, args=None):
+    """Ids from ?<name>=3,1,2, in the order given and without repeats; None when absent."""
+    args = request.args if args is None else args
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+    except ValueError:
+        raise APIException(f"'{name}' must be a comma-separated list of ids", status_code=400)
+    if len(ids) > MAX_LIMIT:
+        raise APIException(f"'{name}' can list at most {MAX_LIMIT} ids", status_code=400)
+    return ids
+
+
+class Listing:
+    def __init__(self, model, collection, filters=(), ranges=()):
+        self.model = model
+        self.collection = collection
+        self.filters = filters
+        self.columns = model.__table__.columns
+        # field -> (numeric column, parser), from the model's normalized fields
+        self.ranges = {field: (self.columns[model.normalized[field][0]], model.normalized[field][1])
+                       for field in ranges}
+
+    def selected_fields(self, args):
+        fields = args.get('fields')
+        if not fields:
+            return list(self.model.public_fields)
+        selected = ['id']
+        for field in fields.split(','):
+            field = field.strip()
+            if field not in self.model.public_fields:
+                raise APIException(f"Unknown field '{field}'", status_code=400)
+            if field not in selected:
+                selected.append(field)
+        return selected
+
+    def apply_filters(self, statement, args):
+        for field in self.filters:
+            column = self.columns[field]
+            value = args.get(field)
+            if value is not None:
+                statement = statement.where(column == value)
+            prefix = args.get(field + '__startswith')
+            if prefix:
+                statement = statement.where(column.startswith(prefix, autoescape=True))
+        for field, (column, parse) in self.ranges.items():
+            for operator, compare in RANGE_OPERATORS.items():
+                name = f'{field}__{operator}'
+                value = args.get(name)
+                if value is None:
+                    continue
+                number = parse(value)
+                if number is None:
+                    raise APIException(f"'{name}' must be a valid {field}", status_code=400)
+                statement = statement.where(compare(column, number))
+        return statement
+
+    def sort_order(self, args):
+        """(field, descending) from ?sort=<field> / ?sort=-<field>; field is None for id order."""
+        sort = args.get('sort')
+        if not sort:
+            return None, False
+        field = sort.lstrip('-')
+        if not self.ranges:
+            raise APIException(f"{self.collection} cannot be sorted", status_code=400)
+        if field not in self.ranges:
+            choices = ", ".join(f"{name}, -{name}" for name in self.ranges)
+            raise APIException(f"sort must be one of: {choices}", status_code=400)
+        return field, sort.startswith('-')
+
+    def sort_cursor(self, args, column):
+        """(value, last id) from ?cursor=<value>:<last id>, or None."""
+        cursor = args.get('cursor')
+        if not cursor:
+            return None
+        value, _, last_id = cursor.rpartition(':')
+        try:
+            return column.type.python_type(value), int(last_id)
+        except ValueError:
+            raise APIException("'cursor' must be the cursor of the previous page", status_code=400)
+
+    def statement(self, args):
+        """Build the page query from request arguments; returns (fields, limit, statement)."""
+        limit = parse_int('limit', DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT, args=args)
+        sort, descending = self.sort_order(args)
+        fields = self.selected_fields(args)
+        id_column = self.columns['id']
+
+        statement = select(*[self.columns[field] for field in fields])
+        statement = self.apply_filters(statement, args)
+        if sort is None:
+            cursor = parse_int('cursor', minimum=0, args=args)
+            if cursor is not None:
+                statement = statement.where(id_column > cursor)
+            order = (id_column,)
+        else:
+            # The sort value rides along after the selected fields, for the next cursor
+            column = self.ranges[sort][0]
+            statement = statement.add_columns(column.label('sort_key')).where(column.isnot(None))
+            cursor = self.sort_cursor(args, column)
+            if cursor is not None:
+                value, last_id = cursor
+                if descending:
+                    statement = statement.where(or_(column < value, and_(column == value, id_column < last_id)))
+                else:
+                    statement = statement.where(or_(column > value, and_(column == value, id_column > last_id)))
+            order = (column.desc(), id_column.desc()) if descending else (column, id_column)
+        # One extra row tells whether there is a next page
+        return fields, limit, statement.order_by(*order).limit(limit + 1)
+
+    def result(self, fields, limit, rows):
+        """Turn fetched rows into (items, next cursor or None)."""
+        cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            cursor = f'{last.sort_key}:{last.id}' if 'sort_key' in last._fields else last.id
+        return [dict(zip(fields, row)) for row in rows], cursor
+
+    def lookup_statement(self, ids, fields=None):
+        """Select the rows of `ids` with one IN query; returns (fields, statement)."""
+        fields = fields or list(self.model.public_fields)
+        return fields, select(*[self.columns[field] for field in fields]).where(self.columns['id'].in_(ids))
+
+    def lookup_result(self, fields, ids, rows):
+        """(items in the order of `ids`, ids that have no row)."""
+        found = {row.id: dict(zip(fields, row)) for row in rows}
+        return [found[id] for id in ids if id in found], [id for id in ids if id not in found]
+
+    def lookup(self, ids, fields=None):
+        fields, statement = self.lookup_statement(ids, fields)
+        return self.lookup_result(fields, ids, db.session.execute(statement).all())
+
+    def page(self):
+        ids = parse_id_list('ids')
+        if ids is not None:
+            items, missing = self.lookup(ids, self.selected_fields(request.args))
+            return {self.collection: items, "missing": missing}
+
+        fields, limit, statement = self.statement(request.args)
+        items, cursor = self.result(fields, limit, db.session.execute(statement).all())
+
+        next_url = None
+        if cursor is not None:
+            args = request.args.to_dict()
+            args['cursor'] = cursor
+            next_url = url_for(request.endpoint, **args)
+
+        return {
+            self.collection: items,
+            "next": next_url
+        }
@@ -1,18 +1,58 @@
+import re
+from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
+from werkzeug.security import generate_password_hash
+from db_config import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+# werkzeug's "method$salt$hash", e.g. scrypt:32768:8:1$<salt>$<hex> or pbkdf2:sha256:600000$<salt>$<hex>
+PASSWORD_HASH = re.compile(r'^(?:scrypt:\d+:\d+:\d+|pbkdf2:\w+(?::\d+)?)\$[A-Za-z0-9]+\$[0-9a-f]{32,}$')
+
+def is_password_hash(value):
+    return PASSWORD_HASH.match(value) is not None
+
+BIG_INTEGER_MAX = 2 ** 63 - 1
+BIRTH_YEAR = re.compile(r'^(-?\d+(?:\.\d+)?)\s*(BBY|ABY)?$', re.IGNORECASE)
+
+def parse_population(value):
+    """'1000000000' or '1,000,000' as an integer; None for 'unknown' and other text."""
+    if value is None:
+        return None
+    digits = re.sub(r'[\s,_]', '', str(value))
+    if not digits.isdigit() or int(digits) > BIG_INTEGER_MAX:
+        return None
+    return int(digits)
+
+def parse_birth_year(value):
+    """Years after the Battle of Yavin: '19BBY' -> -19.0, '4ABY' -> 4.0; None for 'unknown'."""
+    match = BIRTH_YEAR.match(str(value).strip()) if value is not None else None
+    if match is None:
+        return None
+    years = float(match.group(1))
+    return -years if (match.group(2) or '').upper() == 'BBY' else years
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
-    password = db.Column(db.String(120), unique=False, nullable=False)
+    password = db.Column(db.String(255), unique=False, nullable=False)
     favorites = relationship('Favorite', back_populates='user', cascade='all, delete-orphan')
     is_admin = db.Column(db.Boolean, default=False, nullable=False) 
 
+    public_fields = ('id', 'username', 'is_admin')
+
     def __repr__(self):
         return '<User %r>' % self.username
 
+    @validates('password')
+    def hash_password(self, key, password):
+        # Plain text (API, Flask-Admin) is hashed; values that are already hashes are kept
+        return password if is_password_hash(password) else generate_password_hash(password)
+
     def serialize(self):
         return {
             "id": self.id,
@@ -25,7 +65,21 @@ class Character(db.Model):
     name = db.Column(db.String(30), unique=False, nullable=False)
     birth_year = db.Column(db.String(20), unique=False, nullable=True)
     gender = db.Column(db.String(20), unique=False, nullable=True)
-    favorites = relationship('Favorite', back_populates='character', cascade='all, delete-orphan')
+    # birth_year as a number (19BBY -> -19), kept in step with it, for sorting and ranges
+    birth_year_aby = db.Column(db.Float, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_character_birth_year_aby', 'birth_year_aby', 'id'),
+    )
+
+    public_fields = ('id', 'name', 'birth_year', 'gender')
+    # text field -> (numeric column derived from it, parser)
+    normalized = {'birth_year': ('birth_year_aby', parse_birth_year)}
+
+    @validates('birth_year')
+    def normalize_birth_year(self, key, birth_year):
+        self.birth_year_aby = parse_birth_year(birth_year)
+        return birth_year
     
     def serialize(self):
         return {
@@ -40,7 +94,20 @@ class Planet(db.Model):
     name = db.Column(db.String(30), unique=False, nullable=False)
     population = db.Column(db.String(20), unique=False, nullable=True)
     climate = db.Column(db.String(20), unique=False, nullable=True)
-    favorites = relationship('Favorite', back_populates='planet', cascade='all, delete-orphan')
+    # population as a number, kept in step with it, for sorting and ranges
+    population_count = db.Column(db.BigInteger, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_planet_population_count', 'population_count', 'id'),
+    )
+
+    public_fields = ('id', 'name', 'population', 'climate')
+    normalized = {'population': ('population_count', parse_population)}
+
+    @validates('population')
+    def normalize_population(self, key, population):
+        self.population_count = parse_population(population)
+        return population
     
     def serialize(self):
         return {
@@ -55,7 +122,8 @@ class Vehicle(db.Model):
     name = db.Column(db.String(30), unique=False, nullable=False)
     model = db.Column(db.String(20), unique=False, nullable=True)
     vehicle_class = db.Column(db.String(20), unique=False, nullable=True)
-    favorites = relationship('Favorite', back_populates='vehicle', cascade='all, delete-orphan')
+
+    public_fields = ('id', 'name', 'model', 'vehicle_class')
     
     def serialize(self):
         return {
@@ -65,25 +133,128 @@ class Vehicle(db.Model):
             "vehicle_class": self.vehicle_class
         }
     
+# Favorite.entity_type -> model, for every catalog model that can be favorited
+ENTITY_MODELS = {
+    'character': Character,
+    'planet': Planet,
+    'vehicle': Vehicle
+}
+
 class Favorite(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    character_id = db.Column(db.Integer, db.ForeignKey('character.id'), nullable=True)
-    planet_id = db.Column(db.Integer, db.ForeignKey('planet.id'), nullable=True)
-    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=True)
+    # A key of ENTITY_MODELS and the id of that row. There is no foreign key: deleting
+    # the row deletes its favorites with one DELETE ... WHERE (favorites.listen, bulk.py)
+    entity_type = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    # NULL for favorites created before this column existed
+    created_at = db.Column(db.DateTime, nullable=True, default=utcnow, index=True)
+
+    __table_args__ = (
+        # One favorite per (user, entity); also the index of every per-user lookup
+        db.Index('uq_favorite_user_entity', 'user_id', 'entity_type', 'entity_id', unique=True),
+        # The favorites of an entity: cascade deletes and popularity counts
+        db.Index('ix_favorite_entity', 'entity_type', 'entity_id'),
+    )
     
     user = relationship('User', back_populates='favorites')
-    character = relationship('Character', back_populates='favorites')
-    planet = relationship('Planet', back_populates='favorites')
-    vehicle = relationship('Vehicle', back_populates='favorites')
+
+    public_fields = ('id', 'user_id', 'entity_type', 'entity_id')
 
     def serialize(self):
         return {
             "id": self.id,
             "user_id": self.user_id,
-            "character_id": self.character_id,
-            "planet_id": self.planet_id,
-            "vehicle_id": self.vehicle_id
+            "entity_type": self.entity_type,
+            "entity_id": self.entity_id
+        }
+
+class FavoriteSummary(db.Model):
+    """Per-user favorite ids and counts, kept in step with `favorite` by favorite_summary.py."""
+    __tablename__ = 'favorite_summary'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    character_ids = db.Column(db.JSON, nullable=False)
+    planet_ids = db.Column(db.JSON, nullable=False)
+    vehicle_ids = db.Column(db.JSON, nullable=False)
+    character_count = db.Column(db.Integer, default=0, nullable=False)
+    planet_count = db.Column(db.Integer, default=0, nullable=False)
+    vehicle_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    def serialize(self):
+        return {
+            "user_id": self.user_id,
+            "favorite_planets": {"count": self.planet_count, "ids": self.planet_ids},
+            "favorite_characters": {"count": self.character_count, "ids": self.character_ids},
+            "favorite_vehicles": {"count": self.vehicle_count, "ids": self.vehicle_ids}
+        }
+
+class FavoriteCounter(db.Model):
+    """All-time number of favorites per target, maintained by popularity.py."""
+    __tablename__ = 'favorite_counter'
+    kind = db.Column(db.String(20), primary_key=True)
+    target_id = db.Column(db.Integer, primary_key=True)
+    favorites = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_favorite_counter_ranking', 'kind', 'favorites', 'target_id'),
+    )
+
+class FavoriteRanking(db.Model):
+    """Top targets per kind for a time window, refreshed periodically by popularity.py."""
+    __tablename__ = 'favorite_ranking'
+    kind = db.Column(db.String(20), primary_key=True)
+    time_window = db.Column(db.String(10), primary_key=True)
+    # [[target_id, favorites], ...], most favorited first
+    ranking = db.Column(db.JSON, nullable=False)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+
+class TableVersion(db.Model):
+    __tablename__ = 'table_version'
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    def serialize(self):
+        return {
+            "table_name": self.table_name,
+            "version": self.version,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
         }
 
-    
\ No newline at end of file
+
+class Job(db.Model):
+    """Background job, run by jobs.py; the row is its queue entry and its status."""
+    __tablename__ = 'job'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    # queued -> running -> succeeded | failed (a failed attempt with retries left goes back to queued)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    run_after = db.Column(db.DateTime, nullable=False, default=utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_job_claim', 'status', 'run_after'),
+    )
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
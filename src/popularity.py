@@ -0,0 +1,220 @@
+"""
+Most-favorited characters, planets and vehicles.
+
+- All time: `favorite_counter` holds one row per favorited target, adjusted in the
+  same transaction as every favorite write, and an index on (kind, favorites) makes
+  the top K an index range read.
+- Time windows (day/week/month): `favorite_ranking` holds the top POPULARITY_MAX_K
+  targets per kind and window, computed from `favorite.created_at`. A ranking older
+  than POPULARITY_REFRESH_SECONDS is recomputed by the next request that reads it;
+  `flask popularity-refresh` does all of them (e.g. from cron).
+
+`flask popularity-rebuild` recomputes the counters from the favorite table.
+"""
+from datetime import timedelta
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from models import Favorite, FavoriteCounter, FavoriteRanking, ENTITY_MODELS, utcnow
+
+KIND_BY_TABLE = {model.__tablename__: kind for kind, model in ENTITY_MODELS.items()}
+
+WINDOWS = {
+    'day': timedelta(days=1),
+    'week': timedelta(days=7),
+    'month': timedelta(days=30)
+}
+ALL_TIME = 'all'
+
+COUNTER = FavoriteCounter.__table__
+RANKING = FavoriteRanking.__table__
+
+
+def upsert_counters(connection, rows, add):
+    """Insert counter rows, adding to (add=True) or replacing a counter that already exists."""
+    # One statement: two transactions creating the same counter must not both INSERT it
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        statement = (postgresql if dialect == 'postgresql' else sqlite).insert(COUNTER)
+        favorites = statement.excluded.favorites
+        statement = statement.on_conflict_do_update(
+            index_elements=[COUNTER.c.kind, COUNTER.c.target_id],
+            set_={'favorites': COUNTER.c.favorites + favorites if add else favorites})
+    elif dialect in ('mysql', 'mariadb'):
+        statement = mysql.insert(COUNTER)
+        favorites = statement.inserted.favorites
+        statement = statement.on_duplicate_key_update(favorites=COUNTER.c.favorites + favorites if add else favorites)
+    else:
+        for row in rows:
+            value = COUNTER.c.favorites + row['favorites'] if add else row['favorites']
+            result = connection.execute(
+                update(COUNTER).where(COUNTER.c.kind == row['kind'], COUNTER.c.target_id == row['target_id'])
+                .values(favorites=value))
+            if result.rowcount == 0:
+                connection.execute(insert(COUNTER).values(**row))
+        return
+    connection.execute(statement, rows)
+
+
+def adjust(connection, deltas):
+    """Apply {(kind, target_id): delta} to the counters."""
+    added = [{'kind': kind, 'target_id': target_id, 'favorites': delta}
+             for (kind, target_id), delta in sorted(deltas.items()) if delta > 0]
+    if added:
+        upsert_counters(connection, added, add=True)
+    # A removal never creates a counter
+    for (kind, target_id), delta in sorted(deltas.items()):
+        if delta < 0:
+            connection.execute(
+                update(COUNTER).where(COUNTER.c.kind == kind, COUNTER.c.target_id == target_id)
+                .values(favorites=COUNTER.c.favorites + delta))
+
+
+def recount(connection, kind, target_ids):
+    """Set the counters of the given targets from the favorite table."""
+    target_ids = sorted(set(target_ids))
+    if not target_ids:
+        return
+    counts = dict(connection.execute(
+        select(Favorite.entity_id, func.count())
+        .where(Favorite.entity_type == kind, Favorite.entity_id.in_(target_ids))
+        .group_by(Favorite.entity_id)).all())
+    unfavorited = [target_id for target_id in target_ids if not counts.get(target_id)]
+    if unfavorited:
+        forget(connection, kind, unfavorited)
+    rows = [{'kind': kind, 'target_id': target_id, 'favorites': counts[target_id]}
+            for target_id in target_ids if counts.get(target_id)]
+    if rows:
+        upsert_counters(connection, rows, add=False)
+
+
+def forget(connection, kind, target_ids):
+    connection.execute(delete(COUNTER).where(COUNTER.c.kind == kind, COUNTER.c.target_id.in_(list(target_ids))))
+
+
+def rebuild(connection):
+    """Recreate every counter from the favorite table; returns the number of rows."""
+    connection.execute(delete(COUNTER))
+    rows = connection.execute(
+        select(Favorite.entity_type, Favorite.entity_id, func.count())
+        .where(Favorite.entity_type.in_(list(ENTITY_MODELS)))
+        .group_by(Favorite.entity_type, Favorite.entity_id)).all()
+    if rows:
+        connection.execute(insert(COUNTER), [
+            {'kind': kind, 'target_id': target_id, 'favorites': count} for kind, target_id, count in rows])
+    return len(rows)
+
+
+def compute_ranking(connection, kind, window, size):
+    count = func.count().label('favorites')
+    statement = (select(Favorite.entity_id, count)
+                 .where(Favorite.entity_type == kind, Favorite.created_at >= utcnow() - WINDOWS[window])
+                 .group_by(Favorite.entity_id).order_by(count.desc(), Favorite.entity_id).limit(size))
+    return [[target_id, favorites] for target_id, favorites in connection.execute(statement)]
+
+
+def refresh_ranking(connection, kind, window, size):
+    values = {'ranking': compute_ranking(connection, kind, window, size), 'refreshed_at': utcnow()}
+    result = connection.execute(
+        update(RANKING).where(RANKING.c.kind == kind, RANKING.c.time_window == window).values(values))
+    if result.rowcount == 0:
+        try:
+            # Another request may be creating the same row; theirs is just as fresh
+            with connection.begin_nested():
+                connection.execute(insert(RANKING).values(kind=kind, time_window=window, **values))
+        except IntegrityError:
+            pass
+    return values['ranking']
+
+
+def refresh_all(connection, size):
+    """Recompute the time-window rankings of every kind; returns how many were refreshed."""
+    for kind in ENTITY_MODELS:
+        for window in WINDOWS:
+            refresh_ranking(connection, kind, window, size)
+    return len(ENTITY_MODELS) * len(WINDOWS)
+
+
+def ranking_for(connection, kind, window, size, max_age):
+    row = connection.execute(
+        select(RANKING.c.ranking, RANKING.c.refreshed_at)
+        .where(RANKING.c.kind == kind, RANKING.c.time_window == window)).first()
+    if row is not None and utcnow() - row.refreshed_at < timedelta(seconds=max_age):
+        return row.ranking
+    return refresh_ranking(connection, kind, window, size)
+
+
+def top(connection, kind, window, limit, size, max_age):
+    """[(target public columns..., favorites)] for the `limit` most favorited targets."""
+    model = ENTITY_MODELS[kind]
+    columns = [getattr(model, field) for field in model.public_fields]
+    if window == ALL_TIME:
+        statement = (select(*columns, COUNTER.c.favorites)
+                     .join(model, model.id == COUNTER.c.target_id)
+                     .where(COUNTER.c.kind == kind, COUNTER.c.favorites > 0)
+                     .order_by(COUNTER.c.favorites.desc(), COUNTER.c.target_id.desc())
+                     .limit(limit))
+        return connection.execute(statement).all()
+
+    ranking = ranking_for(connection, kind, window, size, max_age)[:limit]
+    counts = dict(ranking)
+    rows = {row.id: row for row in connection.execute(select(*columns).where(model.id.in_(list(counts))))}
+    # Targets deleted since the last refresh are skipped
+    return [tuple(rows[target_id]) + (favorites,) for target_id, favorites in ranking if target_id in rows]
+
+
+def listen(session):
+    @event.listens_for(session, 'after_flush')
+    def count_flushed(session, flush_context):
+        deltas, stale, deleted = {}, {}, {}
+        for obj in session.new:
+            if isinstance(obj, Favorite):
+                key = (obj.entity_type, obj.entity_id)
+                deltas[key] = deltas.get(key, 0) + 1
+        for obj in session.deleted:
+            if isinstance(obj, Favorite):
+                key = (obj.entity_type, obj.entity_id)
+                deltas[key] = deltas.get(key, 0) - 1
+            kind = KIND_BY_TABLE.get(getattr(obj, '__tablename__', None))
+            if kind:
+                deleted.setdefault(kind, set()).add(obj.id)
+        for obj in session.dirty:
+            # Edited favorites (admin): recount the targets before and after
+            if isinstance(obj, Favorite) and session.is_modified(obj):
+                for kind, target_id in targets_before_and_after(obj):
+                    stale.setdefault(kind, set()).add(target_id)
+
+        connection = session.connection()
+        adjust(connection, {key: delta for key, delta in deltas.items()
+                            if key[1] not in deleted.get(key[0], ()) and key[1] not in stale.get(key[0], ())})
+        for kind, target_ids in stale.items():
+            recount(connection, kind, target_ids)
+        for kind, target_ids in deleted.items():
+            forget(connection, kind, target_ids)
+
+
+def targets_before_and_after(favorite):
+    """The (kind, target id) an edited favorite pointed at before the flush and points at now."""
+    state = inspect(favorite)
+    kind, target_id = state.attrs.entity_type.history, state.attrs.entity_id.history
+    before = ((kind.deleted or kind.unchanged or [None])[0], (target_id.deleted or target_id.unchanged or [None])[0])
+    after = ((kind.added or kind.unchanged or [None])[0], (target_id.added or target_id.unchanged or [None])[0])
+    return {target for target in (before, after) if None not in target}
+
+
+def init_app(app, db):
+    listen(db.session)
+
+    @app.cli.command('popularity-rebuild')
+    def rebuild_command():
+        """Recompute the all-time favorite counters from the favorite table."""
+        with db.engine.begin() as connection:
+            count = rebuild(connection)
+        print(f"Favorite counters rebuilt for {count} targets")
+
+    @app.cli.command('popularity-refresh')
+    def refresh_command():
+        """Recompute the time-window rankings of every kind."""
+        with db.engine.begin() as connection:
+            count = refresh_all(connection, app.config['POPULARITY_MAX_K'])
+        print(f"Refreshed {count} rankings")
@@ -0,0 +1,216 @@
+"""
+Per-client rate limiting and load shedding for the `api` blueprint.
+
+Rate limiting is a token bucket per (client, route): an authenticated client is keyed
+by user id, anyone else by address. Limits are written "<rate>/<period>[:<burst>]",
+e.g. "20/second:40" or "300/minute". RATELIMIT_DEFAULT applies to every API route,
+RATELIMIT_ROUTES ("api.search=5/second:10,api.login=10/minute") overrides it per
+endpoint. With CACHE_URL set the buckets live in redis (`SharedBucketBackend`), so
+every worker enforces the same budget; otherwise they are per process, and with
+WEB_CONCURRENCY > 1 a client gets up to that many times its budget (a warning is
+logged).
+A client over its budget gets a 429 with Retry-After. Behind a proxy, set
+RATELIMIT_TRUSTED_PROXIES to the number of hops that append to X-Forwarded-For.
+
+Load shedding bounds how long a request may wait before it is worked on. Time spent
+queued in front of the app (the X-Request-Start header set by the router, when
+present) plus time spent waiting for one of SHED_MAX_CONCURRENCY slots in this
+process must stay under SHED_QUEUE_BUDGET_MS; otherwise the request is answered
+right away with a 503 and Retry-After instead of adding to the backlog.
+"""
+import logging
+import threading
+import time
+from flask import g, jsonify, request
+from auth import cached_principal
+from cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 's': 1, 'minute': 60, 'm': 60, 'hour': 3600, 'h': 3600}
+
+
+def parse_limit(text):
+    """"20/second:40" -> (tokens per second, burst)."""
+    rate, _, burst = text.strip().partition(':')
+    count, _, period = rate.partition('/')
+    try:
+        count = float(count)
+        seconds = PERIODS[period.strip().lower() or 'second']
+        burst = float(burst) if burst else max(count, 1.0)
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid rate limit '{text}'; expected e.g. '20/second:40'")
+    return count / seconds, burst
+
+
+def parse_routes(text):
+    """"api.search=5/second:10,api.login=10/minute" -> {endpoint: (rate, burst)}."""
+    routes = {}
+    for item in (text or '').split(','):
+        if item.strip():
+            endpoint, _, limit_text = item.partition('=')
+            routes[endpoint.strip()] = parse_limit(limit_text)
+    return routes
+
+
+class MemoryBucketBackend:
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, burst, now=None):
+        """Take one token; returns 0 when allowed, else the seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            tokens, updated_at, _ = self.buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            self.buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            if len(self.buckets) > self.max_keys:
+                self.prune(now)
+            return wait
+
+    def prune(self, now):
+        # A bucket that has refilled completely is the same as no bucket
+        for key, (_, _, full_at) in list(self.buckets.items()):
+            if full_at <= now:
+                del self.buckets[key]
+
+
+TAKE_SCRIPT = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or ARGV[2])
+local updated_at = tonumber(redis.call('HGET', KEYS[1], 'updated_at') or ARGV[3])
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class SharedBucketBackend:
+    """Buckets in redis (any client exposing redis-py's eval), shared by every worker."""
+
+    def __init__(self, client, prefix='starwars:ratelimit:'):
+        self.client = client
+        self.prefix = prefix
+
+    def take(self, key, rate, burst, now=None):
+        now = time.time() if now is None else now
+        return float(self.client.eval(TAKE_SCRIPT, 1, self.prefix + key, rate, burst, now))
+
+
+class LoadShedder:
+    def __init__(self, max_concurrency, queue_budget):
+        self.slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self.queue_budget = queue_budget
+
+    def upstream_queue_time(self):
+        """Seconds since the router received the request (X-Request-Start: t=<usec> or ms)."""
+        header = request.headers.get('X-Request-Start', '')
+        value = header[2:] if header.startswith('t=') else header
+        try:
+            started = float(value)
+        except ValueError:
+            return 0.0
+        # Routers send microseconds, milliseconds or seconds since the epoch
+        for scale in (1e6, 1e3, 1):
+            if started > 1e9 * scale / 10:
+                return max(0.0, time.time() - started / scale)
+        return 0.0
+
+    def admit(self):
+        """True when the request may run; the caller must release() after it."""
+        remaining = self.queue_budget - self.upstream_queue_time()
+        if remaining <= 0:
+            return False
+        if self.slots is None:
+            return True
+        return self.slots.acquire(timeout=remaining)
+
+    def release(self):
+        if self.slots is not None:
+            self.slots.release()
+
+
+class RateLimiter:
+    def __init__(self):
+        self.backend = MemoryBucketBackend()
+        self.default = None
+        self.routes = {}
+        self.shedder = None
+        self.metrics = None
+        self.trusted_proxies = 0
+
+    def init_app(self, app, blueprint_name='api', backend=None):
+        default = app.config.get('RATELIMIT_DEFAULT')
+        self.default = parse_limit(default) if default else None
+        self.routes.update(parse_routes(app.config.get('RATELIMIT_ROUTES')))
+        if backend is None and app.config.get('CACHE_URL'):
+            backend = SharedBucketBackend(redis_client(app.config['CACHE_URL']))
+        if backend is not None:
+            self.backend = backend
+        elif (self.default or self.routes) and app.config.get('WEB_CONCURRENCY', 1) > 1:
+            logger.warning("Rate limits are per process and WEB_CONCURRENCY=%s, so a client gets up to %s "
+                           "times its budget; set CACHE_URL to share the buckets",
+                           app.config['WEB_CONCURRENCY'], app.config['WEB_CONCURRENCY'])
+        budget_ms = app.config.get('SHED_QUEUE_BUDGET_MS', 0)
+        if budget_ms:
+            self.shedder = LoadShedder(app.config.get('SHED_MAX_CONCURRENCY', 0), budget_ms / 1000)
+        self.metrics = app.extensions.get('request_metrics')
+        self.trusted_proxies = app.config.get('RATELIMIT_TRUSTED_PROXIES', 0)
+
+        @app.before_request
+        def guard():
+            if request.blueprint != blueprint_name:
+                return None
+            # Over-limit clients are turned away before they can take a slot
+            limit = self.routes.get(request.endpoint, self.default)
+            if limit is not None:
+                wait = self.backend.take(f'{self.client_key()}:{request.endpoint}', *limit)
+                if wait:
+                    return self.reject(429, "Too many requests", wait)
+            if self.shedder is not None:
+                if not self.shedder.admit():
+                    return self.reject(503, "Server is busy, retry shortly", self.shedder.queue_budget)
+                g.shed_slot = True
+            return None
+
+        @app.teardown_request
+        def release_slot(error=None):
+            if g.pop('shed_slot', False):
+                self.shedder.release()
+
+        app.extensions['rate_limiter'] = self
+
+    def client_key(self):
+        # Only tokens this process has already verified identify a user; anything
+        # else (including made-up tokens) is limited by address
+        principal = cached_principal()
+        if principal is not None:
+            return f'user:{principal.id}'
+        return 'addr:' + self.client_address()
+
+    def client_address(self):
+        # Each trusted proxy appends the address it saw; anything before those is client-supplied
+        hops = self.trusted_proxies
+        route = request.access_route
+        if hops and len(route) >= hops:
+            return route[-hops]
+        return request.remote_addr or '-'
+
+    def reject(self, status, message, retry_after):
+        if self.metrics is not None:
+            self.metrics.record_rejection(request.endpoint, status)
+        response = jsonify({"error": message})
+        response.status_code = status
+        response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+        return response
+
+
+limiter = RateLimiter()
@@ -0,0 +1,162 @@
+"""
+Read replica routing.
+
+API views marked `@read_only` run their queries on one of the replicas listed in
+DATABASE_REPLICA_URLS, picked round-robin; everything else (writes, the admin,
+views that write while reading) stays on the primary. A request routed to a replica
+checks out its connection up front, so a replica that cannot be reached, or a
+Postgres standby more than REPLICA_MAX_LAG_SECONDS behind, is skipped for
+REPLICA_RETRY_SECONDS and the request falls back to the next replica or the primary.
+
+Read-your-writes: after an authenticated client's successful write, its reads stay
+on the primary for REPLICA_PIN_SECONDS, longer than the replicas usually lag, so
+e.g. a favorite just added shows up in /users/favorites. With CACHE_URL set the pins
+live in redis, so a write handled by one worker pins the reads every other worker
+serves. Without it they are per process, which only holds with one worker: with
+WEB_CONCURRENCY > 1 and no CACHE_URL, replica routing is refused and every read
+stays on the primary.
+"""
+import itertools
+import logging
+import threading
+import time
+from flask import g, request
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
+from auth import cached_principal
+from cache import LRUBackend, SharedBackend, redis_client
+from db_config import configure_engine, engine_options, pool_stats
+
+logger = logging.getLogger(__name__)
+
+# Seconds the standby is behind; 0 when it has replayed everything it received
+POSTGRES_LAG = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END")
+LAG_CHECK_SECONDS = 5
+
+
+def read_only(view):
+    """Mark an API view as safe to serve from a read replica."""
+    view.read_only = True
+    return view
+
+
+class Replica:
+    def __init__(self, engine):
+        self.engine = engine
+        self.down_until = 0.0
+        self.lag_checked_at = 0.0
+
+    def lag(self, connection):
+        if self.engine.dialect.name != 'postgresql':
+            return 0.0
+        return float(connection.execute(POSTGRES_LAG).scalar() or 0)
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.replicas = []
+        self.turns = itertools.count()
+        self.lock = threading.Lock()
+        self.pins = LRUBackend(10000, 5)
+        self.pin_seconds = 5
+        self.retry_seconds = 30
+        self.max_lag = 0
+
+    def init_app(self, app, db, blueprint_name='api', pins=None):
+        self.replicas = []
+        self.pin_seconds = app.config.get('REPLICA_PIN_SECONDS', 5)
+        if pins is None and app.config.get('CACHE_URL'):
+            pins = SharedBackend(redis_client(app.config['CACHE_URL']), prefix='starwars:replicas:',
+                                 default_ttl=self.pin_seconds)
+        urls = app.config.get('SQLALCHEMY_REPLICA_URLS', [])
+        if urls and pins is None and app.config.get('WEB_CONCURRENCY', 1) > 1:
+            # Another worker would not see this one's pins and read a client's writes from a lagging replica
+            logger.error("Replica routing disabled: read-your-writes pins are per process and "
+                         "WEB_CONCURRENCY=%s; set CACHE_URL to share them", app.config['WEB_CONCURRENCY'])
+            urls = []
+        for url in urls:
+            engine = create_engine(url, **engine_options(url))
+            configure_engine(engine)
+            self.replicas.append(Replica(engine))
+        self.pins = pins or LRUBackend(app.config.get('REPLICA_PIN_MAX_ENTRIES', 10000), self.pin_seconds)
+        self.retry_seconds = app.config.get('REPLICA_RETRY_SECONDS', 30)
+        self.max_lag = app.config.get('REPLICA_MAX_LAG_SECONDS', 0)
+        app.extensions['replica_router'] = self
+        if not self.replicas:
+            return
+
+        @app.before_request
+        def route_reads():
+            if request.blueprint != blueprint_name or request.method not in ('GET', 'HEAD'):
+                return
+            view = app.view_functions.get(request.endpoint)
+            if not getattr(view, 'read_only', False) or self.is_pinned(cached_principal()):
+                return
+            connection = self.connect()
+            if connection is not None:
+                g.replica_connection = connection
+                db.session().info['replica'] = connection
+
+        @app.after_request
+        def pin_writer(response):
+            principal = g.get('principal')
+            if principal is not None and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+                self.pin(principal.id)
+            return response
+
+        @app.teardown_request
+        def release_replica(error=None):
+            connection = g.pop('replica_connection', None)
+            if connection is not None:
+                # End the session's transaction on the connection before returning it to the pool
+                db.session.close()
+                connection.close()
+
+    def pin(self, user_id):
+        self.pins.set(f'replica-pin:{user_id}', True, ttl=self.pin_seconds)
+
+    def is_pinned(self, principal):
+        return principal is not None and self.pins.get(f'replica-pin:{principal.id}') is not None
+
+    def next_replica(self):
+        with self.lock:
+            return self.replicas[next(self.turns) % len(self.replicas)]
+
+    def connect(self):
+        """A connection to the next healthy replica, or None when reads should use the primary."""
+        for _ in range(len(self.replicas)):
+            replica = self.next_replica()
+            now = time.monotonic()
+            if replica.down_until > now:
+                continue
+            connection = None
+            try:
+                connection = replica.engine.connect()
+                if self.max_lag and now - replica.lag_checked_at >= LAG_CHECK_SECONDS:
+                    replica.lag_checked_at = now
+                    lag = replica.lag(connection)
+                    connection.rollback()
+                    if lag > self.max_lag:
+                        logger.warning("Replica %s is %.1fs behind; reading from the primary", replica.engine.url, lag)
+                        replica.down_until = now + self.retry_seconds
+                        connection.close()
+                        continue
+                return connection
+            except SQLAlchemyError as error:
+                logger.warning("Replica %s unavailable, skipping it for %ss: %s",
+                               replica.engine.url, self.retry_seconds, error)
+                replica.down_until = now + self.retry_seconds
+                if connection is not None:
+                    connection.invalidate()
+                    connection.close()
+        return None
+
+    def stats(self):
+        now = time.monotonic()
+        return [dict(pool_stats(replica.engine), url=replica.engine.url.render_as_string(hide_password=True),
+                     healthy=replica.down_until <= now) for replica in self.replicas]
+
+
+router = ReplicaRouter()
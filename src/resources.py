@@ -0,0 +1,39 @@
+"""
+Registry of the catalog resources behind the generic API routes.
+
+A Resource ties a model registered in models.ENTITY_MODELS to its URL names and list
+options; the model itself declares its fields once (`public_fields`, `normalized`,
+column lengths and nullability). routes.py registers the list, get, create, delete
+and favorite add/remove routes of every resource in RESOURCES, and the bulk, export,
+popular, entities and ASGI endpoints look resources up here by name.
+"""
+from models import Character, Planet, Vehicle, ENTITY_MODELS
+from listing import Listing
+
+RESOURCES = {}
+
+
+class Resource:
+    def __init__(self, name, model, item_path, collection, filters=(), ranges=()):
+        # URL of the list (/people) and of one item (/people/<id>)
+        self.name = name
+        self.model = model
+        self.table = model.__tablename__
+        # Favorite.entity_type, and the key of one item in responses
+        self.kind = next(kind for kind, entity_model in ENTITY_MODELS.items() if entity_model is model)
+        # Singular URL segment of the write routes (/add_people, /favorite/people/<id>)
+        self.item_path = item_path
+        # Key of the list in responses, and the plural in messages
+        self.collection = collection
+        self.label = model.__name__
+        self.listing = Listing(model, collection, filters, ranges)
+
+
+def register(resource):
+    RESOURCES[resource.name] = resource
+    return resource
+
+
+register(Resource('people', Character, 'people', 'characters', filters=('name', 'gender'), ranges=('birth_year',)))
+register(Resource('planets', Planet, 'planet', 'planets', filters=('name', 'climate'), ranges=('population',)))
+register(Resource('vehicles', Vehicle, 'vehicle', 'vehicles', filters=('name', 'vehicle_class')))
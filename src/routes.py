@@ -1,271 +1,340 @@
-from flask import Flask, request, jsonify, url_for, Blueprint
-from flask_sqlalchemy import SQLAlchemy
-from models import User, Character, Planet, Vehicle, Favorite
+from flask import request, jsonify, url_for, Blueprint, current_app
+from werkzeug.security import check_password_hash
+from sqlalchemy import and_
+from models import User, Favorite, Job, ENTITY_MODELS
 from utils import APIException
-from app import db
+from listing import parse_int, parse_id_list
+from cache import cache
+from favorites import add_favorite, remove_favorite, add_favorites, remove_favorites, existing_ids
+from bulk import bulk_insert, bulk_delete, read_items, request_ids, parse_ids, validate, BULK, DEFAULT_CHUNK_SIZE
+from versions import conditional, cache_policy
+from replicas import read_only
+from serialization import json_response, fetch_all, fetch_one, public_columns
+from export import export_response, MIMETYPES, EXPORT_BATCH_SIZE
+from search import search_index, SEARCHABLE
+from favorite_summary import summary_for
+import popularity
+from auth import current_user, issue_token
+from jobs import enqueue
+from models import db
+from resources import RESOURCES
 
 api = Blueprint('api', __name__)
 
-CURRENT_USER_ID = 1
+# POST username and password, get a bearer token for the other endpoints
+@api.route('/login', methods=['POST'])
+def login():
+    data = request.get_json(silent=True) or {}
+    username, password = data.get('username'), data.get('password')
+    if not isinstance(username, str) or not isinstance(password, str):
+        return jsonify({"error": "username and password are required"}), 400
+
+    user = User.query.filter_by(username=username).first()
+    if not user or not check_password_hash(user.password, password):
+        return jsonify({"error": "Invalid username or password"}), 401
+    return jsonify({"token": issue_token(user), "expires_in": current_app.config['AUTH_TOKEN_MAX_AGE']}), 200
 
 # GET all users
 @api.route('/users', methods=['GET'])
+@read_only
+@conditional('user')
+@cache.cached('user')
 def get_users():
-    users = User.query.all()
-    users_list = [user.serialize() for user in users]
-    return jsonify(users_list), 200
+    return json_response(fetch_all(User))
 
 # GET current user's favorites
 @api.route('/users/favorites', methods=['GET'])
+@read_only
+@cache_policy('private')
 def get_user_favorites():
-    user = User.query.get(CURRENT_USER_ID)
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    
-    # Query favorites for current user
-    favorites = Favorite.query.filter_by(user_id=user.id).all()
-    favorite_planets = [favorite.planet.serialize() for favorite in favorites if favorite.planet]
-    favorite_characters = [favorite.character.serialize() for favorite in favorites if favorite.character]
-    favorite_vehicles = [favorite.vehicle.serialize() for favorite in favorites if favorite.vehicle]
-    
-    return jsonify({
-        "favorite_planets": favorite_planets,
-        "favorite_characters": favorite_characters,
-        "favorite_vehicles": favorite_vehicles
-    }), 200
-
-
-# POST a favorite planet for the current user
-@api.route('/favorite/planet/<int:planet_id>', methods=['POST'])
-def add_favorite_planet(planet_id):
-    user = User.query.get(CURRENT_USER_ID)
-    planet = Planet.query.get(planet_id)
-    if not user or not planet:
-        return jsonify({"error": "User or Planet not found"}), 404
+    user = current_user()
     
-    new_favorite = Favorite(user_id=user.id, planet_id=planet.id)
-    db.session.add(new_favorite)
-    db.session.commit()
-    return jsonify({"message": f"Planet {planet_id} added to favorites"}), 200
-
-# POST a favorite character for the current user
-@api.route('/favorite/people/<int:people_id>', methods=['POST'])
-def add_favorite_character(people_id):
-    user = User.query.get(CURRENT_USER_ID)
-    character = Character.query.get(people_id)
-    if not user or not character:
-        return jsonify({"error": "User or Character not found"}), 404
-    
-    new_favorite = Favorite(user_id=user.id, character_id=character.id)
-    db.session.add(new_favorite)
-    db.session.commit()
-    return jsonify({"message": f"Character {people_id} added to favorites"}), 200
-
-# POST a favorite vehicle for the current user
-@api.route('/favorite/vehicle/<int:vehicle_id>', methods=['POST'])
-def add_favorite_vehicle(vehicle_id):
-    user = User.query.get(CURRENT_USER_ID)
-    vehicle = Vehicle.query.get(vehicle_id)
-    if not user or not vehicle:
-        return jsonify({"error": "User or Vehicle not found"}), 404
-
-    new_favorite = Favorite(user_id=user.id, vehicle_id=vehicle.id)
-    db.session.add(new_favorite)
-    db.session.commit()
-    return jsonify({"message": f"Vehicle {vehicle_id} added to favorites"}), 200
+    # Query favorites for current user, selecting the target columns in the same statement
+    resources = list(RESOURCES.values())
+    query = db.session.query(*[column for resource in resources for column in public_columns(resource.model)])
+    query = query.select_from(Favorite)
+    for resource in resources:
+        model = resource.model
+        query = query.outerjoin(model, and_(Favorite.entity_type == resource.kind, Favorite.entity_id == model.id))
+    rows = query.filter(Favorite.user_id == user.id).order_by(Favorite.id).all()
 
-# DELETE a favorite planet for the current user
-@api.route('/favorite/planet/<int:planet_id>', methods=['DELETE'])
-def remove_favorite_planet(planet_id):
-    user = User.query.get(CURRENT_USER_ID)
-    favorite = Favorite.query.filter_by(user_id=user.id, planet_id=planet_id).first()
-    if not favorite:
-        return jsonify({"error": "Favorite Planet not found"}), 404
+    result = {}
+    offset = 0
+    for resource in resources:
+        fields = resource.model.public_fields
+        width = len(fields)
+        result['favorite_' + resource.collection] = [
+            dict(zip(fields, row[offset:offset + width])) for row in rows if row[offset] is not None]
+        offset += width
+    return json_response(result)
 
-    db.session.delete(favorite)
-    db.session.commit()
-    return jsonify({"message": f"Planet {planet_id} removed from favorites"}), 200
+# GET current user's favorite ids and counts from the precomputed summary
+@api.route('/users/favorites/summary', methods=['GET'])
+@read_only
+@cache_policy('private')
+def get_user_favorites_summary():
+    summary = summary_for(db.session.connection(), current_user().id)
+    if summary is None:
+        return jsonify({"error": "User not found"}), 404
+    return json_response(summary.serialize())
 
-# DELETE a favorite character for the current user
-@api.route('/favorite/character/<int:character_id>', methods=['DELETE'])
-def remove_favorite_character(character_id):
-    user = User.query.get(CURRENT_USER_ID)
-    favorite = Favorite.query.filter_by(user_id=user.id, character_id=character_id).first()
-    if not favorite:
-        return jsonify({"error": "Favorite Character not found"}), 404
+#GET most favorited Characters/Planets/Vehicles (window=all|day|week|month)
+@api.route('/<resource>/popular', methods=['GET'])
+@cache_policy('public')
+def get_popular(resource):
+    if resource not in RESOURCES:
+        return jsonify({"error": f"Unknown resource '{resource}'"}), 404
+    window = request.args.get('window', popularity.ALL_TIME)
+    if window != popularity.ALL_TIME and window not in popularity.WINDOWS:
+        return jsonify({"error": "window must be one of: " + ", ".join((popularity.ALL_TIME,) + tuple(popularity.WINDOWS))}), 400
 
-    db.session.delete(favorite)
+    kind, model, collection = RESOURCES[resource].kind, RESOURCES[resource].model, RESOURCES[resource].collection
+    max_k = current_app.config['POPULARITY_MAX_K']
+    limit = parse_int('limit', 10, minimum=1, maximum=max_k)
+    rows = popularity.top(db.session.connection(), kind, window, limit, max_k,
+                          current_app.config['POPULARITY_REFRESH_SECONDS'])
+    fields = model.public_fields + ('favorites',)
+    items = [dict(zip(fields, row)) for row in rows]
     db.session.commit()
-    return jsonify({"message": f"Character {character_id} removed from favorites"}), 200
+    return json_response({"message": f"This is your GET popular {collection} request", "window": window, collection: items})
 
-# DELETE a favorite vehicle for the current user
-@api.route('/favorite/vehicle/<int:vehicle_id>', methods=['DELETE'])
-def remove_favorite_vehicle(vehicle_id):
-    user = User.query.get(CURRENT_USER_ID)
-    favorite = Favorite.query.filter_by(user_id=user.id, vehicle_id=vehicle_id).first()
-    if not favorite:
-        return jsonify({"error": "Favorite Vehicle not found"}), 404
+#GET Characters, Planets and Vehicles by id in one request (?people=1,2&planets=3&vehicles=4)
+@api.route('/entities', methods=['GET'])
+@read_only
+@cache_policy('public')
+@conditional(*[resource.table for resource in RESOURCES.values()])
+@cache.cached(*[resource.table for resource in RESOURCES.values()])
+def get_entities():
+    requested = [(name, parse_id_list(name)) for name in RESOURCES]
+    requested = [(name, ids) for name, ids in requested if ids is not None]
+    if not requested:
+        return jsonify({"error": "Pass ids for at least one of: " + ", ".join(RESOURCES)}), 400
 
-    db.session.delete(favorite)
-    db.session.commit()
-    return jsonify({"message": f"Vehicle {vehicle_id} removed from favorites"}), 200
-
-#GET Characters
-@api.route('/people', methods=['GET'])
-def get_people():
-    characters = Character.query.all()
-    return jsonify({
-        "message": "This is your GET characters request",
-        "characters": [character.serialize() for character in characters]
-    }), 200
-
-#GET Planets
-@api.route('/planets', methods=['GET'])
-def get_planets():
-    planets = Planet.query.all()
-    return jsonify({
-        "message": "This is your GET planets request",
-        "planets": [planet.serialize() for planet in planets]
-    }), 200
-
-#GET Vehicles
-@api.route('/vehicles', methods=['GET'])
-def get_vehicles():
-    vehicles = Vehicle.query.all()
-    return jsonify({
-        "message": "This is your GET vehicles request",
-        "vehicles": [vehicle.serialize() for vehicle in vehicles]
-    }), 200
-
-#GET One Character
-@api.route('/people/<int:people_id>', methods=['GET'])
-def get_character(people_id):
-    character = Character.query.get(people_id)
-    
-    if not character:
-        return jsonify({"error": "Character not found"}), 404
-    
-    return jsonify({
-        "message": "This is your GET character request",
-        "character": character.serialize()
-    }), 200
-
-#GET One Planet
-@api.route('/planets/<int:planet_id>', methods=['GET'])
-def get_planet(planet_id):
-    planet = Planet.query.get(planet_id)
-
-    if not planet:
-        return jsonify({"error": "Planet not found"}), 404
-    return jsonify({
-        "message": "This is your GET planet request",
-        "planet": planet.serialize()
-    }), 200
-
-#GET One Vehicle
-@api.route('/vehicles/<int:vehicle_id>', methods=['GET'])
-def get_vehicle(vehicle_id):
-    vehicle = Vehicle.query.get(vehicle_id)
-
-    if not vehicle:
-        return jsonify({"error": "Vehicle not found"}), 404
-    return jsonify({
-        "message": "This is your GET vehicle request",
-        "vehicle": vehicle.serialize()
-    }), 200
-
-#POST new Character
-@api.route('/add_people', methods=['POST'])
-def add_character():
-    user = User.query.get(CURRENT_USER_ID)
-    if not user or not user.is_admin:
-        return jsonify({"error": "Acces denied. Only administrators can add characters."}), 403
-    
-    data = request.json
-    new_character = Character(
-        name=data['name'],
-        birth_year=data.get('birth_year'),  # Use get() to handle optional fields
-        gender=data.get('gender')
-    )
-    db.session.add(new_character)
-    db.session.commit()
-    return jsonify({"message": "Character added successfully"}), 201
-
-#POST new Planet
-@api.route('/add_planet', methods=['POST'])
-def add_planet():
-    user = User.query.get(CURRENT_USER_ID)
-    if not user  or not user.is_admin:
-        return jsonify({"error": "Acces denied. Only administrators can add planets."}), 403
-    
-    data = request.json
-    new_planet = Planet(
-        name=data['name'],
-        population=data.get('population'),
-        climate=data.get('climate')
-    )
-    db.session.add(new_planet)
-    db.session.commit()
-    return jsonify({"message": "Planet added successfully"}), 201
-
-#POST new Vehicle
-@api.route('/add_vehicle', methods=['POST'])
-def add_vehicle():
-    user = User.query.get(CURRENT_USER_ID)
-    if not user or not user.is_admin:
-        return jsonify({"error": "Acces denied. Only administrators can add vehicles."}), 403
-    
-    data = request.json
-    new_vehicle = Vehicle(
-        name=data['name'],
-        model=data.get('model'),
-        vehicle_class=data.get('vehicle_class')
-    )
-    db.session.add(new_vehicle)
-    db.session.commit()
-    return jsonify({"message": "Vehicle added successfully"}), 201
-
-#DELETE Character
-@api.route('/delete_people/<int:people_id>', methods=['DELETE'])
-def delete_character(people_id):
-    user = User.query.get(CURRENT_USER_ID)
-    if not user or not user.is_admin:
-        return jsonify({"error": "Acces denied. Only administrators can delete characters."}), 403
-    
-    character = Character.query.get(people_id)
-    if not character:
-        return jsonify({"error": "Character not found"}), 404
-    
-    db.session.delete(character)
-    db.session.commit()
-    return jsonify("This is your DELETE character request"), 200
-
-#DELETE Planet
-@api.route('/delete_planet/<int:planet_id>', methods=['DELETE'])
-def delete_planet(planet_id):
-    user = User.query.get(CURRENT_USER_ID)
-    if not user or not user.is_admin:
-        return jsonify({"error": "Acces denied. Only administrators can delete planets."}), 403
-    
-    planet = Planet.query.get(planet_id)
-    if not planet:
-        return jsonify({"error": "Planet not found"}), 404
-    
-    db.session.delete(planet)
-    db.session.commit()
-    return jsonify("This is your DELETE planet request"), 200
-
-#DELETE Vehicle
-@api.route('/delete_vehicle/<int:vehicle_id>', methods=['DELETE'])
-def delete_vehicle():
-    user = User.query.get(CURRENT_USER_ID)
-    if not user or not user.is_admin:
-        return jsonify({"error": "Acces denied. Only administrators can delete vehicles."}), 403
-    
-    vehicle = Vehicle.query.get(vehicle_id)
-    if not vehicle:
-        return jsonify({"error": "Vehicle not found"}), 404
-    
-    db.session.delete(vehicle)
+    result = {"message": "This is your GET entities request"}
+    missing = {}
+    # One IN query per resource asked for
+    for name, ids in requested:
+        result[name], missing[name] = RESOURCES[name].listing.lookup(ids)
+    result["missing"] = missing
+    return json_response(result)
+
+def prefers_async():
+    return 'respond-async' in request.headers.get('Prefer', '').lower()
+
+def queue_job(kind, payload, user):
+    """Queue a background job and answer 202 with where to follow it."""
+    job = enqueue(kind, payload, created_by=user.id)
     db.session.commit()
-    return jsonify("This is your DELETE vehicle request"), 200
\ No newline at end of file
+    response = jsonify(job.serialize())
+    response.status_code = 202
+    response.headers['Location'] = url_for('api.get_job', job_id=job.id)
+    return response
+
+def register_resource(resource):
+    """List, get, create and delete routes for a catalog resource, and adding / removing it as a favorite."""
+    model, kind, label, collection = resource.model, resource.kind, resource.label, resource.collection
+
+    #GET the list (paginated, filtered and sorted, or ?ids=3,1,2)
+    @read_only
+    @cache_policy('public')
+    @conditional(resource.table)
+    @cache.cached(resource.table)
+    def get_items():
+        return json_response({"message": f"This is your GET {collection} request", **resource.listing.page()})
+
+    #GET one item
+    @read_only
+    @cache_policy('public')
+    @conditional(resource.table)
+    @cache.cached(resource.table)
+    def get_item(item_id):
+        item = fetch_one(model, item_id)
+        if not item:
+            return jsonify({"error": f"{label} not found"}), 404
+        return json_response({"message": f"This is your GET {kind} request", kind: item})
+
+    #POST a new item (administrators); the body holds the model's fields
+    def add_item():
+        user = current_user()
+        if not user.is_admin:
+            return jsonify({"error": f"Acces denied. Only administrators can add {collection}."}), 403
+        row, error = validate(model, request.get_json(silent=True))
+        if error:
+            return jsonify({"error": error}), 400
+        db.session.add(model(**row))
+        db.session.commit()
+        return jsonify({"message": f"{label} added successfully"}), 201
+
+    #DELETE an item with its favorites (administrators; Prefer: respond-async queues it)
+    def delete_item(item_id):
+        user = current_user()
+        if not user.is_admin:
+            return jsonify({"error": f"Acces denied. Only administrators can delete {collection}."}), 403
+        item = db.session.get(model, item_id)
+        if not item:
+            return jsonify({"error": f"{label} not found"}), 404
+        if prefers_async():
+            return queue_job('delete', {'resource': resource.name, 'ids': [item_id]}, user)
+        db.session.delete(item)
+        db.session.commit()
+        return jsonify(f"This is your DELETE {kind} request"), 200
+
+    #POST the item as a favorite of the current user
+    def add_favorite_item(item_id):
+        user = current_user()
+        if not existing_ids(kind, [item_id]):
+            return jsonify({"error": f"{label} not found"}), 404
+        if not add_favorite(user.id, kind, item_id):
+            return jsonify({"message": f"{label} {item_id} is already in favorites"}), 200
+        return jsonify({"message": f"{label} {item_id} added to favorites"}), 200
+
+    #DELETE the item from the current user's favorites
+    def remove_favorite_item(item_id):
+        user = current_user()
+        if not remove_favorite(user.id, kind, item_id):
+            return jsonify({"error": f"Favorite {label} not found"}), 404
+        return jsonify({"message": f"{label} {item_id} removed from favorites"}), 200
+
+    api.add_url_rule(f'/{resource.name}', f'get_{resource.name}', get_items, methods=['GET'])
+    api.add_url_rule(f'/{resource.name}/<int:item_id>', f'get_{kind}', get_item, methods=['GET'])
+    api.add_url_rule(f'/add_{resource.item_path}', f'add_{kind}', add_item, methods=['POST'])
+    api.add_url_rule(f'/delete_{resource.item_path}/<int:item_id>', f'delete_{kind}', delete_item, methods=['DELETE'])
+    # Favorites answer under both the item path and the kind (/favorite/people/1 and /favorite/character/1)
+    for segment in dict.fromkeys((resource.item_path, kind)):
+        api.add_url_rule(f'/favorite/{segment}/<int:item_id>', f'add_favorite_{kind}', add_favorite_item,
+                         methods=['POST'])
+        api.add_url_rule(f'/favorite/{segment}/<int:item_id>', f'remove_favorite_{kind}', remove_favorite_item,
+                         methods=['DELETE'])
+
+for resource in RESOURCES.values():
+    register_resource(resource)
+
+EMPTY_BULK_BODY = "Request body is empty; send a JSON array or NDJSON lines of items"
+
+#POST many Characters/Planets/Vehicles at once (JSON array or NDJSON stream)
+@api.route('/bulk/<resource>', methods=['POST'])
+def bulk_add(resource):
+    if resource not in BULK:
+        return jsonify({"error": f"Unknown resource '{resource}'"}), 404
+    user = current_user()
+    if not user.is_admin:
+        return jsonify({"error": f"Acces denied. Only administrators can add {resource}."}), 403
+
+    model = BULK[resource]
+    chunk_size = parse_int('chunk_size', DEFAULT_CHUNK_SIZE, minimum=1, maximum=10000)
+    if prefers_async():
+        # Lines that are not valid JSON are reported by the job like any other invalid item
+        items = [None if isinstance(item, ValueError) else item for item in read_items()]
+        if not items:
+            raise APIException(EMPTY_BULK_BODY, status_code=400)
+        return queue_job('import', {'resource': resource, 'items': items, 'chunk_size': chunk_size}, user)
+    inserted, errors = bulk_insert(model, read_items(), chunk_size)
+    if not inserted:
+        # Nothing was added: an empty body, or only invalid items
+        raise APIException("No valid items to add" if errors else EMPTY_BULK_BODY, status_code=400,
+                           payload={"errors": errors} if errors else None)
+    return jsonify({"message": f"{inserted} {resource} added", "inserted": inserted, "errors": errors}), 201
+
+#DELETE many Characters/Planets/Vehicles by id (?ids=1,2,3 or {"ids": [...]})
+@api.route('/bulk/<resource>', methods=['DELETE'])
+def bulk_remove(resource):
+    if resource not in BULK:
+        return jsonify({"error": f"Unknown resource '{resource}'"}), 404
+    user = current_user()
+    if not user.is_admin:
+        return jsonify({"error": f"Acces denied. Only administrators can delete {resource}."}), 403
+
+    model = BULK[resource]
+    chunk_size = parse_int('chunk_size', DEFAULT_CHUNK_SIZE, minimum=1, maximum=10000)
+    if prefers_async():
+        return queue_job('delete', {'resource': resource, 'ids': request_ids(), 'chunk_size': chunk_size}, user)
+    deleted = bulk_delete(model, request_ids(), chunk_size)
+    return jsonify({"message": f"{deleted} {resource} deleted", "deleted": deleted}), 200
+
+#POST queue a background job (admins): {"kind": "search-rebuild", "payload": {...}}
+@api.route('/jobs', methods=['POST'])
+def create_job():
+    user = current_user()
+    if not user.is_admin:
+        return jsonify({"error": "Acces denied. Only administrators can queue jobs."}), 403
+    data = request.get_json(silent=True) or {}
+    payload = data.get('payload') or {}
+    if not isinstance(payload, dict):
+        return jsonify({"error": "payload must be a JSON object"}), 400
+    return queue_job(data.get('kind'), payload, user)
+
+#GET status and result of a background job (its creator or an administrator)
+@api.route('/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    user = current_user()
+    job = db.session.get(Job, job_id)
+    if job is None or (job.created_by != user.id and not user.is_admin):
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.serialize()), 200
+
+def favorite_targets():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not set(data) <= set(ENTITY_MODELS):
+        raise APIException("Expected an object like {\"character\": [1], \"planet\": [2], \"vehicle\": [3]}", status_code=400)
+    return {kind: parse_ids(ids) for kind, ids in data.items()}
+
+#POST many favorites for the current user
+@api.route('/favorite/batch', methods=['POST'])
+def add_favorite_batch():
+    user = current_user()
+    missing = add_favorites(user.id, favorite_targets())
+    return jsonify({"message": "Favorites added", "missing": missing}), 200
+
+#DELETE many favorites for the current user
+@api.route('/favorite/batch', methods=['DELETE'])
+def remove_favorite_batch():
+    user = current_user()
+    removed = remove_favorites(user.id, favorite_targets())
+    return jsonify({"message": f"{removed} favorites removed", "removed": removed}), 200
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+#GET ranked search by name (and other text columns) across characters, planets and vehicles
+@api.route('/search', methods=['GET'])
+@read_only
+@cache_policy('public')
+def search():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Missing search query 'q'"}), 400
+    kinds = request.args.get('kinds')
+    kinds = [kind.strip() for kind in kinds.split(',')] if kinds else list(SEARCHABLE)
+    unknown = [kind for kind in kinds if kind not in SEARCHABLE]
+    if unknown:
+        return jsonify({"error": "kinds must be some of: " + ", ".join(SEARCHABLE)}), 400
+
+    limit = parse_int('limit', SEARCH_LIMIT, minimum=1, maximum=MAX_SEARCH_LIMIT)
+    offset = parse_int('offset', 0, minimum=0)
+    rows = search_index.search(db.session.connection(), query, kinds, limit + 1, offset)
+    results = [{"kind": row.kind, "id": row.entity_id, "name": row.name, "score": round(float(row.score), 4)}
+               for row in rows[:limit]]
+    next_url = None
+    if len(rows) > limit:
+        next_url = url_for('api.search', **{**request.args.to_dict(), 'offset': offset + limit})
+    return json_response({"message": "This is your search request", "results": results, "next": next_url})
+
+EXPORTS = {
+    **{name: public_columns(resource.model) for name, resource in RESOURCES.items()},
+    'favorites': public_columns(Favorite),
+    'users': public_columns(User)
+}
+
+#GET streaming export of a whole table (format=ndjson|json)
+@api.route('/export/<resource>', methods=['GET'])
+@read_only
+def export_resource(resource):
+    if resource not in EXPORTS:
+        return jsonify({"error": f"Unknown resource '{resource}'"}), 404
+
+    output_format = request.args.get('format', 'ndjson')
+    if output_format not in MIMETYPES:
+        return jsonify({"error": "format must be one of: " + ", ".join(MIMETYPES)}), 400
+
+    batch_size = parse_int('batch_size', EXPORT_BATCH_SIZE, minimum=1, maximum=10000)
+    return export_response(EXPORTS[resource], output_format, batch_size)
@@ -0,0 +1,311 @@
+"""
+Name search across characters, planets and vehicles.
+
+The index lives in a `search_index` table whose shape depends on the database:
+
+- SQLite: an FTS5 virtual table (plus an fts5vocab table used for typo tolerance),
+  ranked with bm25 and queried with prefix terms.
+- PostgreSQL: a regular table with a weighted tsvector column (GIN) and a pg_trgm
+  index on name, ranked with ts_rank plus trigram similarity.
+
+Rows are maintained incrementally from the session (inserts, edits and deletes done
+through the ORM, including Flask-Admin) and explicitly by the bulk endpoints. When
+the index table does not exist (e.g. MySQL, or a database created with create_all)
+search falls back to LIKE queries on the source tables. A migration or a rebuild in
+another process may create it later, so on SQLite and PostgreSQL the fallback is not
+final: writes look for the index again on their own connection, and searches do
+after INDEX_RECHECK_SECONDS.
+
+`flask search-rebuild` recreates and backfills the index.
+"""
+import difflib
+import re
+import time
+from sqlalchemy import event, inspect, text
+from models import Character, Planet, Vehicle
+
+INDEX_TABLE = 'search_index'
+INDEX_RECHECK_SECONDS = 5
+
+# kind -> (model, name column, other searchable columns, rowid offset)
+SEARCHABLE = {
+    'character': (Character, 'name', ('gender', 'birth_year'), 1),
+    'planet': (Planet, 'name', ('climate',), 2),
+    'vehicle': (Vehicle, 'name', ('model', 'vehicle_class'), 3)
+}
+KIND_BY_TABLE = {model.__tablename__: kind for kind, (model, _, _, _) in SEARCHABLE.items()}
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokens(query):
+    return [token.lower() for token in TOKEN.findall(query or '')][:8]
+
+
+def body_of(kind, values):
+    _, _, others, _ = SEARCHABLE[kind]
+    return ' '.join(str(values[field]) for field in others if values.get(field))
+
+
+def quoted(connection, model):
+    return connection.dialect.identifier_preparer.quote(model.__tablename__)
+
+
+def body_sql(kind):
+    _, _, others, _ = SEARCHABLE[kind]
+    return " || ' ' || ".join(f"coalesce({field}, '')" for field in others)
+
+
+class LikeSearch:
+    """No index: scan the source tables with LIKE. Used when no search index exists."""
+    name = 'like'
+
+    def index(self, connection, kind, rows):
+        pass
+
+    def remove(self, connection, kind, ids):
+        pass
+
+    def search(self, connection, query, kinds, limit, offset):
+        words = tokens(query)
+        if not words:
+            return []
+        parts = []
+        params = {}
+        for kind in kinds:
+            model, name, others, _ = SEARCHABLE[kind]
+            conditions = []
+            for position, word in enumerate(words):
+                params[f'w{position}'] = f'%{word}%'
+                columns = (name,) + others
+                conditions.append('(' + ' OR '.join(f'lower({column}) LIKE :w{position}' for column in columns) + ')')
+            parts.append(f"SELECT '{kind}' AS kind, id AS entity_id, {name} AS name, "
+                         f"CASE WHEN lower({name}) LIKE :first THEN 2 ELSE 1 END AS score "
+                         f'FROM {quoted(connection, model)} WHERE ' + ' AND '.join(conditions))
+        params.update(first=words[0] + '%', limit=limit, offset=offset)
+        statement = ' UNION ALL '.join(parts) + ' ORDER BY score DESC, name, kind, entity_id LIMIT :limit OFFSET :offset'
+        return connection.execute(text(statement), params).all()
+
+
+class SqliteSearch:
+    name = 'fts5'
+
+    def create(self, connection):
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+            "kind UNINDEXED, entity_id UNINDEXED, name, body, tokenize='unicode61 remove_diacritics 2')"))
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE}_vocab USING fts5vocab({INDEX_TABLE}, 'row')"))
+
+    def rowid(self, kind, entity_id):
+        return entity_id * 4 + SEARCHABLE[kind][3]
+
+    def index(self, connection, kind, rows):
+        self.remove(connection, kind, [row['id'] for row in rows])
+        connection.execute(
+            text(f"INSERT INTO {INDEX_TABLE} (rowid, kind, entity_id, name, body) "
+                 "VALUES (:rowid, :kind, :entity_id, :name, :body)"),
+            [{'rowid': self.rowid(kind, row['id']), 'kind': kind, 'entity_id': row['id'],
+              'name': row['name'], 'body': body_of(kind, row)} for row in rows])
+
+    def remove(self, connection, kind, ids):
+        if ids:
+            connection.execute(text(f"DELETE FROM {INDEX_TABLE} WHERE rowid = :rowid"),
+                               [{'rowid': self.rowid(kind, entity_id)} for entity_id in ids])
+
+    def backfill(self, connection):
+        connection.execute(text(f"DELETE FROM {INDEX_TABLE}"))
+        for kind, (model, name, _, offset) in SEARCHABLE.items():
+            connection.execute(text(
+                f"INSERT INTO {INDEX_TABLE} (rowid, kind, entity_id, name, body) "
+                f"SELECT id * 4 + {offset}, '{kind}', id, {name}, {body_sql(kind)} FROM {quoted(connection, model)}"))
+
+    def corrections(self, connection, word):
+        """Closest indexed terms for a word that matches nothing as a prefix."""
+        candidates = [row.term for row in connection.execute(
+            text(f"SELECT term FROM {INDEX_TABLE}_vocab WHERE term >= :start AND term < :end"),
+            {'start': word[0], 'end': word[0] + '\uffff'})]
+        if any(term.startswith(word) for term in candidates):
+            return [word]
+        return difflib.get_close_matches(word, candidates, n=3, cutoff=0.7)
+
+    def match_expression(self, words, fuzzy_connection=None):
+        clauses = []
+        for word in words:
+            alternatives = self.corrections(fuzzy_connection, word) if fuzzy_connection is not None else [word]
+            if not alternatives:
+                return None
+            clauses.append('(' + ' OR '.join(f'"{term}"*' for term in alternatives) + ')')
+        return ' AND '.join(clauses)
+
+    def search(self, connection, query, kinds, limit, offset):
+        words = tokens(query)
+        if not words:
+            return []
+        statement = text(
+            f"SELECT kind, entity_id, name, -bm25({INDEX_TABLE}, 0, 0, 10.0, 1.0) AS score FROM {INDEX_TABLE} "
+            f"WHERE {INDEX_TABLE} MATCH :match AND kind IN ({', '.join(repr(kind) for kind in kinds)}) "
+            "ORDER BY score DESC, name, rowid LIMIT :limit OFFSET :offset")
+        rows = connection.execute(statement, {'match': self.match_expression(words), 'limit': limit, 'offset': offset}).all()
+        if rows or offset:
+            return rows
+        # Nothing matched as typed: retry with the closest indexed terms
+        match = self.match_expression(words, fuzzy_connection=connection)
+        if match is None:
+            return []
+        return connection.execute(statement, {'match': match, 'limit': limit, 'offset': offset}).all()
+
+
+class PostgresSearch:
+    name = 'tsvector'
+
+    def create(self, connection):
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ("
+            "kind VARCHAR(20) NOT NULL, entity_id INTEGER NOT NULL, name TEXT NOT NULL, body TEXT NOT NULL DEFAULT '', "
+            "document tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', name), 'A') || setweight(to_tsvector('simple', body), 'B')) STORED, "
+            "PRIMARY KEY (kind, entity_id))"))
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{INDEX_TABLE}_document ON {INDEX_TABLE} USING gin (document)"))
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{INDEX_TABLE}_name_trgm ON {INDEX_TABLE} USING gin (name gin_trgm_ops)"))
+
+    def index(self, connection, kind, rows):
+        connection.execute(
+            text(f"INSERT INTO {INDEX_TABLE} (kind, entity_id, name, body) VALUES (:kind, :entity_id, :name, :body) "
+                 "ON CONFLICT (kind, entity_id) DO UPDATE SET name = excluded.name, body = excluded.body"),
+            [{'kind': kind, 'entity_id': row['id'], 'name': row['name'], 'body': body_of(kind, row)} for row in rows])
+
+    def remove(self, connection, kind, ids):
+        if ids:
+            connection.execute(text(f"DELETE FROM {INDEX_TABLE} WHERE kind = :kind AND entity_id = ANY(:ids)"),
+                               {'kind': kind, 'ids': list(ids)})
+
+    def backfill(self, connection):
+        connection.execute(text(f"TRUNCATE {INDEX_TABLE}"))
+        for kind, (model, name, _, _) in SEARCHABLE.items():
+            connection.execute(text(
+                f"INSERT INTO {INDEX_TABLE} (kind, entity_id, name, body) "
+                f"SELECT '{kind}', id, {name}, {body_sql(kind)} FROM {quoted(connection, model)}"))
+
+    def search(self, connection, query, kinds, limit, offset):
+        words = tokens(query)
+        if not words:
+            return []
+        statement = text(
+            f"SELECT kind, entity_id, name, ts_rank(document, q) + similarity(name, :raw) AS score "
+            f"FROM {INDEX_TABLE}, to_tsquery('simple', :tsquery) q "
+            "WHERE (document @@ q OR name % :raw) AND kind = ANY(:kinds) "
+            "ORDER BY score DESC, name, kind, entity_id LIMIT :limit OFFSET :offset")
+        return connection.execute(statement, {
+            'raw': ' '.join(words), 'tsquery': ' & '.join(word + ':*' for word in words),
+            'kinds': list(kinds), 'limit': limit, 'offset': offset}).all()
+
+
+BACKENDS = {
+    'sqlite': SqliteSearch,
+    'postgresql': PostgresSearch
+}
+
+
+class SearchIndex:
+    def __init__(self):
+        self.engine = None
+        self._backend = None
+        self._recheck_at = 0.0
+
+    def init_app(self, app, db):
+        with app.app_context():
+            self.engine = db.engine
+        self.listen(db.session)
+        self.register_commands(app, db)
+        app.extensions['search_index'] = self
+
+    @property
+    def backend(self):
+        # Resolved on first use so that importing the app never touches the database
+        if self._backend is None or (self.missing_index and time.monotonic() >= self._recheck_at):
+            self.resolve(self.engine)
+        return self._backend
+
+    def resolve(self, bind):
+        backend_class = BACKENDS.get(bind.dialect.name)
+        if backend_class is not None and inspect(bind).has_table(INDEX_TABLE):
+            self._backend = backend_class()
+        else:
+            self._backend = LikeSearch()
+            self._recheck_at = time.monotonic() + INDEX_RECHECK_SECONDS
+        return self._backend
+
+    @property
+    def missing_index(self):
+        """True while on the LIKE fallback of a database that can have an index."""
+        return isinstance(self._backend, LikeSearch) and self.engine.dialect.name in BACKENDS
+
+    def backend_for(self, connection):
+        # A write must not skip an index created since the last look, or the index goes stale
+        if self._backend is None or self.missing_index:
+            return self.resolve(connection)
+        return self._backend
+
+    def index_rows(self, connection, kind, rows):
+        """`rows` are mappings with id, name and the other searchable columns."""
+        if rows:
+            self.backend_for(connection).index(connection, kind, rows)
+
+    def remove_ids(self, connection, kind, ids):
+        self.backend_for(connection).remove(connection, kind, ids)
+
+    @property
+    def maintained(self):
+        return not isinstance(self.backend, LikeSearch)
+
+    def maintained_on(self, connection):
+        return not isinstance(self.backend_for(connection), LikeSearch)
+
+    def search(self, connection, query, kinds, limit, offset):
+        return self.backend.search(connection, query, kinds, limit, offset)
+
+    def listen(self, session):
+        @event.listens_for(session, 'after_flush')
+        def maintain_index(session, flush_context):
+            changed, removed = {}, {}
+            for obj in list(session.new) + list(session.dirty):
+                kind = KIND_BY_TABLE.get(getattr(obj, '__tablename__', None))
+                if kind and (obj in session.new or session.is_modified(obj)):
+                    _, name, others, _ = SEARCHABLE[kind]
+                    changed.setdefault(kind, []).append(
+                        {field: getattr(obj, field) for field in ('id', name) + others})
+            for obj in session.deleted:
+                kind = KIND_BY_TABLE.get(getattr(obj, '__tablename__', None))
+                if kind:
+                    removed.setdefault(kind, []).append(obj.id)
+            if not changed and not removed:
+                return
+            connection = session.connection()
+            if not self.maintained_on(connection):
+                return
+            for kind, ids in removed.items():
+                self.remove_ids(connection, kind, ids)
+            for kind, rows in changed.items():
+                self.index_rows(connection, kind, rows)
+
+    def rebuild(self, connection):
+        backend_class = BACKENDS.get(connection.dialect.name)
+        if backend_class is None:
+            raise RuntimeError(f"No search index support for '{connection.dialect.name}'")
+        backend = backend_class()
+        backend.create(connection)
+        backend.backfill(connection)
+        self._backend = backend
+
+    def register_commands(self, app, db):
+        @app.cli.command('search-rebuild')
+        def search_rebuild():
+            """Create the search index if needed and rebuild it from the catalog tables."""
+            with db.engine.begin() as connection:
+                self.rebuild(connection)
+            print(f"Search index rebuilt ({self.backend.name})")
+
+
+search_index = SearchIndex()
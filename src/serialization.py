@@ -0,0 +1,49 @@
+"""
+Fast serialization path for API responses.
+
+Rows are fetched as plain column tuples (no ORM objects, no identity map) using the
+`public_fields` each model declares, turned into dicts with zip, and encoded with
+orjson when it is installed, falling back to the standard library json module.
+"""
+import json
+from flask import Response
+from models import db
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':'), default=str).encode()
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def public_columns(model, fields=None):
+    return [model.__table__.columns[field] for field in (fields or model.public_fields)]
+
+
+def as_dicts(fields, rows):
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def select_rows(model, fields=None):
+    """Query returning tuples of the model's public columns."""
+    return db.session.query(*public_columns(model, fields))
+
+
+def fetch_all(model, fields=None):
+    fields = fields or model.public_fields
+    return as_dicts(fields, select_rows(model, fields).order_by(model.id))
+
+
+def fetch_one(model, id, fields=None):
+    fields = fields or model.public_fields
+    row = select_rows(model, fields).filter(model.id == id).first()
+    return None if row is None else dict(zip(fields, row))
@@ -11,8 +11,9 @@ class APIException(Exception):
         self.payload = payload
 
     def to_dict(self):
+        # Same shape as the error bodies the views build themselves: {"error": message}
         rv = dict(self.payload or ())
-        rv['message'] = self.message
+        rv['error'] = self.message
         return rv
 
 def has_no_empty_params(rule):
@@ -21,7 +22,7 @@ def has_no_empty_params(rule):
     return len(defaults) >= len(arguments)
 
 def generate_sitemap(app):
-    links = ['/admin/']
+    links = ['/admin/'] if 'admin' in app.blueprints else []
     for rule in app.url_map.iter_rules():
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
@@ -0,0 +1,185 @@
+"""
+Per-table version counters and conditional GET support.
+
+Every flush (API handlers, Flask-Admin views) and every ORM bulk statement bumps the
+`table_version` row of the tables it wrote, inside the same transaction. Read
+endpoints derive a strong ETag and Last-Modified from those rows, so a client that
+already has the current payload gets a 304 without any catalog row being loaded.
+Only tables some `conditional` view depends on are counted; writes to the others
+(jobs, favorite summaries, ...) take no extra statement and no lock on a counter row.
+
+Views also declare who may cache their responses with `cache_policy`: 'public'
+(the catalog; shared caches and CDNs may keep it for CACHE_CONTROL_MAX_AGE seconds),
+'private' (per-user data; only the client may keep it, and must revalidate) or
+'no-store'. API views without a policy are treated as 'private' when they read and
+'no-store' when they write; error responses are never cached.
+"""
+import hashlib
+from datetime import timezone
+from functools import wraps
+from flask import Response, request, make_response
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from models import db, TableVersion, utcnow
+
+# Filled by `conditional`: the tables whose versions some response depends on
+VERSIONED_TABLES = set()
+
+
+def bump_versions(connection, tables):
+    now = utcnow()
+    version_table = TableVersion.__table__
+    rows = [{'table_name': table, 'version': 1, 'updated_at': now} for table in tables]
+    # One statement: two transactions writing a table that has no row yet must not both INSERT it
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        statement = (postgresql if dialect == 'postgresql' else sqlite).insert(version_table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[version_table.c.table_name],
+            set_={'version': version_table.c.version + 1, 'updated_at': statement.excluded.updated_at})
+    elif dialect in ('mysql', 'mariadb'):
+        statement = mysql.insert(version_table)
+        statement = statement.on_duplicate_key_update(
+            version=version_table.c.version + 1, updated_at=statement.inserted.updated_at)
+    else:
+        for row in rows:
+            result = connection.execute(
+                update(version_table)
+                .where(version_table.c.table_name == row['table_name'])
+                .values(version=version_table.c.version + 1, updated_at=now))
+            if result.rowcount == 0:
+                connection.execute(insert(version_table).values(**row))
+        return
+    connection.execute(statement, rows)
+
+
+def listen(session):
+    @event.listens_for(session, 'after_flush')
+    def bump_flushed(session, flush_context):
+        tables = set()
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            table = getattr(obj, '__tablename__', None)
+            if table in VERSIONED_TABLES and (obj not in session.dirty or session.is_modified(obj)):
+                tables.add(table)
+        if tables:
+            bump_versions(session.connection(), sorted(tables))
+
+    @event.listens_for(session, 'do_orm_execute')
+    def bump_bulk(orm_execute_state):
+        # The bump runs in the statement's transaction, so doing it first is safe
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            table = getattr(orm_execute_state.statement, 'table', None)
+            if table is not None and table.name in VERSIONED_TABLES:
+                bump_versions(orm_execute_state.session.connection(), [table.name])
+
+
+def versions_statement(tables):
+    return select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at).where(
+        TableVersion.table_name.in_(tables))
+
+
+def summarize_versions(tables, rows):
+    found = {row.table_name: row for row in rows}
+    versions = [(table, found[table].version if table in found else 0) for table in tables]
+    stamps = [row.updated_at for row in rows if row.updated_at is not None]
+    return versions, max(stamps) if stamps else None
+
+
+def current_versions(tables):
+    return summarize_versions(tables, db.session.execute(versions_statement(tables)).all())
+
+
+def compute_etag(versions, full_path):
+    state = ','.join(f"{table}:{version}" for table, version in versions)
+    return hashlib.sha1((state + '|' + full_path).encode()).hexdigest()
+
+
+def http_last_modified(last_modified):
+    if last_modified is None:
+        return None
+    return last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+
+
+def is_not_modified(etag, last_modified, if_none_match, if_modified_since):
+    """`if_none_match` is a werkzeug ETags object, `if_modified_since` a datetime or None."""
+    if if_none_match:
+        # Weak comparison: compressed responses carry the same ETag marked weak
+        return if_none_match.contains_weak(etag)
+    if if_modified_since and last_modified is not None:
+        return last_modified <= if_modified_since
+    return False
+
+
+def conditional(*tables):
+    """Answer If-None-Match / If-Modified-Since from the version counters of `tables`."""
+    VERSIONED_TABLES.update(tables)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions, last_modified = current_versions(tables)
+            etag = compute_etag(versions, request.full_path)
+            last_modified = http_last_modified(last_modified)
+
+            if is_not_modified(etag, last_modified, request.if_none_match, request.if_modified_since):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            return response
+        return wrapper
+    return decorator
+
+
+CACHE_POLICIES = ('public', 'private', 'no-store')
+
+
+def cache_policy(policy):
+    """Declare who may cache the view's responses: 'public', 'private' or 'no-store'."""
+    if policy not in CACHE_POLICIES:
+        raise ValueError(f"Unknown cache policy '{policy}'")
+
+    def decorator(view):
+        view.cache_policy = policy
+        return view
+    return decorator
+
+
+def view_policy(view, method):
+    policy = getattr(view, 'cache_policy', None)
+    if policy is None:
+        policy = 'private' if method in ('GET', 'HEAD') else 'no-store'
+    return policy
+
+
+def cache_headers(policy, status, config):
+    """[(header, value)] for a response with `status` from a view with `policy`."""
+    if status not in (200, 304) or policy == 'no-store':
+        return [('Cache-Control', 'no-store')]
+    if policy == 'private':
+        return [('Cache-Control', 'private, no-cache'), ('Vary', 'Authorization')]
+    value = f"public, max-age={config['CACHE_CONTROL_MAX_AGE']}"
+    if config.get('CACHE_CONTROL_STALE_WHILE_REVALIDATE'):
+        value += f", stale-while-revalidate={config['CACHE_CONTROL_STALE_WHILE_REVALIDATE']}"
+    return [('Cache-Control', value)]
+
+
+def init_app(app, db, blueprint_name='api'):
+    app.config.setdefault('CACHE_CONTROL_MAX_AGE', 60)
+    listen(db.session)
+
+    @app.after_request
+    def set_cache_headers(response):
+        if request.blueprint != blueprint_name or 'Cache-Control' in response.headers:
+            return response
+        policy = view_policy(app.view_functions.get(request.endpoint), request.method)
+        for header, value in cache_headers(policy, response.status_code, app.config):
+            if header == 'Vary':
+                response.vary.add(value)
+            else:
+                response.headers[header] = value
+        return response
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """One app per test run (the extensions are module-level singletons) on a throwaway SQLite file."""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + str(tmp_path_factory.mktemp('db') / 'test.db')
+    os.environ['JOBS_WORKERS'] = '0'
+    os.environ['ADMIN_ENABLED'] = '0'
+    from app import create_app
+    from models import db
+
+    app = create_app({'TESTING': True})
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """make_user(username) -> (user id, Authorization headers)"""
+    from werkzeug.security import generate_password_hash
+    from auth import issue_token
+    from models import db, User
+
+    def make(username, is_admin=False):
+        with app.app_context():
+            user = User(username=username, password=generate_password_hash('secret'), is_admin=is_admin)
+            db.session.add(user)
+            db.session.commit()
+            return user.id, {'Authorization': 'Bearer ' + issue_token(user)}
+    return make
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+import pytest
+
+
+@pytest.fixture
+def asgi(app, monkeypatch):
+    # asgi.py serves `app.app`; hand it the test app instead of building a second one
+    # (setattr would read the lazy module attribute first, which builds one)
+    import app as app_module
+    monkeypatch.setitem(vars(app_module), 'app', app)
+    import asgi
+    return asgi
+
+
+def scope_for(method, path, headers=()):
+    path, _, query = path.partition('?')
+    return {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+            'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80)}
+
+
+async def call(application, method, path, headers=(), body=b''):
+    messages = []
+    pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+    async def receive():
+        return pending.pop(0) if pending else {'type': 'http.disconnect'}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope_for(method, path, headers), receive, send)
+    response_headers = {name.decode(): value.decode() for name, value in messages[0]['headers']}
+    return messages[0]['status'], response_headers, b''.join(message.get('body', b'') for message in messages[1:])
+
+
+def test_reads_are_served_natively_and_writes_by_flask(app, asgi, make_user):
+    _, admin = make_user('asgi-admin', is_admin=True)
+    authorization = [('Authorization', admin['Authorization']), ('Content-Type', 'application/json')]
+    application = asgi.AsyncReadApp(app, app.config['SQLALCHEMY_DATABASE_URI'])
+
+    async def scenario():
+        try:
+            # A write is not matched and goes through the Flask app
+            assert application.match(scope_for('POST', '/starwars/add_people')) is None
+            body = json.dumps({'name': 'Fives'}).encode()
+            status, _, _ = await call(application, 'POST', '/starwars/add_people',
+                                      authorization + [('Content-Length', str(len(body)))], body)
+            assert status == 201
+
+            assert application.match(scope_for('GET', '/starwars/people')) is not None
+            status, headers, body = await call(application, 'GET', '/starwars/people?limit=100')
+            assert status == 200
+            assert 'Fives' in [item['name'] for item in json.loads(body)['characters']]
+
+            status, _, body = await call(application, 'GET', '/starwars/people?limit=100',
+                                         [('If-None-Match', headers['etag'])])
+            assert (status, body) == (304, b'')
+
+            status, _, body = await call(application, 'GET', '/starwars/people?cursor=nope')
+            assert status == 400
+            assert set(json.loads(body)) == {'error'}
+        finally:
+            await application.engine.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,37 @@
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import cache
+from auth import Principal, PrincipalCache
+from cache import LRUBackend, SharedBackend
+from models import User, is_password_hash
+from test_cache import FakeRedis
+
+
+def test_only_full_hashes_are_kept():
+    assert is_password_hash(generate_password_hash('secret'))
+    for password in ('pbkdf2:hunter2', 'scrypt:letmein', 'pbkdf2:sha256:1$salt$', 'scrypt:1:2:3$salt$not-hex'):
+        assert not is_password_hash(password)
+        assert check_password_hash(User(username='u', password=password).password, password)
+
+
+def test_invalidation_reaches_other_workers_through_shared_generations():
+    redis = FakeRedis()
+    worker_a = PrincipalCache(LRUBackend(), SharedBackend(redis, default_ttl=0))
+    worker_b = PrincipalCache(LRUBackend(), SharedBackend(redis, default_ttl=0))
+    admin = Principal(1, 'leia', True)
+    worker_b.set('token', admin, expires_at=float('inf'))
+    assert worker_b.get('token') == admin
+
+    worker_a.invalidate([1])
+    assert worker_b.get('token') is None
+
+
+def test_admins_expire_sooner_without_shared_generations(monkeypatch):
+    principals = PrincipalCache(LRUBackend(default_ttl=60), admin_ttl=5)
+    principals.set('admin', Principal(1, 'leia', True), expires_at=float('inf'))
+    principals.set('user', Principal(2, 'luke', False), expires_at=float('inf'))
+
+    now = cache.time.monotonic()
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now + 10)
+    assert principals.get('admin') is None
+    assert principals.get('user') == Principal(2, 'luke', False)
@@ -0,0 +1,48 @@
+import pytest
+from models import db, Character
+from search import search_index
+
+
+@pytest.fixture
+def indexed(app):
+    """The FTS5 search index, which create_all does not build."""
+    with app.app_context():
+        with db.engine.begin() as connection:
+            search_index.rebuild(connection)
+
+
+def test_bulk_insert_accepts_items_with_different_fields(app, client, make_user):
+    _, headers = make_user('bulk-mixed', is_admin=True)
+    response = client.post('/starwars/bulk/people', headers=headers, json=[
+        {"name": "Lando", "gender": "male"}, {"name": "R2-D2"}, {"name": "Mon Mothma", "birth_year": "48BBY"}])
+    assert response.status_code == 201
+    assert response.get_json()['inserted'] == 3
+
+    with app.app_context():
+        rows = db.session.query(Character.name, Character.gender, Character.birth_year_aby).filter(
+            Character.name.in_(['Lando', 'R2-D2', 'Mon Mothma'])).order_by(Character.id).all()
+    assert rows == [('Lando', 'male', None), ('R2-D2', None, None), ('Mon Mothma', None, -48.0)]
+
+
+def test_bulk_insert_reaches_the_search_index(app, client, make_user, indexed):
+    _, headers = make_user('bulk-admin', is_admin=True)
+    response = client.post('/starwars/bulk/people', headers=headers,
+                           json=[{"name": "Han Solo", "gender": "male"}, {"name": "Chewbacca"}])
+    assert response.status_code == 201
+
+    results = client.get('/starwars/search?q=han').get_json()['results']
+    assert [(result['kind'], result['name']) for result in results] == [('character', 'Han Solo')]
+    assert client.get('/starwars/search?q=chewb').get_json()['results'][0]['name'] == 'Chewbacca'
+
+
+def test_bulk_insert_without_items_is_an_error(client, make_user):
+    _, headers = make_user('bulk-empty', is_admin=True)
+    for response in (client.post('/starwars/bulk/people', headers=headers, json=[]),
+                     client.post('/starwars/bulk/people', headers=headers, data='')):
+        assert response.status_code == 400
+        assert set(response.get_json()) == {'error'}
+
+    response = client.post('/starwars/bulk/people', headers=headers, json=[{"gender": "male"}])
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['error'] == "No valid items to add" and body['errors'][0]['index'] == 0
@@ -0,0 +1,70 @@
+from flask import Flask, g
+from sqlalchemy.orm import sessionmaker
+from cache import ResponseCache, SharedBackend, LRUBackend, NullBackend
+
+
+class FakeRedis:
+    """The get/set/delete subset of redis-py that SharedBackend uses."""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+def worker(redis):
+    app = Flask(__name__)
+    cache = ResponseCache()
+    cache.init_app(app, sessionmaker(), backend=SharedBackend(redis))
+    calls = []
+
+    @app.route('/people')
+    @cache.cached('character')
+    def people():
+        calls.append(1)
+        return {"people": len(calls)}
+    return app, cache, calls
+
+
+def test_shared_backend_invalidation_reaches_every_worker():
+    redis = FakeRedis()
+    (app_a, cache_a, calls_a), (app_b, cache_b, calls_b) = worker(redis), worker(redis)
+
+    assert app_b.test_client().get('/people').get_json() == {"people": 1}
+    # Worker A is served worker B's entry...
+    assert app_a.test_client().get('/people').get_json() == {"people": 1}
+    assert calls_a == []
+    # ...and a commit seen by worker A invalidates it for worker B too
+    cache_a.invalidate('character')
+    assert app_b.test_client().get('/people').get_json() == {"people": 2}
+
+
+def test_replica_responses_are_not_stored():
+    app, cache, calls = worker(FakeRedis())
+    with app.test_request_context('/people'):
+        g.replica_connection = object()
+        app.view_functions['people']()
+
+    # A lagging replica's body is not kept under the current generation
+    assert app.test_client().get('/people').get_json() == {"people": 2}
+    assert app.test_client().get('/people').get_json() == {"people": 2}
+
+
+def backend_for(config):
+    app = Flask(__name__)
+    app.config.update(config)
+    cache = ResponseCache()
+    cache.init_app(app, sessionmaker())
+    return cache.backend
+
+
+def test_per_process_cache_is_off_with_several_workers():
+    assert isinstance(backend_for({'CACHE_BACKEND': 'lru', 'WEB_CONCURRENCY': 1}), LRUBackend)
+    assert isinstance(backend_for({'CACHE_BACKEND': 'lru', 'WEB_CONCURRENCY': 4}), NullBackend)
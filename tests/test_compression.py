@@ -0,0 +1,54 @@
+import gzip
+import json
+
+from compression import GzipCoder, negotiate
+from models import db, Character
+
+
+class Coder:
+    def __init__(self, name):
+        self.name = name
+
+
+def test_negotiation_follows_preference_and_q_values():
+    coders = [Coder('zstd'), Coder('br'), Coder('gzip')]
+    assert negotiate(coders, 'gzip, br').name == 'br'
+    assert negotiate(coders, 'zstd;q=0, br;q=0.5, gzip').name == 'br'
+    assert negotiate(coders, '*').name == 'zstd'
+    assert negotiate(coders, '*, zstd;q=0').name == 'br'
+    assert negotiate([GzipCoder(6)], 'br') is None
+    assert negotiate(coders, 'identity') is None
+    assert negotiate(coders, None) is None
+
+
+def test_encoded_bodies_get_a_weak_etag_that_still_revalidates(app, client):
+    with app.app_context():
+        db.session.add_all([Character(name=f'Compressed{number}', gender='n/a') for number in range(50)])
+        db.session.commit()
+    path = '/starwars/people?name__startswith=Compressed'
+
+    plain = client.get(path)
+    assert 'Content-Encoding' not in plain.headers and 'Accept-Encoding' in plain.headers['Vary']
+    assert not plain.headers['ETag'].startswith('W/')
+
+    encoded = client.get(path, headers={'Accept-Encoding': 'gzip'})
+    assert encoded.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in encoded.headers['Vary']
+    assert encoded.headers['ETag'] == 'W/' + plain.headers['ETag']
+    assert json.loads(gzip.decompress(encoded.get_data())) == plain.get_json()
+
+    for etag in (plain.headers['ETag'], encoded.headers['ETag']):
+        assert client.get(path, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}).status_code == 304
+
+
+def test_small_and_refused_bodies_are_sent_as_is(client):
+    assert 'Content-Encoding' not in client.get('/starwars/people/999999', headers={'Accept-Encoding': 'gzip'}).headers
+    response = client.get('/starwars/people', headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_streamed_exports_are_compressed(client):
+    response = client.get('/starwars/export/people', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    assert gzip.decompress(response.get_data()) == client.get('/starwars/export/people').get_data()
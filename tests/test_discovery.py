@@ -0,0 +1,28 @@
+import pytest
+
+
+@pytest.mark.parametrize('method, path, body', [
+    ('GET', '/starwars/people?fields=secret', None),
+    ('GET', '/starwars/people?sort=secret', None),
+    ('GET', '/starwars/people?cursor=nope', None),
+    ('GET', '/starwars/people?ids=a,b', None),
+    ('DELETE', '/starwars/bulk/people', None),
+    ('POST', '/starwars/jobs', {'kind': 'nope'}),
+])
+def test_errors_have_the_documented_shape(client, make_user, method, path, body):
+    _, admin = make_user(f'errors {method} {path}', is_admin=True)
+    response = client.open(path, method=method, json=body, headers=admin)
+    assert response.status_code == 400
+    assert set(response.get_json()) == {'error'}
+
+
+def test_missing_token_error(client):
+    response = client.get('/starwars/users/favorites')
+    assert response.status_code == 401
+    assert response.get_json() == {"error": "Missing bearer token"}
+
+
+def test_openapi_documents_the_error_shape(client):
+    spec = client.get('/openapi.json').get_json()
+    operation = spec['paths']['/starwars/people']['get']
+    assert operation['responses']['default']['description'] == 'JSON body; errors are {"error": message}'
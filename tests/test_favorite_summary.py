@@ -0,0 +1,46 @@
+import favorite_summary
+from models import db, Character, Planet
+
+
+def problems_of(app, user_id):
+    with app.app_context(), db.engine.connect() as connection:
+        return [problem for problem in favorite_summary.check(connection) if problem[0] == user_id]
+
+
+def test_summary_rows_follow_every_kind_of_write(app, client, make_user):
+    with app.app_context():
+        characters = [Character(name=f'Summary{number}') for number in range(3)]
+        planet = Planet(name='Summary planet')
+        db.session.add_all(characters + [planet])
+        db.session.commit()
+        first, second, third = [character.id for character in characters]
+        planet_id = planet.id
+    user_id, headers = make_user('summary')
+    _, admin = make_user('summary-admin', is_admin=True)
+    # Start from stored rows, so the writes below have to keep them up to date
+    with app.app_context(), db.engine.begin() as connection:
+        favorite_summary.rebuild(connection)
+
+    def summary():
+        body = client.get('/starwars/users/favorites/summary', headers=headers).get_json()
+        return body['favorite_characters'], body['favorite_planets']
+
+    client.post(f'/starwars/favorite/people/{first}', headers=headers)
+    client.post('/starwars/favorite/batch', json={'character': [second, third], 'planet': [planet_id]}, headers=headers)
+    assert summary() == ({'count': 3, 'ids': [first, second, third]}, {'count': 1, 'ids': [planet_id]})
+    assert problems_of(app, user_id) == []
+
+    client.delete(f'/starwars/favorite/character/{first}', headers=headers)
+    client.delete('/starwars/favorite/batch', json={'planet': [planet_id]}, headers=headers)
+    assert summary() == ({'count': 2, 'ids': [second, third]}, {'count': 0, 'ids': []})
+    assert problems_of(app, user_id) == []
+    # A rebuild arrives at the same row
+    with app.app_context(), db.engine.begin() as connection:
+        favorite_summary.rebuild(connection)
+    assert summary() == ({'count': 2, 'ids': [second, third]}, {'count': 0, 'ids': []})
+
+    # Cascades: one target through the ORM, one through the bulk endpoint
+    client.delete(f'/starwars/delete_people/{second}', headers=admin)
+    client.delete(f'/starwars/bulk/people?ids={third}', headers=admin)
+    assert summary() == ({'count': 0, 'ids': []}, {'count': 0, 'ids': []})
+    assert problems_of(app, user_id) == []
@@ -0,0 +1,79 @@
+from models import db, Character, Favorite, Planet
+
+
+def add_targets(app):
+    with app.app_context():
+        character, planet = Character(name='Rex'), Planet(name='Kamino')
+        db.session.add_all([character, planet])
+        db.session.commit()
+        return character.id, planet.id
+
+
+def favorites_of(client, headers):
+    body = client.get('/starwars/users/favorites', headers=headers).get_json()
+    return ([item['name'] for item in body['favorite_characters']], [item['name'] for item in body['favorite_planets']])
+
+
+def test_item_path_and_kind_routes_are_the_same_favorite(app, client, make_user):
+    character_id, planet_id = add_targets(app)
+    _, headers = make_user('routes')
+
+    assert client.post(f'/starwars/favorite/people/{character_id}', headers=headers).status_code == 200
+    response = client.post(f'/starwars/favorite/character/{character_id}', headers=headers)
+    assert response.get_json() == {"message": f"Character {character_id} is already in favorites"}
+    assert client.post(f'/starwars/favorite/planet/{planet_id}', headers=headers).status_code == 200
+    assert favorites_of(client, headers) == (['Rex'], ['Kamino'])
+
+    assert client.delete(f'/starwars/favorite/character/{character_id}', headers=headers).status_code == 200
+    assert client.delete(f'/starwars/favorite/people/{character_id}', headers=headers).status_code == 404
+    # Re-adding after a delete works
+    assert client.post(f'/starwars/favorite/people/{character_id}', headers=headers).status_code == 200
+    assert favorites_of(client, headers) == (['Rex'], ['Kamino'])
+
+    assert client.post('/starwars/favorite/people/999999', headers=headers).status_code == 404
+
+
+def test_batch_routes(app, client, make_user):
+    character_id, planet_id = add_targets(app)
+    _, headers = make_user('batch')
+
+    response = client.post('/starwars/favorite/batch', json={'character': [character_id, 999999], 'planet': [planet_id]},
+                           headers=headers)
+    assert response.get_json()['missing'] == {'character': [999999], 'planet': []}
+    assert favorites_of(client, headers) == (['Rex'], ['Kamino'])
+
+    response = client.delete('/starwars/favorite/batch', json={'character': [character_id], 'planet': [planet_id]},
+                             headers=headers)
+    assert response.get_json()['removed'] == 2
+    assert favorites_of(client, headers) == ([], [])
+
+    assert client.post('/starwars/favorite/batch', json={'starship': [1]}, headers=headers).status_code == 400
+
+
+def test_deleting_a_target_deletes_its_favorites(app, client, make_user):
+    character_id, planet_id = add_targets(app)
+    _, admin = make_user('cascade-admin', is_admin=True)
+    _, headers = make_user('cascade')
+    client.post('/starwars/favorite/batch', json={'character': [character_id], 'planet': [planet_id]}, headers=admin)
+    client.post('/starwars/favorite/batch', json={'character': [character_id]}, headers=headers)
+
+    assert client.delete(f'/starwars/delete_people/{character_id}', headers=admin).status_code == 200
+    with app.app_context():
+        assert Favorite.query.filter_by(entity_type='character', entity_id=character_id).count() == 0
+        assert Favorite.query.filter_by(entity_type='planet', entity_id=planet_id).count() == 1
+    assert favorites_of(client, headers) == ([], [])
+    assert favorites_of(client, admin) == ([], ['Kamino'])
+
+
+def test_repeated_favorite_posts_keep_one_row(app, client, make_user):
+    character_id, planet_id = add_targets(app)
+    user_id, headers = make_user('idempotent')
+
+    responses = [client.post(f'/starwars/favorite/people/{character_id}', headers=headers) for _ in range(3)]
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    for _ in range(2):
+        client.post('/starwars/favorite/batch', json={'planet': [planet_id, planet_id]}, headers=headers)
+
+    with app.app_context():
+        rows = Favorite.query.filter_by(user_id=user_id).order_by(Favorite.entity_type).all()
+        assert [(row.entity_type, row.entity_id) for row in rows] == [('character', character_id), ('planet', planet_id)]
@@ -0,0 +1,93 @@
+import listing
+from models import db, Character, Planet
+
+
+def add_characters(app, names, **fields):
+    with app.app_context():
+        db.session.add_all([Character(name=name, **fields) for name in names])
+        db.session.commit()
+
+
+def follow(client, url):
+    """Every item of a paginated list, following "next"."""
+    items = []
+    while url:
+        body = client.get(url).get_json()
+        items += body['characters']
+        url = body['next']
+    return items
+
+
+def test_cursor_pages_cover_every_row_once(app, client):
+    names = [f'Page{number:02}' for number in range(7)]
+    add_characters(app, names)
+
+    items = follow(client, '/starwars/people?name__startswith=Page&limit=3')
+    assert [item['name'] for item in items] == names
+    ids = [item['id'] for item in items]
+    assert ids == sorted(ids)
+
+
+def test_fields_projection(app, client):
+    add_characters(app, ['Fields'], gender='droid')
+    body = client.get('/starwars/people?name=Fields&fields=gender,name').get_json()
+    assert list(body['characters'][0]) == ['id', 'gender', 'name']
+    assert client.get('/starwars/people?fields=password').status_code == 400
+
+
+def test_filters(app, client):
+    add_characters(app, ['Filter 100%', 'Filter 1000'], gender='male')
+    add_characters(app, ['Filter 100'], gender='female')
+
+    def names(query):
+        return [item['name'] for item in client.get('/starwars/people?' + query).get_json()['characters']]
+
+    # The prefix is matched literally, % included
+    assert names('name__startswith=Filter%20100%25') == ['Filter 100%']
+    assert names('name__startswith=Filter%20100&gender=male') == ['Filter 100%', 'Filter 1000']
+
+
+def test_limit_is_clamped(app, client, monkeypatch):
+    add_characters(app, [f'Clamp{number}' for number in range(4)])
+    monkeypatch.setattr(listing, 'MAX_LIMIT', 3)
+
+    body = client.get('/starwars/people?name__startswith=Clamp&limit=500').get_json()
+    assert len(body['characters']) == 3 and body['next']
+    assert client.get('/starwars/people?limit=0').status_code == 400
+    assert client.get('/starwars/people?limit=many').status_code == 400
+
+
+def add_planets(app, populations):
+    with app.app_context():
+        db.session.add_all([Planet(name=f'Range{number}', population=population)
+                            for number, population in enumerate(populations)])
+        db.session.commit()
+
+
+def test_sorted_cursor_pages_through_ties(app, client):
+    add_planets(app, ['1000', '1000', 'unknown', '1000', '2000', '500', '1000'])
+
+    def pages(sort):
+        names, url = [], f'/starwars/planets?name__startswith=Range&sort={sort}&limit=2'
+        while url:
+            body = client.get(url).get_json()
+            names += [item['name'] for item in body['planets']]
+            url = body['next']
+        return names
+
+    # Ties on the sort value are ordered by id; rows with an unknown population are left out
+    assert pages('population') == ['Range5', 'Range0', 'Range1', 'Range3', 'Range6', 'Range4']
+    assert pages('-population') == ['Range4', 'Range6', 'Range3', 'Range1', 'Range0', 'Range5']
+
+
+def test_ranges_skip_values_that_are_not_numbers(app, client):
+    with app.app_context():
+        db.session.add_all([Planet(name='Gte unknown', population='unknown'), Planet(name='Gte many', population='1,000,000'),
+                            Planet(name='Gte few', population='10')])
+        db.session.commit()
+
+    body = client.get('/starwars/planets?name__startswith=Gte&population__gte=1000').get_json()
+    assert [item['name'] for item in body['planets']] == ['Gte many']
+    assert client.get('/starwars/planets?population__gte=lots').status_code == 400
+    assert client.get('/starwars/planets?sort=climate').status_code == 400
+    assert client.get('/starwars/planets?sort=population&cursor=nope').status_code == 400
@@ -0,0 +1,31 @@
+from models import db, Character, Planet
+
+
+def test_ids_come_back_in_the_order_asked_with_missing_ones_listed(app, client):
+    with app.app_context():
+        characters = [Character(name=f'Lookup{number}') for number in range(3)]
+        db.session.add_all(characters)
+        db.session.commit()
+        first, second, third = [character.id for character in characters]
+
+    body = client.get(f'/starwars/people?ids={third},999999,{first},{third}&fields=name').get_json()
+    assert body['characters'] == [{'id': third, 'name': 'Lookup2'}, {'id': first, 'name': 'Lookup0'}]
+    assert body['missing'] == [999999]
+    assert client.get('/starwars/people?ids=1,x').status_code == 400
+    too_many = ','.join(str(number) for number in range(1, 1002))
+    assert client.get('/starwars/people?ids=' + too_many).status_code == 400
+
+
+def test_entities_fetches_several_kinds_at_once(app, client):
+    with app.app_context():
+        character, planet = Character(name='Entity'), Planet(name='Entity planet')
+        db.session.add_all([character, planet])
+        db.session.commit()
+        character_id, planet_id = character.id, planet.id
+
+    body = client.get(f'/starwars/entities?people={character_id}&planets={planet_id},999999').get_json()
+    assert [item['name'] for item in body['people']] == ['Entity']
+    assert [item['name'] for item in body['planets']] == ['Entity planet']
+    assert body['missing'] == {'people': [], 'planets': [999999]}
+    assert 'vehicles' not in body
+    assert client.get('/starwars/entities').status_code == 400
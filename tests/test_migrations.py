@@ -0,0 +1,43 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BEFORE_POLYMORPHIC_FAVORITES = 'f2b6d9e4a0c7'
+POLYMORPHIC_FAVORITES = 'a9c4e7d2b5f8'
+
+
+def flask_db(database, *args):
+    env = dict(os.environ, FLASK_APP=os.path.join(ROOT, 'src', 'app.py'), DATABASE_URL='sqlite:///' + database,
+               JOBS_WORKERS='0', ADMIN_ENABLED='0')
+    subprocess.run([sys.executable, '-m', 'flask', 'db', *args], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def test_polymorphic_favorites_keep_every_row(tmp_path):
+    database = str(tmp_path / 'legacy.db')
+    flask_db(database, 'upgrade', BEFORE_POLYMORPHIC_FAVORITES)
+    with sqlite3.connect(database) as connection:
+        connection.executemany('INSERT INTO "user" (id, username, password, is_admin) VALUES (?, ?, ?, 0)',
+                               [(1, 'han', 'x'), (2, 'leia', 'x')])
+        connection.execute("INSERT INTO character (id, name) VALUES (1, 'Chewbacca')")
+        connection.execute("INSERT INTO planet (id, name) VALUES (1, 'Kashyyyk')")
+        connection.execute("INSERT INTO vehicle (id, name) VALUES (1, 'Falcon')")
+        connection.executemany('INSERT INTO favorite (user_id, character_id, planet_id, vehicle_id) VALUES (?, ?, ?, ?)', [
+            (1, 1, None, None), (1, None, 1, None), (1, None, None, 1), (2, 1, None, None),
+            # Points at nothing, so it could never be read back
+            (2, None, None, None)
+        ])
+
+    flask_db(database, 'upgrade', POLYMORPHIC_FAVORITES)
+    with sqlite3.connect(database) as connection:
+        rows = connection.execute('SELECT user_id, entity_type, entity_id FROM favorite ORDER BY id').fetchall()
+    assert rows == [(1, 'character', 1), (1, 'planet', 1), (1, 'vehicle', 1), (2, 'character', 1)]
+
+    flask_db(database, 'downgrade', BEFORE_POLYMORPHIC_FAVORITES)
+    with sqlite3.connect(database) as connection:
+        rows = connection.execute(
+            'SELECT user_id, character_id, planet_id, vehicle_id FROM favorite ORDER BY id').fetchall()
+    assert rows == [(1, 1, None, None), (1, None, 1, None), (1, None, None, 1), (2, 1, None, None)]
@@ -0,0 +1,28 @@
+from models import db, Character
+
+
+def popular(client):
+    return {item['name']: item['favorites'] for item in client.get('/starwars/people/popular').get_json()['characters']}
+
+
+def test_counters_follow_single_and_batch_favorites(app, client, make_user):
+    with app.app_context():
+        character = Character(name='Ahsoka')
+        db.session.add(character)
+        db.session.commit()
+        character_id = character.id
+    _, first = make_user('popular-1')
+    _, second = make_user('popular-2')
+
+    # The first favorite creates the counter, the second adds to it
+    assert client.post(f'/starwars/favorite/people/{character_id}', headers=first).status_code == 200
+    assert client.post('/starwars/favorite/batch', json={'character': [character_id]}, headers=second).status_code == 200
+    assert popular(client)['Ahsoka'] == 2
+
+    # A repeated batch recounts to the same number
+    assert client.post('/starwars/favorite/batch', json={'character': [character_id]}, headers=second).status_code == 200
+    assert popular(client)['Ahsoka'] == 2
+
+    assert client.delete(f'/starwars/favorite/character/{character_id}', headers=first).status_code == 200
+    assert client.delete('/starwars/favorite/batch', json={'character': [character_id]}, headers=second).status_code == 200
+    assert 'Ahsoka' not in popular(client)
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+from flask import Blueprint, Flask
+import ratelimit
+from ratelimit import LoadShedder, MemoryBucketBackend, RateLimiter, SharedBucketBackend, parse_limit
+
+
+def limited_app(config, backend=None):
+    app = Flask(__name__)
+    app.config.update(config)
+    api = Blueprint('api', __name__)
+
+    @api.route('/people')
+    def get_people():
+        return {"people": []}
+    app.register_blueprint(api)
+    limiter = RateLimiter()
+    limiter.init_app(app, backend=backend)
+    return app, limiter
+
+
+def test_parse_limit():
+    assert parse_limit('20/second:40') == (20, 40)
+    assert parse_limit('300/minute') == (5, 300)
+    with pytest.raises(ValueError):
+        parse_limit('fast')
+
+
+def test_bucket_refills_at_the_configured_rate():
+    buckets = MemoryBucketBackend()
+    assert buckets.take('client', 1, 2, now=0) == 0
+    assert buckets.take('client', 1, 2, now=0) == 0
+    assert buckets.take('client', 1, 2, now=0.25) == pytest.approx(0.75)
+    assert buckets.take('client', 1, 2, now=1) == 0
+
+
+def test_over_budget_clients_get_429_with_retry_after():
+    app, _ = limited_app({'RATELIMIT_DEFAULT': '1/minute:1'})
+    client = app.test_client()
+    assert client.get('/people').status_code == 200
+
+    response = client.get('/people')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '60'
+    assert response.get_json() == {"error": "Too many requests"}
+    # Buckets are per client
+    assert client.get('/people', environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code == 200
+
+
+def test_requests_queued_past_the_budget_get_503():
+    app, _ = limited_app({'SHED_QUEUE_BUDGET_MS': 500})
+    client = app.test_client()
+    fresh = {'X-Request-Start': f't={int(time.time() * 1e6)}'}
+    stale = {'X-Request-Start': f't={int((time.time() - 2) * 1e6)}'}
+    assert client.get('/people', headers=fresh).status_code == 200
+
+    response = client.get('/people', headers=stale)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_upstream_queue_time_units():
+    app = Flask(__name__)
+    shedder = LoadShedder(0, 1)
+    for header in (f't={int((time.time() - 2) * 1e6)}', str(int((time.time() - 2) * 1e3)), str(time.time() - 2)):
+        with app.test_request_context(headers={'X-Request-Start': header}):
+            assert shedder.upstream_queue_time() == pytest.approx(2, abs=0.5)
+
+
+def test_shared_buckets_with_cache_url(monkeypatch):
+    monkeypatch.setattr(ratelimit, 'redis_client', lambda url: object())
+    _, limiter = limited_app({'RATELIMIT_DEFAULT': '1/second', 'CACHE_URL': 'redis://cache'})
+    assert isinstance(limiter.backend, SharedBucketBackend)
+    _, limiter = limited_app({'RATELIMIT_DEFAULT': '1/second'})
+    assert isinstance(limiter.backend, MemoryBucketBackend)
@@ -0,0 +1,30 @@
+from flask import Flask
+from auth import Principal
+from cache import SharedBackend
+from replicas import ReplicaRouter
+from test_cache import FakeRedis
+
+
+def router_for(config, pins=None):
+    app = Flask(__name__)
+    app.config.update(config)
+    router = ReplicaRouter()
+    router.init_app(app, None, pins=pins)
+    return router
+
+
+def test_shared_pins_reach_every_worker():
+    redis = FakeRedis()
+    worker_a = router_for({}, pins=SharedBackend(redis, prefix='starwars:replicas:'))
+    worker_b = router_for({}, pins=SharedBackend(redis, prefix='starwars:replicas:'))
+    luke = Principal(2, 'luke', False)
+    assert not worker_b.is_pinned(luke)
+
+    worker_a.pin(luke.id)
+    assert worker_b.is_pinned(luke)
+
+
+def test_per_process_pins_refuse_replicas_with_several_workers(tmp_path):
+    url = 'sqlite:///' + str(tmp_path / 'replica.db')
+    assert len(router_for({'SQLALCHEMY_REPLICA_URLS': [url], 'WEB_CONCURRENCY': 1}).replicas) == 1
+    assert router_for({'SQLALCHEMY_REPLICA_URLS': [url], 'WEB_CONCURRENCY': 4}).replicas == []
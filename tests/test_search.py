@@ -0,0 +1,44 @@
+from sqlalchemy import text
+import search
+from models import db, Character
+from search import BACKENDS, INDEX_TABLE, LikeSearch, search_index
+
+
+def drop_index(app):
+    with app.app_context(), db.engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS {INDEX_TABLE}_vocab"))
+        connection.execute(text(f"DROP TABLE IF EXISTS {INDEX_TABLE}"))
+    search_index._backend = None
+
+
+def create_index_elsewhere(app):
+    """What a migration, `flask search-rebuild` or the rebuild job in another process does."""
+    with app.app_context(), db.engine.begin() as connection:
+        backend = BACKENDS[connection.dialect.name]()
+        backend.create(connection)
+        backend.backfill(connection)
+
+
+def test_writes_maintain_an_index_created_by_another_process(app):
+    drop_index(app)
+    with app.app_context():
+        assert isinstance(search_index.backend, LikeSearch)
+    create_index_elsewhere(app)
+
+    with app.app_context():
+        db.session.add(Character(name='Bo-Katan'))
+        db.session.commit()
+        indexed = db.session.execute(text(f"SELECT name FROM {INDEX_TABLE} WHERE name = 'Bo-Katan'")).scalars().all()
+    assert indexed == ['Bo-Katan']
+
+
+def test_searches_look_for_the_index_again(app, monkeypatch):
+    drop_index(app)
+    with app.app_context():
+        assert isinstance(search_index.backend, LikeSearch)
+        create_index_elsewhere(app)
+        assert isinstance(search_index.backend, LikeSearch)
+
+        now = search.time.monotonic()
+        monkeypatch.setattr(search.time, 'monotonic', lambda: now + search.INDEX_RECHECK_SECONDS)
+        assert not isinstance(search_index.backend, LikeSearch)
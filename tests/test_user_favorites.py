@@ -0,0 +1,52 @@
+from sqlalchemy import event
+from models import db, Character, Planet, Vehicle
+from favorites import add_favorites
+
+
+def add_catalog(app, count):
+    """`count` favoritable rows of each kind; returns their ids per kind."""
+    with app.app_context():
+        rows = {kind: [model(name=f'{model.__name__}{i}') for i in range(count)]
+                for kind, model in (('character', Character), ('planet', Planet), ('vehicle', Vehicle))}
+        db.session.add_all([row for kind_rows in rows.values() for row in kind_rows])
+        db.session.commit()
+        return {kind: [row.id for row in kind_rows] for kind, kind_rows in rows.items()}
+
+
+def favorite(app, user_id, targets):
+    with app.app_context():
+        add_favorites(user_id, targets)
+
+
+def count_statements(app, client, headers):
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # Warm the principal cache first, so both measurements see the same state
+    assert client.get('/starwars/users/favorites', headers=headers).status_code == 200
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get('/starwars/users/favorites', headers=headers)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return len(statements), response.get_json()
+
+
+def test_favorites_statement_count_does_not_grow_with_favorites(app, client, make_user):
+    user_id, headers = make_user('favorites-counter')
+    ids = add_catalog(app, 20)
+
+    favorite(app, user_id, {kind: kind_ids[:1] for kind, kind_ids in ids.items()})
+    few, body = count_statements(app, client, headers)
+    assert len(body['favorite_characters']) == 1
+
+    favorite(app, user_id, {kind: kind_ids[1:] for kind, kind_ids in ids.items()})
+    many, body = count_statements(app, client, headers)
+    assert len(body['favorite_characters']) == len(body['favorite_planets']) == len(body['favorite_vehicles']) == 20
+
+    assert few == many
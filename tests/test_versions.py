@@ -0,0 +1,46 @@
+from models import db, Job, Planet, TableVersion, User
+
+
+def version_of(table):
+    row = db.session.get(TableVersion, table)
+    return None if row is None else row.version
+
+
+def test_only_tables_behind_conditional_responses_are_versioned(app):
+    with app.app_context():
+        users_before = version_of('user')
+        db.session.add(User(username='wedge', password='secret'))
+        db.session.add(Job(kind='popularity-refresh'))
+        db.session.commit()
+
+        assert version_of('user') == (users_before or 0) + 1
+        # Nothing reads job versions, so concurrent enqueues never race on a counter row
+        assert version_of('job') is None
+
+
+def test_if_none_match_gets_304_until_a_write(app, client, make_user):
+    _, admin = make_user('etag-admin', is_admin=True)
+    assert client.post('/starwars/add_people', json={'name': 'Rex'}, headers=admin).status_code == 201
+    first = client.get('/starwars/people')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.headers['Last-Modified']
+
+    response = client.get('/starwars/people', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+
+    assert client.post('/starwars/add_people', json={'name': 'Cody'}, headers=admin).status_code == 201
+    response = client.get('/starwars/people', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_first_write_creates_the_version_row(app):
+    with app.app_context():
+        db.session.query(TableVersion).filter_by(table_name='planet').delete()
+        db.session.commit()
+        db.session.add(Planet(name='Geonosis'))
+        db.session.commit()
+        db.session.add(Planet(name='Utapau'))
+        db.session.commit()
+        assert version_of('planet') == 2